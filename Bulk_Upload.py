@@ -1,11 +1,17 @@
 import streamlit as st
 import pandas as pd
-import json
 import io
 from auth import check_authentication, hash_password, check_admin_access
 from database import get_db_connection
 from models import User, ReferenceData, Task
-from utils import can_upload_bulk_data, parse_excel_upload, parse_csv_upload
+from utils import (
+    begin_page_trace, build_label_map, can_upload_bulk_data, end_page_trace, render_job_progress, render_picker
+)
+from jobs import enqueue_task_approval, resume_task_approval, get_task_job
+from ingestion import (
+    PREVIEW_ROWS, UploadValidator, exclude_failed_rows, file_progress, iter_csv_chunks, iter_excel_chunks,
+    list_excel_sheets, validate_stream
+)
 
 # Page configuration
 st.set_page_config(
@@ -14,6 +20,9 @@ st.set_page_config(
     layout="wide"
 )
 
+# Tag this rerun's SQL statements for the Diagnostics page
+begin_page_trace("Bulk Upload")
+
 # Check authentication
 if not check_authentication():
     st.warning("Please login to access this page")
@@ -101,6 +110,97 @@ with st.sidebar:
             key="download_ref_template_csv"
         )
 
+def upload_reader(uploaded_file, upload_type, entity_type):
+    """Choose the chunk reader for an uploaded file, asking which sheet of a multi-sheet workbook to use
+
+    Returns (reader, source_key): reader is a function that streams the file
+    from its start, optionally checking the header with a validator, and
+    source_key identifies the file, entity type and sheet being read.
+    Validation and submission each read the file this way, so neither holds
+    more than one chunk.
+    """
+    if upload_type == "Excel" or (upload_type == "Both" and uploaded_file.name.endswith(('.xlsx', '.xls'))):
+        sheet_names = list_excel_sheets(uploaded_file)
+        sheet_name = None
+        if len(sheet_names) > 1:
+            sheet_name = st.selectbox("Select Sheet", options=sheet_names, key=f"{entity_type}_upload_sheet")
+        reader = lambda validator=None: iter_excel_chunks(uploaded_file, sheet_name=sheet_name, validator=validator)
+        return reader, (uploaded_file.file_id, entity_type, sheet_name)
+    reader = lambda validator=None: iter_csv_chunks(uploaded_file, validator=validator)
+    return reader, (uploaded_file.file_id, entity_type, None)
+
+def read_upload(uploaded_file, reader, entity_type, source_key):
+    """Validate an uploaded file once per session, reusing the result on later reruns
+
+    The result is kept in session state under source_key (see upload_reader),
+    so toggling a checkbox or clicking Submit does not read and validate the
+    file again; only the latest file per entity type is kept.
+    """
+    state_key = f"{entity_type}_upload_validation"
+    cached = st.session_state.get(state_key)
+    if cached is None or cached[0] != source_key:
+        cached = (source_key, validate_upload(uploaded_file, reader, entity_type))
+        st.session_state[state_key] = cached
+    return cached[1]
+
+def validate_upload(uploaded_file, reader, entity_type):
+    """Stream an uploaded file through chunked validation, showing progress
+
+    Returns (preview, validator, error) where preview holds the first
+    PREVIEW_ROWS rows; the chunks themselves are dropped once validated.
+    Reading stops at the first chunk if the header lacks required columns,
+    in which case preview is None.
+    """
+    validator = UploadValidator(entity_type)
+    progress_bar = st.progress(0.0, text="Reading file...")
+    
+    def on_progress(rows_seen):
+        fraction = file_progress(uploaded_file)
+        progress_bar.progress(fraction or 0.0, text=f"Validated {rows_seen:,} rows")
+    
+    preview = None
+    try:
+        for chunk in validate_stream(reader(validator), validator, on_progress):
+            if preview is None:
+                preview = chunk.head(PREVIEW_ROWS)
+    except Exception as e:
+        return None, validator, str(e)
+    finally:
+        progress_bar.empty()
+    
+    if not validator.header_ok:
+        return None, validator, None
+    return preview if preview is not None else pd.DataFrame(), validator, None
+
+def show_validation_results(validator, entity_type):
+    """Show validation warnings and the failing rows; returns whether to exclude failing rows on submit"""
+    st.subheader("Validation Results")
+    for message in validator.issues():
+        st.warning(message)
+    
+    if not validator.error_rows:
+        st.success("All rows passed validation")
+        return False
+    
+    st.write(f"{validator.error_rows:,} of {validator.rows_seen:,} rows failed at least one check")
+    st.dataframe(validator.error_preview(), use_container_width=True, hide_index=True)
+    if validator.error_rows > PREVIEW_ROWS:
+        st.caption(f"Showing the first {PREVIEW_ROWS:,} rows with problems")
+    
+    return st.checkbox(
+        f"Exclude the {validator.error_rows:,} rows with problems from the upload",
+        value=True,
+        key=f"{entity_type}_exclude_invalid_rows"
+    )
+
+def submit_chunks(reader, validator, exclude_failed):
+    """Stream the upload again for staging, dropping the rows the cached validation marked as failed if asked
+
+    The rows are only parsed; none of the validation checks run again.
+    """
+    chunks = reader()
+    return exclude_failed_rows(chunks, validator) if exclude_failed else chunks
+
 # User upload tab
 with tabs[0]:
     st.header("Upload Users")
@@ -114,57 +214,44 @@ with tabs[0]:
     )
     
     if uploaded_file:
-        if upload_type == "Excel" or (upload_type == "Both" and uploaded_file.name.endswith(('.xlsx', '.xls'))):
-            df, error = parse_excel_upload(uploaded_file)
+        try:
+            reader, source_key = upload_reader(uploaded_file, upload_type, 'user')
+        except Exception as e:
+            reader, validator, error = None, None, str(e)
         else:
-            df, error = parse_csv_upload(uploaded_file)
+            preview, validator, error = read_upload(uploaded_file, reader, 'user', source_key)
         
         if error:
             st.error(f"Error parsing file: {error}")
-        elif df is not None:
-            # Validate required columns
-            required_columns = ["username", "password", "role"]
-            missing_columns = [col for col in required_columns if col not in df.columns]
+        elif validator.missing_columns is not None:
+            # Required columns are checked on the header before any rows are read
+            missing_columns = validator.missing_columns
             
             if missing_columns:
                 st.error(f"Missing required columns: {', '.join(missing_columns)}")
             else:
                 st.success("File parsed successfully")
-                st.write(f"Found {len(df)} user records")
+                st.write(f"Found {validator.rows_seen} user records")
                 
                 # Display preview
                 st.subheader("Preview")
-                st.dataframe(df, use_container_width=True)
-                
-                # Validation checks
-                st.subheader("Validation Results")
+                st.dataframe(preview, use_container_width=True)
+                if validator.rows_seen > PREVIEW_ROWS:
+                    st.caption(f"Showing the first {PREVIEW_ROWS:,} rows")
                 
-                # Username uniqueness check
-                if df['username'].duplicated().any():
-                    st.warning("Duplicate usernames found in the file")
-                
-                # Role validation
-                invalid_roles = df[~df['role'].isin(['super_admin', 'data_analyst'])]['role'].unique()
-                if len(invalid_roles) > 0:
-                    st.warning(f"Invalid roles found: {', '.join(invalid_roles)}. Valid roles are 'super_admin' and 'data_analyst'")
+                # Field, duplicate and existing-key checks gathered chunk by chunk
+                exclude_failed = show_validation_results(validator, 'user')
                 
                 # Process button for task creation
                 if st.button("Submit for Super Admin Approval", type="primary", key="user_task_button"):
                     progress_bar = st.progress(0)
                     status_text = st.empty()
                     
-                    # Create task for bulk user upload
-                    task_data = {
-                        'file_name': uploaded_file.name,
-                        'record_count': len(df),
-                        'records': df.to_dict(orient='records')
-                    }
-                    
-                    task_id = Task.create(
-                        'bulk_upload', 
-                        'user', 
-                        None, 
-                        task_data, 
+                    # Create task for bulk user upload, staging the records in task_records
+                    task_id = Task.create_bulk_upload(
+                        'user',
+                        uploaded_file.name,
+                        submit_chunks(reader, validator, exclude_failed),
                         st.session_state.username
                     )
                     
@@ -188,57 +275,44 @@ with tabs[1]:
     )
     
     if uploaded_file:
-        if upload_type == "Excel" or (upload_type == "Both" and uploaded_file.name.endswith(('.xlsx', '.xls'))):
-            df, error = parse_excel_upload(uploaded_file)
+        try:
+            reader, source_key = upload_reader(uploaded_file, upload_type, 'reference_data')
+        except Exception as e:
+            reader, validator, error = None, None, str(e)
         else:
-            df, error = parse_csv_upload(uploaded_file)
+            preview, validator, error = read_upload(uploaded_file, reader, 'reference_data', source_key)
         
         if error:
             st.error(f"Error parsing file: {error}")
-        elif df is not None:
-            # Validate required columns
-            required_columns = ["data_type", "code", "value"]
-            missing_columns = [col for col in required_columns if col not in df.columns]
+        elif validator.missing_columns is not None:
+            # Required columns are checked on the header before any rows are read
+            missing_columns = validator.missing_columns
             
             if missing_columns:
                 st.error(f"Missing required columns: {', '.join(missing_columns)}")
             else:
                 st.success("File parsed successfully")
-                st.write(f"Found {len(df)} reference data records")
+                st.write(f"Found {validator.rows_seen} reference data records")
                 
                 # Display preview
                 st.subheader("Preview")
-                st.dataframe(df, use_container_width=True)
+                st.dataframe(preview, use_container_width=True)
+                if validator.rows_seen > PREVIEW_ROWS:
+                    st.caption(f"Showing the first {PREVIEW_ROWS:,} rows")
                 
-                # Validation checks
-                st.subheader("Validation Results")
-                
-                # Check for unique data_type + code combinations
-                df['type_code'] = df['data_type'] + '-' + df['code']
-                if df['type_code'].duplicated().any():
-                    st.warning("Duplicate data_type and code combinations found in the file")
-                
-                # Remove the temporary type_code column we added for validation
-                if 'type_code' in df.columns:
-                    df = df.drop(columns=['type_code'])
+                # Field, duplicate and existing-key checks gathered chunk by chunk
+                exclude_failed = show_validation_results(validator, 'reference_data')
                 
                 # Process button for task creation
                 if st.button("Submit for Super Admin Approval", type="primary", key="ref_task_button"):
                     progress_bar = st.progress(0)
                     status_text = st.empty()
                     
-                    # Create task for bulk reference data upload
-                    task_data = {
-                        'file_name': uploaded_file.name,
-                        'record_count': len(df),
-                        'records': df.to_dict(orient='records')
-                    }
-                    
-                    task_id = Task.create(
-                        'bulk_upload', 
-                        'reference_data', 
-                        None, 
-                        task_data, 
+                    # Create task for bulk reference data upload, staging the records in task_records
+                    task_id = Task.create_bulk_upload(
+                        'reference_data',
+                        uploaded_file.name,
+                        submit_chunks(reader, validator, exclude_failed),
                         st.session_state.username
                     )
                     
@@ -255,7 +329,11 @@ with tabs[2]:
     # Get bulk upload tasks
     conn = get_db_connection()
     tasks_df = pd.read_sql_query(
-        "SELECT id, task_type, entity_type, status, created_by, created_at, approved_by, approved_at FROM tasks WHERE task_type = 'bulk_upload'",
+        """
+        SELECT id, task_type, entity_type, status, record_count, inserted_count, skipped_count,
+               created_by, created_at, approved_by, approved_at
+        FROM tasks WHERE task_type = 'bulk_upload'
+        """,
         conn
     )
     conn.close()
@@ -268,6 +346,9 @@ with tabs[2]:
                 "id": "Task ID",
                 "entity_type": "Data Type",
                 "status": "Status",
+                "record_count": "Records",
+                "inserted_count": "Inserted",
+                "skipped_count": "Skipped",
                 "created_by": "Created By",
                 "created_at": st.column_config.DatetimeColumn("Created At", format="MMM DD, YYYY HH:mm"),
                 "approved_by": "Processed By",
@@ -278,30 +359,28 @@ with tabs[2]:
         )
         
         # View details
-        selected_task_id = st.selectbox(
-            "Select Task to View Details",
-            options=tasks_df["id"].tolist(),
-            format_func=lambda x: f"Task ID: {x} - {tasks_df[tasks_df['id'] == x]['entity_type'].iloc[0]} upload on {tasks_df[tasks_df['id'] == x]['created_at'].iloc[0]}"
+        history_labels = build_label_map(
+            tasks_df['id'],
+            "Task ID: " + tasks_df['id'].astype(str) + " - " + tasks_df['entity_type'].astype(str)
+            + " upload on " + tasks_df['created_at'].astype(str)
         )
+        selected_task_id = render_picker("Select Task to View Details", history_labels, key="upload_history_select")
         
         if selected_task_id:
-            # Get task details
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM tasks WHERE id = ?", (selected_task_id,))
-            task = cursor.fetchone()
-            conn.close()
+            # Get task details; the payload is never decoded in full
+            task_dict = Task.get(selected_task_id)
             
-            if task:
-                task_dict = dict(task)
-                data = json.loads(task_dict['data_json'])
+            if task_dict:
+                record_count = task_dict.record_count
                 
                 st.subheader("Upload Details")
                 
                 col1, col2 = st.columns(2)
                 with col1:
-                    st.write("**File Name:**", data.get('file_name', 'N/A'))
-                    st.write("**Record Count:**", data.get('record_count', 0))
+                    st.write("**File Name:**", task_dict.field('file_name', 'N/A'))
+                    st.write("**Record Count:**", record_count)
+                    if task_dict['inserted_count'] is not None:
+                        st.write("**Inserted / Skipped:**", f"{task_dict['inserted_count']} / {task_dict['skipped_count']}")
                     st.write("**Status:**", task_dict['status'].capitalize())
                 
                 with col2:
@@ -311,11 +390,28 @@ with tabs[2]:
                         st.write("**Processed By:**", task_dict['approved_by'])
                         st.write("**Processed At:**", task_dict['approved_at'])
                 
+                # Progress of a background approval in flight
+                if task_dict['status'] == 'processing':
+                    render_job_progress(selected_task_id)
+                
+                # An approval that stopped part way; the rows already applied are kept
+                if task_dict['status'] == 'partial':
+                    job = get_task_job(selected_task_id)
+                    st.warning(f"Approval stopped part way: {job['message'] if job else 'no details'}")
+                    if check_admin_access() and st.button("Resume Approval", key=f"resume_history_{selected_task_id}", type="primary"):
+                        if resume_task_approval(selected_task_id, st.session_state.username) is not None:
+                            st.success("Task queued to resume from its checkpoint")
+                            st.rerun()
+                        else:
+                            st.error("Failed to resume task")
+                
                 # Preview records
-                if 'records' in data:
+                if record_count:
                     st.subheader("Records Preview")
-                    records_df = pd.DataFrame(data['records'])
-                    st.dataframe(records_df, use_container_width=True)
+                    records_df = task_dict.preview_records(PREVIEW_ROWS)
+                    st.dataframe(records_df, use_container_width=True, hide_index=True)
+                    if record_count > PREVIEW_ROWS:
+                        st.caption(f"Showing the first {PREVIEW_ROWS:,} of {record_count:,} records")
                     
                     # Add approval/rejection buttons for pending tasks only for super admins
                     if task_dict['status'] == 'pending':
@@ -326,9 +422,10 @@ with tabs[2]:
                             
                             with col1:
                                 if st.button("Approve Task", key=f"approve_history_{selected_task_id}", type="primary"):
-                                    success = Task.approve(selected_task_id, st.session_state.username)
-                                    if success:
-                                        st.success("Task approved and processed successfully!")
+                                    # Applied by the background job worker; progress is shown below once queued
+                                    job_id = enqueue_task_approval(selected_task_id, st.session_state.username)
+                                    if job_id is not None:
+                                        st.success("Task queued for processing")
                                         st.rerun()
                                     else:
                                         st.error("Failed to approve task")
@@ -345,3 +442,6 @@ with tabs[2]:
                             st.info("This bulk upload is pending Super Admin approval. Only Super Admins can approve or reject bulk uploads.")
     else:
         st.info("No upload history found")
+
+# Record this rerun's render time for the page_render_seconds metric
+end_page_trace()
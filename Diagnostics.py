@@ -0,0 +1,127 @@
+import streamlit as st
+import pandas as pd
+import tracing
+from auth import check_authentication, check_admin_access
+from utils import begin_page_trace, end_page_trace
+
+# Page configuration
+st.set_page_config(
+    page_title="Diagnostics - Data Governance Platform",
+    page_icon="🩺",
+    layout="wide"
+)
+
+# Tag this rerun's SQL statements for the Diagnostics page
+begin_page_trace("Diagnostics")
+
+# Check authentication
+if not check_authentication():
+    st.warning("Please login to access this page")
+    st.stop()
+
+# Check access rights
+if not check_admin_access():
+    st.error("You do not have permission to view this page")
+    st.stop()
+
+# Page header
+st.title("Diagnostics")
+st.write("SQL statements run by this server process since it started or was last reset")
+
+if st.button("Refresh", key="refresh_diagnostics"):
+    st.rerun()
+
+# Process-wide totals
+totals = tracing.totals()
+metric_cols = st.columns(4)
+with metric_cols[0]:
+    st.metric(label="Execute Calls", value=f"{totals['calls']:,}")
+with metric_cols[1]:
+    st.metric(label="Statements Run", value=f"{totals['statements']:,}", help="Includes statements run by triggers")
+with metric_cols[2]:
+    st.metric(label="Total SQL Time", value=f"{totals['seconds']:,.2f} s")
+with metric_cols[3]:
+    st.metric(label=f"Slow Calls (≥ {tracing.SLOW_QUERY_MS:g} ms)", value=f"{totals['slow']:,}")
+
+if not tracing.TRACE_ENABLED:
+    st.info("SQL tracing is disabled (SQL_TRACE=0)")
+elif not tracing.COUNT_STATEMENTS:
+    st.info("Statement counting is off; set SQL_TRACE_STATEMENTS=1 to count the statements SQLite runs")
+
+tabs = st.tabs(["Top Statements", "Recent Reruns", "Slow Query Log"])
+
+with tabs[0]:
+    st.header("Top Statements")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        sort = st.selectbox(
+            "Sort by",
+            options=["total_ms", "max_ms", "mean_ms", "calls"],
+            format_func=lambda x: {"total_ms": "Total time", "max_ms": "Slowest call", "mean_ms": "Mean time", "calls": "Calls"}[x],
+            key="diagnostics_sort"
+        )
+    with col2:
+        limit = st.number_input("Statements to show", min_value=10, max_value=500, value=50, step=10, key="diagnostics_limit")
+
+    statements_df = pd.DataFrame(tracing.top_statements(int(limit), sort))
+    if not statements_df.empty:
+        st.dataframe(
+            statements_df,
+            column_config={
+                "sql": st.column_config.TextColumn("Statement", width="large"),
+                "page": "Page",
+                "caller": "Caller",
+                "calls": "Calls",
+                "total_ms": st.column_config.NumberColumn("Total (ms)", format="%.1f"),
+                "mean_ms": st.column_config.NumberColumn("Mean (ms)", format="%.2f"),
+                "max_ms": st.column_config.NumberColumn("Max (ms)", format="%.1f")
+            },
+            use_container_width=True,
+            hide_index=True
+        )
+    else:
+        st.info("No statements recorded yet")
+
+with tabs[1]:
+    st.header("Recent Reruns")
+
+    reruns_df = pd.DataFrame(tracing.recent_reruns())
+    if not reruns_df.empty:
+        reruns_df['started_at'] = pd.to_datetime(reruns_df['started_at'], unit='s')
+        st.dataframe(
+            reruns_df,
+            column_config={
+                "page": "Page",
+                "user": "User",
+                "started_at": st.column_config.DatetimeColumn("Started At", format="MMM DD, YYYY HH:mm:ss"),
+                "render_ms": st.column_config.NumberColumn("Render (ms)", format="%.1f"),
+                "calls": "Execute Calls",
+                "statements": "Statements Run",
+                "total_ms": st.column_config.NumberColumn("SQL Time (ms)", format="%.1f"),
+                "slowest_ms": st.column_config.NumberColumn("Slowest (ms)", format="%.1f"),
+                "slowest_sql": st.column_config.TextColumn("Slowest Statement", width="large")
+            },
+            use_container_width=True,
+            hide_index=True
+        )
+    else:
+        st.info("No page reruns recorded yet")
+
+with tabs[2]:
+    st.header("Slow Query Log")
+    st.caption(f"Calls taking {tracing.SLOW_QUERY_MS:g} ms or more are written to {tracing.SLOW_QUERY_LOG}")
+
+    log_lines = tracing.read_slow_query_log()
+    if log_lines:
+        st.code("".join(reversed(log_lines)), language=None)
+    else:
+        st.info("No slow queries logged")
+
+st.divider()
+if st.button("Reset Statistics", key="reset_diagnostics"):
+    tracing.reset()
+    st.rerun()
+
+# Record this rerun's render time for the page_render_seconds metric
+end_page_trace()
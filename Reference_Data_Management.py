@@ -1,9 +1,12 @@
 import streamlit as st
 import pandas as pd
 from auth import check_authentication
-from database import get_db_connection, get_reference_data
+from database import get_db_connection, get_reference_data_page, search_reference_data
 from models import ReferenceData
-from utils import can_manage_reference_data, can_view_users, get_data_types
+from utils import (
+    begin_page_trace, can_manage_reference_data, can_view_users, end_page_trace, get_data_types, get_page_cursor,
+    get_reference_data_labels, reference_data_labels, render_export, render_page_controls, render_picker
+)
 
 # Page configuration
 st.set_page_config(
@@ -12,6 +15,9 @@ st.set_page_config(
     layout="wide"
 )
 
+# Tag this rerun's SQL statements for the Diagnostics page
+begin_page_trace("Reference Data Management")
+
 # Check authentication
 if not check_authentication():
     st.warning("Please login to access this page")
@@ -49,20 +55,24 @@ with tabs[0]:
         )
     
     with col2:
-        search_term = st.text_input("Search by Code or Value", key="ref_data_search")
+        search_term = st.text_input("Search by Code, Value or Description", key="ref_data_search")
     
-    # Get reference data based on filter
-    if type_filter != "All":
-        reference_data_df = get_reference_data(type_filter)
-    else:
-        reference_data_df = get_reference_data()
+    filters = {'data_type': type_filter if type_filter != "All" else None}
+    render_export("reference_data", dict(filters, search=search_term), "ref_data_list", statuses=["active", "inactive"])
     
-    # Apply search filter
-    if not reference_data_df.empty and search_term:
-        reference_data_df = reference_data_df[
-            reference_data_df["code"].str.contains(search_term, case=False) |
-            reference_data_df["value"].str.contains(search_term, case=False)
-        ]
+    if search_term.strip():
+        # Ranked full-text search returns the best matches only
+        reference_data_df = search_reference_data(search_term, filters)
+        next_cursor = None
+    else:
+        # Fetch only the page being shown, filtered in the database. Within a
+        # single data type, rows come in code order straight off the unique index.
+        page_cursor = get_page_cursor("ref_data_list", filters)
+        reference_data_df, next_cursor = get_reference_data_page(
+            filters,
+            sort='code' if type_filter != "All" else 'id',
+            cursor=page_cursor
+        )
     
     # Display reference data
     if not reference_data_df.empty:
@@ -81,17 +91,22 @@ with tabs[0]:
             use_container_width=True,
             hide_index=True
         )
+        if search_term.strip():
+            st.caption(f"Showing the top {len(reference_data_df)} matches")
+        else:
+            render_page_controls("ref_data_list", next_cursor)
         
         # Reference data actions (only if can manage)
         if can_manage_reference_data():
             st.subheader("Reference Data Actions")
+            ref_labels = reference_data_labels(reference_data_df)
             
             col1, col2 = st.columns(2)
             with col1:
                 ref_id_to_edit = st.selectbox(
                     "Select Reference Data to Edit",
-                    options=reference_data_df["id"].tolist(),
-                    format_func=lambda x: f"{reference_data_df[reference_data_df['id'] == x]['code'].iloc[0]} - {reference_data_df[reference_data_df['id'] == x]['value'].iloc[0]} (ID: {x})",
+                    options=list(ref_labels),
+                    format_func=ref_labels.__getitem__,
                     key="ref_edit_select_list"
                 )
                 
@@ -104,8 +119,8 @@ with tabs[0]:
             with col2:
                 ref_id_to_delete = st.selectbox(
                     "Select Reference Data to Delete",
-                    options=reference_data_df["id"].tolist(),
-                    format_func=lambda x: f"{reference_data_df[reference_data_df['id'] == x]['code'].iloc[0]} - {reference_data_df[reference_data_df['id'] == x]['value'].iloc[0]} (ID: {x})",
+                    options=list(ref_labels),
+                    format_func=ref_labels.__getitem__,
                     key="ref_delete_select_list"
                 )
                 
@@ -129,7 +144,9 @@ with tabs[0]:
                         st.session_state.confirm_delete_ref = True
                         st.warning(f"Are you sure you want to delete this reference data? Click 'Delete Selected Reference Data' again to confirm.")
     else:
-        if type_filter != "All":
+        if search_term:
+            st.info("No reference data matches the current filters")
+        elif type_filter != "All":
             st.info(f"No reference data found for type: {type_filter}")
         else:
             st.info("No reference data found in the database")
@@ -191,14 +208,10 @@ with tabs[2]:
         ref_to_edit = st.session_state.get("ref_to_edit", None)
         
         if not ref_to_edit:
-            reference_data_df = get_reference_data()
-            if not reference_data_df.empty:
-                ref_to_edit = st.selectbox(
-                    "Select Reference Data to Edit",
-                    options=reference_data_df["id"].tolist(),
-                    format_func=lambda x: f"{reference_data_df[reference_data_df['id'] == x]['code'].iloc[0]} - {reference_data_df[reference_data_df['id'] == x]['value'].iloc[0]} (ID: {x})",
-                    key="ref_edit_tab_select"
-                )
+            # Labels are built once per version of the table; large tables get a searchable picker
+            ref_labels = get_reference_data_labels()
+            if ref_labels:
+                ref_to_edit = render_picker("Select Reference Data to Edit", ref_labels, key="ref_edit_tab_select")
         
         if ref_to_edit:
             # Get reference data details
@@ -263,3 +276,6 @@ if 'active_tab' in st.session_state:
     if st.session_state.active_tab == "Edit Reference Data":
         st.session_state.tabs_selected = 2
         del st.session_state.active_tab
+
+# Record this rerun's render time for the page_render_seconds metric
+end_page_trace()
@@ -1,10 +1,16 @@
 import streamlit as st
 import pandas as pd
 import json
+from collections import Counter
 from auth import check_authentication
-from database import get_db_connection, get_tasks
+from database import get_db_connection, get_tasks_page
 from models import Task
-from utils import can_approve_tasks, format_task_description
+from ingestion import PREVIEW_ROWS
+from jobs import enqueue_task_approval
+from utils import (
+    begin_page_trace, build_label_map, can_approve_tasks, end_page_trace, format_task_descriptions, get_page_cursor,
+    render_job_progress, render_page_controls
+)
 
 # Page configuration
 st.set_page_config(
@@ -13,6 +19,9 @@ st.set_page_config(
     layout="wide"
 )
 
+# Tag this rerun's SQL statements for the Diagnostics page
+begin_page_trace("Task Operations")
+
 # Check authentication
 if not check_authentication():
     st.warning("Please login to access this page")
@@ -27,17 +36,12 @@ can_approve = can_approve_tasks()
 # Tabs for different task statuses
 tabs = st.tabs(["Pending Tasks", "Approved Tasks", "Rejected Tasks", "All Tasks"])
 
-# Helper function to display task details
-def display_task_details(task_id):
-    # Use the Task model to get the task details instead of direct DB access
+# Helper function to display task details; key_prefix keeps widget keys unique per tab
+def display_task_details(task_id, key_prefix):
+    # Use the Task model to get the task details; the payload is only decoded when read
     task_dict = Task.get(task_id)
     
     if task_dict:
-        # Print task details for debugging
-        print(f"Displaying task details for Task ID: {task_id}")
-        print(f"Task status: {task_dict.get('status')}")
-        print(f"Task data: {task_dict.get('data')}")
-        
         st.subheader("Task Details")
         
         col1, col2 = st.columns(2)
@@ -57,11 +61,21 @@ def display_task_details(task_id):
         
         st.subheader("Task Data")
         
-        # Get data from the task dictionary
-        data = task_dict.get('data', {})
+        # Bulk uploads can hold millions of records: show counts and the first rows only
+        if task_dict['task_type'] == 'bulk_upload':
+            record_count = task_dict.record_count
+            st.write("**File Name:**", task_dict.field('file_name', 'N/A'))
+            st.write("**Record Count:**", record_count)
+            if task_dict['inserted_count'] is not None:
+                st.write("**Inserted / Skipped:**", f"{task_dict['inserted_count']} / {task_dict['skipped_count']}")
+            if record_count:
+                st.dataframe(task_dict.preview_records(PREVIEW_ROWS), use_container_width=True, hide_index=True)
+                if record_count > PREVIEW_ROWS:
+                    st.caption(f"Showing the first {PREVIEW_ROWS:,} of {record_count:,} records")
         
         # Format data based on entity type
-        if task_dict['entity_type'] == 'user':
+        elif task_dict['entity_type'] == 'user':
+            data = task_dict['data']
             if 'password_hash' in data:
                 data['password'] = "********"  # Hide password hash
                 del data['password_hash']
@@ -70,19 +84,27 @@ def display_task_details(task_id):
                 st.write(f"**{key.replace('_', ' ').title()}:** {value}")
                 
         elif task_dict['entity_type'] == 'reference_data':
-            for key, value in data.items():
+            for key, value in task_dict['data'].items():
                 st.write(f"**{key.replace('_', ' ').title()}:** {value}")
         
+        # Bulk uploads being approved in the background
+        if task_dict['status'] == 'processing':
+            render_job_progress(task_id)
+        
         # Approval/rejection buttons for pending tasks
         if task_dict['status'] == 'pending' and can_approve:
             col1, col2 = st.columns(2)
             
             with col1:
-                # Use a more specific, unique key that includes tab name and task ID
-                unique_approve_key = f"approve_task_details_{task_id}_{task_dict['entity_type']}"
+                # Use a unique key that includes the tab's list key and task ID
+                unique_approve_key = f"approve_task_details_{key_prefix}_{task_id}"
                 if st.button("Approve Task", key=unique_approve_key, type="primary"):
                     try:
-                        success = Task.approve(task_id, st.session_state.username)
+                        if task_dict['task_type'] == 'bulk_upload':
+                            # Large uploads are applied by the background job worker
+                            success = enqueue_task_approval(task_id, st.session_state.username) is not None
+                        else:
+                            success = Task.approve(task_id, st.session_state.username)
                         if success:
                             st.success("Task approved successfully")
                             st.rerun()
@@ -92,8 +114,8 @@ def display_task_details(task_id):
                         st.error(f"Error approving task: {str(e)}")
             
             with col2:
-                # Use a more specific, unique key that includes tab name and task ID
-                unique_reject_key = f"reject_task_details_{task_id}_{task_dict['entity_type']}"
+                # Use a unique key that includes the tab's list key and task ID
+                unique_reject_key = f"reject_task_details_{key_prefix}_{task_id}"
                 if st.button("Reject Task", key=unique_reject_key):
                     try:
                         success = Task.reject(task_id, st.session_state.username)
@@ -107,27 +129,66 @@ def display_task_details(task_id):
     else:
         st.error("Task not found")
 
-# Function to display task list
-def display_task_list(tasks_df, status=None):
-    if tasks_df.empty:
+# Summarise batch outcomes such as {'approved': 3, 'failed': 1} for display
+def format_batch_outcomes(action, outcomes):
+    counts = Counter(outcomes.values())
+    summary = ", ".join(f"{count} {outcome.replace('_', ' ')}" for outcome, count in counts.items())
+    failed = [str(task_id) for task_id, outcome in outcomes.items() if outcome not in ('approved', 'rejected', 'queued')]
+    return f"Batch {action}: {summary}", failed
+
+# Multi-select approve/reject for the pending tasks on the current page
+def display_batch_actions(list_key, tasks_df):
+    labels = build_label_map(tasks_df['id'], tasks_df['description'])
+    result_key = f"{list_key}_batch_result"
+    
+    with st.expander("Batch Approve / Reject"):
+        select_all = st.checkbox("Select all tasks on this page", key=f"{list_key}_select_all")
+        selected_ids = st.multiselect(
+            "Tasks to process",
+            options=list(labels),
+            default=list(labels) if select_all else [],
+            format_func=lambda x: f"ID: {x} - {labels[x]}"
+        )
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Approve Selected", key=f"{list_key}_approve_selected", type="primary", disabled=not selected_ids):
+                # Bulk uploads are queued for the background job worker; everything else is applied now
+                with st.spinner(f"Approving {len(selected_ids)} tasks..."):
+                    outcomes = Task.approve_many(selected_ids, st.session_state.username)
+                st.session_state[result_key] = format_batch_outcomes("approval", outcomes)
+                st.rerun()
+        with col2:
+            if st.button("Reject Selected", key=f"{list_key}_reject_selected", disabled=not selected_ids):
+                outcomes = Task.reject_many(selected_ids, st.session_state.username)
+                st.session_state[result_key] = format_batch_outcomes("rejection", outcomes)
+                st.rerun()
+
+# Function to display one page of the task list
+def display_task_list(status=None):
+    list_key = f"task_list_{status or 'all'}"
+    filters = {'status': status}
+    page_cursor = get_page_cursor(list_key, filters)
+    
+    # Outcome of the last batch action, carried across the rerun that refreshed the list
+    batch_result = st.session_state.pop(f"{list_key}_batch_result", None)
+    if batch_result:
+        message, failed = batch_result
+        st.success(message)
+        if failed:
+            st.warning(f"Not processed: task IDs {', '.join(failed)}")
+    
+    filtered_df, next_cursor = get_tasks_page(filters, cursor=page_cursor)
+    
+    if filtered_df.empty:
         if status:
             st.info(f"No {status} tasks found")
         else:
             st.info("No tasks found")
         return
     
-    # Filter by status if specified
-    if status:
-        filtered_df = tasks_df[tasks_df['status'] == status]
-    else:
-        filtered_df = tasks_df
-    
-    if filtered_df.empty:
-        st.info(f"No {status} tasks found")
-        return
-    
-    # Add a description column
-    filtered_df['description'] = filtered_df.apply(lambda x: format_task_description(x), axis=1)
+    # Add a description column, built column-wise for the whole page
+    filtered_df = filtered_df.assign(description=format_task_descriptions(filtered_df))
     
     # Display tasks
     st.dataframe(
@@ -144,43 +205,48 @@ def display_task_list(tasks_df, status=None):
         use_container_width=True,
         hide_index=True
     )
+    render_page_controls(list_key, next_cursor)
+    
+    if status == 'pending' and can_approve:
+        display_batch_actions(list_key, filtered_df)
     
     # Task selection for details
+    task_labels = build_label_map(filtered_df['id'], "ID: " + filtered_df['id'].astype(str) + " - " + filtered_df['description'])
     selected_task_id = st.selectbox(
         "Select Task to View Details",
-        options=filtered_df["id"].tolist(),
-        format_func=lambda x: f"ID: {x} - {filtered_df[filtered_df['id'] == x]['description'].iloc[0]}",
+        options=list(task_labels),
+        format_func=task_labels.__getitem__,
         key=f"select_task_{status or 'all'}"
     )
     
     if selected_task_id:
         st.divider()
-        display_task_details(selected_task_id)
-
-# Get all tasks
-tasks_df = get_tasks()
+        display_task_details(selected_task_id, list_key)
 
-# Display tasks in tabs
+# Display tasks in tabs; each tab loads only the page it shows
 with tabs[0]:
     st.header("Pending Tasks")
     if st.button("Refresh Pending Tasks", key="refresh_pending_tasks"):
         st.rerun()
-    display_task_list(tasks_df, 'pending')
+    display_task_list('pending')
 
 with tabs[1]:
     st.header("Approved Tasks")
     if st.button("Refresh Approved Tasks", key="refresh_approved_tasks"):
         st.rerun()
-    display_task_list(tasks_df, 'approved')
+    display_task_list('approved')
 
 with tabs[2]:
     st.header("Rejected Tasks")
     if st.button("Refresh Rejected Tasks", key="refresh_rejected_tasks"):
         st.rerun()
-    display_task_list(tasks_df, 'rejected')
+    display_task_list('rejected')
 
 with tabs[3]:
     st.header("All Tasks")
     if st.button("Refresh All Tasks", key="refresh_all_tasks"):
         st.rerun()
-    display_task_list(tasks_df)
+    display_task_list()
+
+# Record this rerun's render time for the page_render_seconds metric
+end_page_trace()
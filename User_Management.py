@@ -1,9 +1,12 @@
 import streamlit as st
 import pandas as pd
 from auth import hash_password, check_authentication, check_admin_access
-from database import get_db_connection, get_users
+from database import get_db_connection, get_users_page, search_users
 from models import User
-from utils import can_manage_users, can_view_users
+from utils import (
+    begin_page_trace, can_manage_users, can_view_users, end_page_trace, get_user_stats, get_page_cursor,
+    get_user_labels, render_export, render_page_controls, render_picker, user_labels
+)
 
 # Page configuration
 st.set_page_config(
@@ -12,6 +15,9 @@ st.set_page_config(
     layout="wide"
 )
 
+# Tag this rerun's SQL statements for the Diagnostics page
+begin_page_trace("User Management")
+
 # Check authentication
 if not check_authentication():
     st.warning("Please login to access this page")
@@ -35,37 +41,35 @@ with tabs[0]:
     if st.button("Refresh User List", key="refresh_user_list"):
         st.rerun()
     
-    # Get users
-    users_df = get_users()
+    # Filter options
+    col1, col2 = st.columns(2)
+    with col1:
+        role_filter = st.selectbox(
+            "Filter by Role",
+            options=["All"] + sorted(get_user_stats()["role_counts"]),
+            index=0,
+            key="role_filter_user_list"
+        )
+    
+    with col2:
+        search_term = st.text_input("Search by Username, Email or Name", key="search_user_term")
+    
+    filters = {'role': role_filter if role_filter != "All" else None}
+    render_export("users", dict(filters, search=search_term), "user_list")
+    
+    if search_term.strip():
+        # Ranked full-text search returns the best matches only
+        users_df = search_users(search_term, filters)
+        next_cursor = None
+    else:
+        # Fetch only the page being shown, filtered in the database
+        page_cursor = get_page_cursor("user_list", filters)
+        users_df, next_cursor = get_users_page(filters, cursor=page_cursor)
     
     if not users_df.empty:
-        # Filter options
-        col1, col2 = st.columns(2)
-        with col1:
-            role_filter = st.selectbox(
-                "Filter by Role",
-                options=["All"] + list(users_df["role"].unique()),
-                index=0,
-                key="role_filter_user_list"
-            )
-        
-        with col2:
-            search_term = st.text_input("Search by Username or Email", key="search_user_term")
-        
-        # Apply filters
-        filtered_df = users_df.copy()
-        if role_filter != "All":
-            filtered_df = filtered_df[filtered_df["role"] == role_filter]
-        
-        if search_term:
-            filtered_df = filtered_df[
-                filtered_df["username"].str.contains(search_term, case=False) |
-                filtered_df["email"].str.contains(search_term, case=False)
-            ]
-        
         # Display users table
         st.dataframe(
-            filtered_df,
+            users_df,
             column_config={
                 "id": "ID",
                 "username": "Username",
@@ -79,17 +83,22 @@ with tabs[0]:
             use_container_width=True,
             hide_index=True
         )
+        if search_term.strip():
+            st.caption(f"Showing the top {len(users_df)} matches")
+        else:
+            render_page_controls("user_list", next_cursor)
         
         # User actions (only for admin)
         if can_manage_users():
             st.subheader("User Actions")
+            page_user_labels = user_labels(users_df)
             
             col1, col2 = st.columns(2)
             with col1:
                 user_id_to_edit = st.selectbox(
                     "Select User to Edit",
-                    options=users_df["id"].tolist(),
-                    format_func=lambda x: f"{users_df[users_df['id'] == x]['username'].iloc[0]} (ID: {x})",
+                    options=list(page_user_labels),
+                    format_func=page_user_labels.__getitem__,
                     key="user_edit_select_list"
                 )
                 
@@ -102,8 +111,8 @@ with tabs[0]:
             with col2:
                 user_id_to_delete = st.selectbox(
                     "Select User to Delete",
-                    options=users_df["id"].tolist(),
-                    format_func=lambda x: f"{users_df[users_df['id'] == x]['username'].iloc[0]} (ID: {x})",
+                    options=list(page_user_labels),
+                    format_func=page_user_labels.__getitem__,
                     key="user_delete_select_list"
                 )
                 
@@ -129,6 +138,8 @@ with tabs[0]:
                     else:
                         st.session_state.confirm_delete = True
                         st.warning(f"Are you sure you want to delete this user? Click 'Delete Selected User' again to confirm.")
+    elif role_filter != "All" or search_term:
+        st.info("No users match the current filters")
     else:
         st.info("No users found in the database")
 
@@ -198,14 +209,10 @@ with tabs[2]:
         user_to_edit = st.session_state.get("user_to_edit", None)
         
         if not user_to_edit:
-            users_df = get_users()
-            if not users_df.empty:
-                user_to_edit = st.selectbox(
-                    "Select User to Edit",
-                    options=users_df["id"].tolist(),
-                    format_func=lambda x: f"{users_df[users_df['id'] == x]['username'].iloc[0]} (ID: {x})",
-                    key="user_edit_tab_select"
-                )
+            # Labels are built once per version of the table; large tables get a searchable picker
+            all_user_labels = get_user_labels()
+            if all_user_labels:
+                user_to_edit = render_picker("Select User to Edit", all_user_labels, key="user_edit_tab_select")
         
         if user_to_edit:
             # Get user details
@@ -298,3 +305,6 @@ if 'active_tab' in st.session_state:
     if st.session_state.active_tab == "Edit User":
         st.session_state.tabs_selected = 2
         del st.session_state.active_tab
+
+# Record this rerun's render time for the page_render_seconds metric
+end_page_trace()
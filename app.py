@@ -6,7 +6,9 @@ import os
 import datetime
 from auth import check_authentication, authenticate_user, create_default_users
 from database import initialize_database
-from utils import get_user_role, get_user_stats, get_reference_data_stats, get_task_stats
+from jobs import start_worker
+from metrics import start_exporter
+from utils import begin_page_trace, end_page_trace, get_user_role, get_user_stats, get_reference_data_stats, get_task_stats
 
 # Page configuration
 st.set_page_config(
@@ -16,9 +18,17 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Initialize database
-initialize_database()
-create_default_users()
+# Tag this rerun's SQL statements for the Diagnostics page
+begin_page_trace("Dashboard")
+
+# Initialize database (migrations and default users run once per process)
+initialize_database(seed=create_default_users)
+
+# Start the background job worker (resumes queued or abandoned approvals)
+start_worker()
+
+# Serve metrics for scraping and dump them to a local file (see metrics.py)
+start_exporter()
 
 # Custom CSS for styling
 st.markdown("""
@@ -355,4 +365,7 @@ else:
     - **Role-Based Access**: Secure permissions based on user roles (Super Admin and Data Analyst)
     
     Navigate through the modules using the sidebar menu according to your role permissions.
-    """)
\ No newline at end of file
+    """)
+
+# Record this rerun's render time for the page_render_seconds metric
+end_page_trace()
@@ -1,11 +1,8 @@
 import streamlit as st
 import sqlite3
-import hashlib
 from database import get_db_connection
-
-def hash_password(password):
-    """Hash a password using SHA-256"""
-    return hashlib.sha256(password.encode()).hexdigest()
+from cache import bump_table_version
+from passwords import hash_password, verify_password
 
 def create_default_users():
     """Create default users if they don't exist"""
@@ -32,6 +29,7 @@ def create_default_users():
     
     conn.commit()
     conn.close()
+    bump_table_version('users')
 
 def authenticate_user(username, password):
     """Authenticate a user with username and password"""
@@ -49,7 +47,7 @@ def authenticate_user(username, password):
     user = cursor.fetchone()
     conn.close()
     
-    if user and user[1] == hash_password(password):
+    if user and verify_password(password, user[1]):
         # Set session variables
         st.session_state.authenticated = True
         st.session_state.username = user[0]
@@ -0,0 +1,193 @@
+"""Micro-benchmarks for the data layer against a synthetic database
+
+Run from the repository root, choosing a dataset size with --scale:
+
+    python -m pytest benchmarks/bench_data_layer.py --scale 100k
+
+Results are saved as JSON under .benchmarks/ (see benchmarks/pytest.ini) and
+can be compared between releases with ``pytest-benchmark compare``.
+"""
+import itertools
+import random
+
+import pandas as pd
+import pytest
+
+import cache
+import database
+import export
+import ingestion
+import lookup
+import synthetic
+import utils
+from models import Task
+
+SINGLE_TASK_ROUNDS = 20
+BULK_TASK_ROUNDS = 3
+PARSE_ROUNDS = 3
+LOOKUP_BATCH_SIZE = 1000000
+# Interactive budget for one search, checked up to the 100k dataset
+SEARCH_TARGET_SECONDS = 0.1
+
+_sequence = itertools.count()
+
+
+@pytest.fixture
+def cold_cache(bench_db):
+    """Setup function that empties the result cache so each round queries SQLite"""
+    def setup():
+        cache.clear()
+    return setup
+
+
+@pytest.mark.parametrize("cached", [False, True], ids=["cold", "warm"])
+@pytest.mark.parametrize("loader", [
+    database.get_users,
+    database.get_reference_data,
+    lambda: database.get_reference_data(synthetic.data_type_name(0)),
+    database.get_tasks,
+    lambda: database.get_tasks('pending'),
+], ids=["get_users", "get_reference_data", "get_reference_data_by_type", "get_tasks", "get_tasks_pending"])
+def test_list_queries(benchmark, bench_db, cold_cache, loader, cached):
+    if cached:
+        loader()
+        result = benchmark(loader)
+    else:
+        result = benchmark.pedantic(loader, setup=cold_cache, rounds=5)
+    assert not result.empty
+
+
+@pytest.mark.parametrize("stats", [utils.get_user_stats, utils.get_reference_data_stats, utils.get_task_stats],
+                         ids=["users", "reference_data", "tasks"])
+def test_stats(benchmark, bench_db, stats):
+    assert benchmark(stats)
+
+
+def _insert_entity(entity_type, n):
+    """Insert a row to be updated or deleted by a benchmarked task; returns its id"""
+    rng = random.Random(n)
+    conn = database.get_db_connection()
+    try:
+        if entity_type == 'user':
+            record = synthetic.user_record(n, rng, prefix='benchtarget')
+            cursor = conn.execute(
+                "INSERT INTO users (username, password_hash, role, email) VALUES (?, 'x', ?, ?)",
+                (record['username'], record['role'], record['email'])
+            )
+        else:
+            record = synthetic.reference_record(n, 1, rng, prefix='BT')
+            cursor = conn.execute(
+                "INSERT INTO reference_data (data_type, code, value) VALUES (?, ?, ?)",
+                (record['data_type'], record['code'], record['value'])
+            )
+        conn.commit()
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+
+def _task_data(task_type, entity_type, n):
+    """Payload of a benchmarked single-entity task"""
+    rng = random.Random(n)
+    if task_type == 'create':
+        if entity_type == 'user':
+            return dict(synthetic.user_record(n, rng, prefix='benchnew'), password_hash='x')
+        return synthetic.reference_record(n, 1, rng, prefix='BN')
+    if task_type == 'update':
+        if entity_type == 'user':
+            return {'department': 'Benchmarks', 'email': f"bench{n}@example.com"}
+        return {'value': f"Benchmark value {n}", 'description': 'Updated by benchmark', 'status': 'active'}
+    return {}
+
+
+@pytest.mark.parametrize("filtered", [False, True], ids=["all", "filtered"])
+@pytest.mark.parametrize("search, term, filters", [
+    (database.search_reference_data, "Value", {'data_type': synthetic.data_type_name(3)}),
+    (database.search_reference_data, "C00001", {'data_type': synthetic.data_type_name(1)}),
+    (database.search_users, "Synthetic", {'role': 'data_analyst'}),
+], ids=["reference_data_common", "reference_data_code", "users_common"])
+def test_search(benchmark, bench_db, scale, search, term, filters, filtered):
+    result = benchmark(search, term, filters if filtered else None)
+    assert not result.empty
+    # No timings are collected under --benchmark-disable
+    if benchmark.enabled and scale != '1m':
+        assert benchmark.stats['mean'] < SEARCH_TARGET_SECONDS
+
+
+@pytest.mark.parametrize("entity_type", ["user", "reference_data"])
+@pytest.mark.parametrize("task_type", ["create", "update", "delete"])
+def test_approve_task(benchmark, bench_db, task_type, entity_type):
+    def setup():
+        n = next(_sequence)
+        entity_id = None if task_type == 'create' else _insert_entity(entity_type, n)
+        task_id = Task.create(task_type, entity_type, entity_id, _task_data(task_type, entity_type, n), 'analyst')
+        return (task_id, 'admin'), {}
+
+    assert benchmark.pedantic(Task.approve, setup=setup, rounds=SINGLE_TASK_ROUNDS)
+
+
+@pytest.mark.parametrize("entity_type", ["user", "reference_data"])
+def test_approve_bulk_upload(benchmark, bench_db, counts, entity_type):
+    def setup():
+        conn = database.get_db_connection()
+        try:
+            n = next(_sequence)
+            task_id = synthetic.stage_bulk_upload(
+                conn.cursor(), entity_type, counts['bulk_records'], counts['data_types'], random.Random(n),
+                prefix=f"benchbulk{n}_"
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        return (task_id, 'admin'), {}
+
+    assert benchmark.pedantic(Task.approve, setup=setup, rounds=BULK_TASK_ROUNDS)
+
+
+@pytest.mark.parametrize("entity_type", ["user", "reference_data"])
+@pytest.mark.parametrize("file_format", ["csv", "xlsx"])
+def test_parse_upload(benchmark, bench_db, upload_files, counts, entity_type, file_format):
+    path = upload_files[(entity_type, file_format)]
+    reader = ingestion.iter_csv_chunks if file_format == 'csv' else ingestion.iter_excel_chunks
+
+    def parse():
+        validator = ingestion.UploadValidator(entity_type)
+        with open(path, 'rb') as f:
+            return sum(len(chunk) for chunk in ingestion.validate_stream(reader(f, validator=validator), validator))
+
+    assert benchmark.pedantic(parse, rounds=PARSE_ROUNDS) == counts['bulk_records']
+
+
+def test_lookup_refresh(benchmark, bench_db):
+    assert benchmark.pedantic(lookup.refresh, kwargs={'force': True}, rounds=PARSE_ROUNDS)
+
+
+def _lookup_codes(size):
+    """A Series of active codes of the first data type, repeated to size"""
+    data_type = synthetic.data_type_name(0)
+    page, _ = database.get_reference_data_page({'data_type': data_type, 'status': 'active'})
+    codes = page['code'].tolist()
+    return data_type, pd.Series(codes * (size // len(codes) + 1))[:size]
+
+
+def test_lookup(benchmark, bench_db):
+    data_type, codes = _lookup_codes(1)
+    assert benchmark(lookup.lookup, data_type, codes.iloc[0]) is not None
+
+
+def test_lookup_many(benchmark, bench_db):
+    data_type, codes = _lookup_codes(LOOKUP_BATCH_SIZE)
+    benchmark.extra_info['codes'] = len(codes)
+    assert benchmark.pedantic(lookup.lookup_many, (data_type, codes), rounds=PARSE_ROUNDS).notna().all()
+
+
+@pytest.mark.parametrize("file_format", export.available_formats())
+@pytest.mark.parametrize("table", ["users", "reference_data"])
+def test_export(benchmark, bench_db, tmp_path, table, file_format):
+    path = tmp_path / export.export_file_name(table, file_format)
+
+    def run():
+        with open(path, 'wb') as out:
+            return export.export_table(table, {}, file_format, out)
+
+    assert benchmark.pedantic(run, rounds=PARSE_ROUNDS)
@@ -0,0 +1,187 @@
+"""End-to-end page render benchmarks using Streamlit's headless AppTest
+
+Each benchmark renders one page, or one interaction on it, for a logged-in
+session against the synthetic database:
+
+    python -m pytest benchmarks/bench_pages.py --scale 100k
+
+Besides wall time, every result records the number of SQL statements the
+timed reruns executed, taken from the per-rerun totals in tracing.py, and
+the peak Python memory of one extra traced rerun,
+under ``extra_info`` in the saved JSON and in a summary table at the end.
+The process-wide result cache stays warm between rounds, as it does on a
+server handling many sessions.
+"""
+import shutil
+import time
+import tracemalloc
+from pathlib import Path
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+import database
+import tracing
+from models import Task
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Where each script sits in a deployed multipage app; app.py links to these paths
+DEPLOYED_PAGES = {
+    'app.py': 'app.py',
+    'User_Management.py': 'pages/1_User_Management.py',
+    'Reference_Data_Management.py': 'pages/2_Reference_Data_Management.py',
+    'Task_Operations.py': 'pages/3_Task_Operations.py',
+    'Bulk_Upload.py': 'pages/4_Bulk_Upload.py',
+    'Diagnostics.py': 'pages/5_Diagnostics.py',
+}
+RENDER_TIMEOUT = 600
+RENDER_ROUNDS = 5
+
+# Logged-in sessions as (username, role)
+SESSIONS = {
+    'super_admin': ('admin', 'super_admin'),
+    'data_analyst': ('analyst', 'data_analyst'),
+}
+
+
+@pytest.fixture(scope="module", autouse=True)
+def count_statements():
+    """Turn on statement counting (off by default) for connections opened by these benchmarks"""
+    previous = tracing.COUNT_STATEMENTS
+    tracing.COUNT_STATEMENTS = True
+    database.close_all_connections()
+    yield
+    tracing.COUNT_STATEMENTS = previous
+    database.close_all_connections()
+
+
+@pytest.fixture(scope="module")
+def app_dir(tmp_path_factory):
+    """A deployed app layout holding copies of the scripts in this repository
+
+    Streamlit resolves symlinks, so the pages are copied for it to find them
+    under pages/; the modules they import still come from the repository.
+    """
+    directory = tmp_path_factory.mktemp("app")
+    (directory / "pages").mkdir()
+    for script, deployed in DEPLOYED_PAGES.items():
+        shutil.copyfile(ROOT / script, directory / deployed)
+    return directory
+
+
+def logged_in_app(app_dir, page, session):
+    """AppTest for a page with the session already authenticated"""
+    username, role = SESSIONS[session]
+    at = AppTest.from_file(str(app_dir / DEPLOYED_PAGES[page]), default_timeout=RENDER_TIMEOUT)
+    at.session_state.authenticated = True
+    at.session_state.username = username
+    at.session_state.role = role
+    return at
+
+
+def check_rendered(at):
+    """Fail the benchmark if the page raised instead of rendering"""
+    if at.exception:
+        raise AssertionError(f"Page raised: {at.exception[0].message}")
+
+
+def statements_since(started_at):
+    """SQL statements run by the page reruns that began at or after started_at"""
+    return sum(rerun['statements'] for rerun in tracing.recent_reruns() if rerun['started_at'] >= started_at)
+
+
+def measure(benchmark, prepare, interact):
+    """Benchmark interact(at) on a fresh, prepared AppTest per round and record its costs
+
+    ``prepare()`` builds the AppTest and runs whatever should happen before
+    the timed step; ``interact(at)`` performs the timed rerun.
+    """
+    def setup():
+        return (prepare(),), {}
+
+    def timed(at):
+        at.started_at = time.time()
+        interact(at)
+        return at
+
+    at = benchmark.pedantic(timed, setup=setup, rounds=RENDER_ROUNDS)
+    check_rendered(at)
+    benchmark.extra_info['sql_statements'] = statements_since(at.started_at)
+
+    # One more round with allocation tracing, kept out of the timings
+    at = prepare()
+    tracemalloc.start()
+    try:
+        started = time.perf_counter()
+        interact(at)
+        benchmark.extra_info['traced_seconds'] = time.perf_counter() - started
+        benchmark.extra_info['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    check_rendered(at)
+
+
+@pytest.mark.parametrize("session", sorted(SESSIONS))
+@pytest.mark.parametrize("page", list(DEPLOYED_PAGES))
+def test_render_page(benchmark, app_dir, page, session, bench_db):
+    measure(benchmark, lambda: logged_in_app(app_dir, page, session), lambda at: at.run())
+
+
+def _rendered(app_dir, page, session='super_admin'):
+    """Prepare step that renders a page once, so the timed step is a rerun after an interaction"""
+    def prepare():
+        at = logged_in_app(app_dir, page, session)
+        at.run()
+        check_rendered(at)
+        return at
+    return prepare
+
+
+def test_search_reference_data(benchmark, app_dir, bench_db):
+    measure(
+        benchmark, _rendered(app_dir, 'Reference_Data_Management.py'),
+        lambda at: at.text_input(key="ref_data_search").input("C000012").run()
+    )
+
+
+def test_filter_reference_data(benchmark, app_dir, bench_db):
+    measure(
+        benchmark, _rendered(app_dir, 'Reference_Data_Management.py'),
+        lambda at: at.selectbox(key="ref_data_type_filter").select_index(1).run()
+    )
+
+
+def test_search_users(benchmark, app_dir, bench_db):
+    measure(
+        benchmark, _rendered(app_dir, 'User_Management.py'),
+        lambda at: at.text_input(key="search_user_term").input("user00001").run()
+    )
+
+
+def test_filter_users(benchmark, app_dir, bench_db):
+    measure(
+        benchmark, _rendered(app_dir, 'User_Management.py'),
+        lambda at: at.selectbox(key="role_filter_user_list").select_index(1).run()
+    )
+
+
+def test_select_task(benchmark, app_dir, bench_db):
+    measure(
+        benchmark, _rendered(app_dir, 'Task_Operations.py'),
+        lambda at: at.selectbox(key="select_task_pending").select_index(1).run()
+    )
+
+
+def test_approve_task(benchmark, app_dir, bench_db):
+    def prepare():
+        # A new pending task is the newest, so the Pending tab shows and selects it first
+        task_id = Task.create('update', 'reference_data', 1, {'value': 'Approved from benchmark'}, 'analyst')
+        at = _rendered(app_dir, 'Task_Operations.py')()
+        at.task_id = task_id
+        return at
+
+    measure(
+        benchmark, prepare,
+        lambda at: at.button(key=f"approve_task_details_task_list_pending_{at.task_id}").click().run()
+    )
@@ -0,0 +1,80 @@
+"""Fixtures for the data layer benchmarks
+
+The suite runs against a synthetic database of the size chosen with
+``--scale`` (1k, 100k or 1m; see synthetic.SCALES), generated once per session
+in a temporary directory.
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import cache  # noqa: E402
+import database  # noqa: E402
+import synthetic  # noqa: E402
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--scale", default="1k", choices=sorted(synthetic.SCALES),
+        help="Synthetic dataset size to benchmark against (default: 1k)"
+    )
+
+
+def pytest_benchmark_update_json(config, benchmarks, output_json):
+    """Record the dataset scale with the saved results so runs are compared like for like"""
+    output_json['scale'] = config.getoption("--scale")
+    output_json['dataset'] = synthetic.SCALES[config.getoption("--scale")]
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    """List the SQL statement count and peak memory recorded by the page render benchmarks"""
+    benchmark_session = getattr(config, '_benchmarksession', None)
+    results = [
+        result for result in getattr(benchmark_session, 'benchmarks', [])
+        if 'sql_statements' in result.extra_info
+    ]
+    if not results:
+        return
+    terminalreporter.section("page render costs")
+    width = max(len(result.name) for result in results)
+    terminalreporter.write_line(f"{'Name':<{width}}  {'Mean (ms)':>10}  {'SQL':>6}  {'Peak memory (MiB)':>17}")
+    for result in sorted(results, key=lambda result: result.name):
+        terminalreporter.write_line(
+            f"{result.name:<{width}}  {result.stats.mean * 1000:>10.1f}  {result.extra_info['sql_statements']:>6}"
+            f"  {result.extra_info['peak_memory_bytes'] / 2 ** 20:>17.1f}"
+        )
+
+
+@pytest.fixture(scope="session")
+def scale(request):
+    return request.config.getoption("--scale")
+
+
+@pytest.fixture(scope="session")
+def counts(scale):
+    return synthetic.SCALES[scale]
+
+
+@pytest.fixture(scope="session")
+def bench_db(tmp_path_factory, scale):
+    """Path of the session's synthetic database, made the active DB_PATH"""
+    path = str(tmp_path_factory.mktemp("data") / f"bench_{scale}.db")
+    synthetic.generate(path, scale)
+    cache.clear()
+    yield path
+    database.close_all_connections()
+
+
+@pytest.fixture(scope="session")
+def upload_files(tmp_path_factory, counts):
+    """CSV and Excel upload files for each entity type, keyed by (entity_type, format)"""
+    directory = tmp_path_factory.mktemp("uploads")
+    rows = counts['bulk_records']
+    return {
+        (entity_type, suffix): synthetic.write_upload_file(str(directory / f"{entity_type}.{suffix}"), entity_type, rows)
+        for entity_type in ('user', 'reference_data')
+        for suffix in ('csv', 'xlsx')
+    }
@@ -0,0 +1,187 @@
+"""Set-based application of bulk upload records during task approval
+
+Records are loaded into a temporary staging table (with batched executemany,
+or straight from the task_records table for uploads staged there),
+rows that cannot be inserted are flagged with a single anti-join UPDATE, and
+the remainder are copied into the target table with one INSERT ... SELECT.
+Everything runs on the caller's cursor, so it commits or rolls back with the
+approval transaction.
+"""
+import time
+from itertools import islice
+
+import metrics
+
+BATCH_SIZE = 10000
+REPORTED_CONFLICTS = 20
+
+BULK_ROWS = metrics.counter('bulk_rows_total', 'Bulk upload rows processed, by outcome', ('entity_type', 'outcome'))
+BULK_APPLY_SECONDS = metrics.histogram('bulk_apply_seconds', 'Time to apply one bulk upload batch', ('entity_type',))
+BULK_ROWS_PER_SECOND = metrics.gauge(
+    'bulk_rows_per_second', 'Rows inserted per second by the latest bulk upload batch', ('entity_type',)
+)
+
+# Target table, unique key, inserted columns and NOT NULL columns per entity type
+BULK_TARGETS = {
+    'user': {
+        'table': 'users',
+        'key_columns': ('username',),
+        'columns': ('username', 'password_hash', 'role', 'email', 'full_name', 'department'),
+        'required_columns': ('username', 'password_hash', 'role'),
+    },
+    'reference_data': {
+        'table': 'reference_data',
+        'key_columns': ('data_type', 'code'),
+        'columns': ('data_type', 'code', 'value', 'description'),
+        'required_columns': ('data_type', 'code', 'value'),
+    },
+}
+
+
+def _create_staging(cursor, staging_table, columns):
+    """Create an empty temp staging table for the given columns"""
+    column_defs = ', '.join(f"{column} TEXT" for column in columns)
+    cursor.execute(f"DROP TABLE IF EXISTS temp.{staging_table}")
+    cursor.execute(
+        f"CREATE TEMP TABLE {staging_table} (row_num INTEGER PRIMARY KEY, {column_defs}, skip INTEGER NOT NULL DEFAULT 0)"
+    )
+
+
+def _load_staging(cursor, staging_table, columns, rows):
+    """Fill the staging table from an iterable of tuples in batches; returns the row count"""
+    insert_sql = (
+        f"INSERT INTO temp.{staging_table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+    )
+    rows = iter(rows)
+    total = 0
+    while True:
+        batch = list(islice(rows, BATCH_SIZE))
+        if not batch:
+            return total
+        cursor.executemany(insert_sql, batch)
+        total += len(batch)
+
+
+def _apply_staged(cursor, entity_type, staging_table, total, created_by):
+    """Flag conflicting staged rows with an anti-join and insert the rest in one statement"""
+    spec = BULK_TARGETS[entity_type]
+    table = spec['table']
+    columns = spec['columns']
+    key_match = ' AND '.join(f"t.{column} = s.{column}" for column in spec['key_columns'])
+    key_list = ', '.join(spec['key_columns'])
+    missing_required = ' OR '.join(f"s.{column} IS NULL" for column in spec['required_columns'])
+
+    # Anti-join: flag every row that cannot be inserted in one pass
+    cursor.execute(
+        f"""
+        UPDATE temp.{staging_table} AS s
+        SET skip = 1
+        WHERE {missing_required}
+           OR row_num NOT IN (SELECT MIN(row_num) FROM temp.{staging_table} GROUP BY {key_list})
+           OR EXISTS (SELECT 1 FROM {table} AS t WHERE {key_match})
+        """
+    )
+    cursor.execute(
+        f"SELECT row_num, {key_list} FROM temp.{staging_table} WHERE skip = 1 ORDER BY row_num LIMIT ?",
+        (REPORTED_CONFLICTS,)
+    )
+    conflicts = [tuple(row) for row in cursor.fetchall()]
+
+    cursor.execute(
+        f"""
+        INSERT INTO {table} ({', '.join(columns)}, created_by)
+        SELECT {', '.join(columns)}, ?
+        FROM temp.{staging_table}
+        WHERE skip = 0
+        ORDER BY row_num
+        """,
+        (created_by,)
+    )
+    inserted = cursor.rowcount
+    cursor.execute(f"DROP TABLE temp.{staging_table}")
+
+    return {
+        'total': total,
+        'inserted': inserted,
+        'skipped': total - inserted,
+        'conflicts': conflicts,
+    }
+
+
+def _observe(entity_type, result, started):
+    """Record a batch's row counts, duration and insert rate in the bulk upload metrics"""
+    seconds = time.perf_counter() - started
+    BULK_ROWS.inc(result['inserted'], entity_type=entity_type, outcome='inserted')
+    BULK_ROWS.inc(result['skipped'], entity_type=entity_type, outcome='skipped')
+    BULK_APPLY_SECONDS.observe(seconds, entity_type=entity_type)
+    if seconds > 0:
+        BULK_ROWS_PER_SECOND.set(result['inserted'] / seconds, entity_type=entity_type)
+
+
+def apply_bulk_records(cursor, entity_type, rows, created_by):
+    """Insert bulk upload rows into their table, skipping rows that would conflict
+
+    ``rows`` is an iterable of tuples in BULK_TARGETS[entity_type]['columns']
+    order. A row is skipped if a required value is missing, if its key already
+    exists in the table, or if it repeats the key of an earlier row in the
+    upload. Returns a dict with the inserted and skipped counts and the keys of
+    the first few skipped rows.
+    """
+    started = time.perf_counter()
+    staging_table = f"bulk_{BULK_TARGETS[entity_type]['table']}"
+    columns = BULK_TARGETS[entity_type]['columns']
+    _create_staging(cursor, staging_table, columns)
+    total = _load_staging(cursor, staging_table, columns, rows)
+    result = _apply_staged(cursor, entity_type, staging_table, total, created_by)
+    _observe(entity_type, result, started)
+    return result
+
+
+def apply_task_records(cursor, entity_type, task_id, created_by, password_hashes=None, row_range=None):
+    """Apply a bulk upload staged in task_records, entirely in SQL
+
+    For user uploads, ``password_hashes`` maps each plain password in the task
+    to its hash (see Task.approve); records that already carry a password_hash
+    keep it. ``row_range`` limits the call to rows (first, last) inclusive, so
+    large uploads can be applied in checkpointed chunks; rows duplicating an
+    earlier chunk are skipped because they already exist in the table.
+    Returns the same result dict as apply_bulk_records.
+    """
+    started = time.perf_counter()
+    staging_table = f"bulk_{BULK_TARGETS[entity_type]['table']}"
+    columns = BULK_TARGETS[entity_type]['columns']
+    _create_staging(cursor, staging_table, columns)
+
+    if entity_type == 'user':
+        cursor.execute("DROP TABLE IF EXISTS temp.bulk_password_hashes")
+        cursor.execute("CREATE TEMP TABLE bulk_password_hashes (password TEXT PRIMARY KEY, password_hash TEXT)")
+        cursor.executemany(
+            "INSERT INTO temp.bulk_password_hashes (password, password_hash) VALUES (?, ?)",
+            (password_hashes or {}).items()
+        )
+        source_columns = [
+            "COALESCE(r.password_hash, h.password_hash)" if column == 'password_hash' else f"r.{column}"
+            for column in columns
+        ]
+        source = "task_records AS r LEFT JOIN temp.bulk_password_hashes AS h ON h.password = r.password"
+    else:
+        source_columns = [f"r.{column}" for column in columns]
+        source = "task_records AS r"
+
+    row_filter = "AND r.row_num BETWEEN ? AND ?" if row_range else ""
+    cursor.execute(
+        f"""
+        INSERT INTO temp.{staging_table} (row_num, {', '.join(columns)})
+        SELECT r.row_num, {', '.join(source_columns)}
+        FROM {source}
+        WHERE r.task_id = ? {row_filter}
+        ORDER BY r.row_num
+        """,
+        (task_id, *row_range) if row_range else (task_id,)
+    )
+    total = cursor.rowcount
+    result = _apply_staged(cursor, entity_type, staging_table, total, created_by)
+    if entity_type == 'user':
+        cursor.execute("DROP TABLE temp.bulk_password_hashes")
+    _observe(entity_type, result, started)
+    return result
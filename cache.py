@@ -0,0 +1,118 @@
+"""Process-wide query result cache invalidated by per-table version counters
+
+Every table the app reads has a version number held in this process. Model
+write paths call ``bump_table_version`` after committing, and a cached result
+is reused only while the versions of the tables it was built from are
+unchanged. Entries are evicted least-recently-used first once the cache holds
+more than MAX_ENTRIES results or MAX_BYTES of data.
+
+Cached DataFrames are shared between sessions. Their arrays are made read-only
+when stored, and each hit hands out a shallow view over those arrays, so no data
+is copied and a caller that assigns to its frame cannot alter the cached one.
+"""
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+MAX_ENTRIES = 256
+MAX_BYTES = 512 * 1024 * 1024
+
+_lock = threading.RLock()
+_table_versions = {}
+_entries = OrderedDict()  # key -> (versions, value, size in bytes)
+_total_bytes = 0
+
+
+def get_table_version(table):
+    """Current version of a table in this process"""
+    return _table_versions.get(table, 0)
+
+
+def bump_table_version(*tables):
+    """Invalidate every cached result that was built from any of these tables"""
+    with _lock:
+        for table in tables:
+            _table_versions[table] = _table_versions.get(table, 0) + 1
+
+
+def _estimate_size(value):
+    """Approximate memory footprint of a cached value in bytes"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(sys.getsizeof(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+
+def _freeze(value):
+    """Mark a DataFrame's underlying arrays read-only so shared hits cannot be mutated"""
+    if isinstance(value, pd.DataFrame):
+        for block in getattr(value._mgr, 'blocks', ()):
+            if isinstance(block.values, np.ndarray):
+                block.values.flags.writeable = False
+    return value
+
+
+def _share(value):
+    """Hand out a cached value; DataFrames get a shallow view over the frozen arrays"""
+    if isinstance(value, pd.DataFrame):
+        return value.copy(deep=False)
+    return value
+
+
+def _evict():
+    """Drop least recently used entries until within both limits"""
+    global _total_bytes
+    while _entries and (len(_entries) > MAX_ENTRIES or _total_bytes > MAX_BYTES):
+        _, (_, _, size) = _entries.popitem(last=False)
+        _total_bytes -= size
+
+
+def cached(tables, key, loader):
+    """Return the cached result for key, calling loader() if it is missing or stale
+
+    ``tables`` names every table the loader reads; ``key`` must identify the
+    query and its parameters. Hits share the stored data rather than copying it.
+    """
+    global _total_bytes
+    versions = tuple(get_table_version(table) for table in tables)
+
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and entry[0] == versions:
+            _entries.move_to_end(key)
+            return _share(entry[1])
+
+    value = _freeze(loader())
+    size = _estimate_size(value)
+
+    with _lock:
+        # A write may have landed while loading; only store a result that is still current
+        if versions == tuple(get_table_version(table) for table in tables):
+            previous = _entries.pop(key, None)
+            if previous is not None:
+                _total_bytes -= previous[2]
+            if size <= MAX_BYTES:
+                _entries[key] = (versions, value, size)
+                _total_bytes += size
+                _evict()
+    return _share(value)
+
+
+def clear():
+    """Drop every cached result"""
+    global _total_bytes
+    with _lock:
+        _entries.clear()
+        _total_bytes = 0
+
+
+def stats():
+    """Entry count and approximate size of the cache"""
+    with _lock:
+        return {"entries": len(_entries), "bytes": _total_bytes}
@@ -1,46 +1,113 @@
 import sqlite3
 import os
+import queue
+import re
+import threading
 import pandas as pd
+import tracing
+from cache import cached
 
 DB_PATH = 'data_governance.db'
 
-def get_db_connection():
-    """Create a connection to the SQLite database"""
-    conn = sqlite3.connect(DB_PATH)
+# Connection pool settings. Streamlit runs one script thread per active
+# session, so the pool only needs to cover the sessions rerunning at once;
+# connections beyond POOL_SIZE are closed instead of being returned.
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 16))
+BUSY_TIMEOUT_MS = 30000
+STATEMENT_CACHE_SIZE = 256
+
+# Pragmas applied once when a pooled connection is opened
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -65536",  # 64 MiB page cache per connection
+    "PRAGMA mmap_size = 268435456",  # 256 MiB memory-mapped I/O
+    "PRAGMA temp_store = MEMORY",
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+)
+
+_pool = queue.LifoQueue(maxsize=POOL_SIZE)
+
+# Cursors time and record their statements unless SQL_TRACE=0 (see tracing.py)
+CURSOR_FACTORY = tracing.TracedCursor if tracing.TRACE_ENABLED else sqlite3.Cursor
+
+
+class PooledConnection(sqlite3.Connection):
+    """SQLite connection that returns itself to the pool when closed"""
+
+    _pooled = False
+
+    def cursor(self, factory=None):
+        """Open a cursor, traced unless another factory is given"""
+        return super().cursor(factory or CURSOR_FACTORY)
+
+    # The sqlite3 shortcuts build a plain Cursor; route them through cursor() so they are traced
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+    def close(self):
+        """Release the connection back to the pool instead of closing it"""
+        if self._pooled:
+            return
+        if self.in_transaction:
+            self.rollback()
+        self._pooled = True
+        try:
+            _pool.put_nowait(self)
+        except queue.Full:
+            super().close()
+
+    def close_underlying(self):
+        """Really close the SQLite handle"""
+        self._pooled = True
+        super().close()
+
+
+def _open_connection():
+    """Open a new pooled connection with the tuned pragmas applied"""
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        factory=PooledConnection,
+        check_same_thread=False,  # connections move between script threads via the pool
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
     conn.row_factory = sqlite3.Row
+    tracing.install(conn)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
     return conn
 
-def initialize_database():
-    """Initialize the database with required tables if they don't exist"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Check if we need to perform migration for the users table
-    cursor.execute("PRAGMA table_info(users)")
-    columns = [col[1] for col in cursor.fetchall()]
-    
-    # If users table doesn't exist, create it
-    if not columns:
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            role TEXT NOT NULL,
-            email TEXT,
-            full_name TEXT,
-            department TEXT,
-            created_by TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-    # If users table exists but doesn't have created_by column, add it
-    elif 'created_by' not in columns:
-        print("Migrating users table: Adding created_by column")
-        cursor.execute('ALTER TABLE users ADD COLUMN created_by TEXT')
-        
-    # Create users table (this is now a safe operation as SQLite will ignore it if exists)
+def get_db_connection():
+    """Get a connection to the SQLite database from the pool
+
+    Callers keep the usual ``conn.close()`` pattern; closing hands the
+    connection back to the pool, rolling back anything left uncommitted.
+    """
+    try:
+        conn = _pool.get_nowait()
+    except queue.Empty:
+        return _open_connection()
+    conn._pooled = False
+    return conn
+
+def close_all_connections():
+    """Close every idle pooled connection (e.g. before swapping DB_PATH)"""
+    while True:
+        try:
+            conn = _pool.get_nowait()
+        except queue.Empty:
+            return
+        conn.close_underlying()
+
+def _create_base_schema(cursor):
+    """Create the original tables (schema version 0) if they don't exist"""
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS users (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -88,41 +155,757 @@ def initialize_database():
         approved_at TIMESTAMP
     )
     ''')
+
+def _migration_001_users_created_by(cursor):
+    """Add created_by to users tables created before the column existed"""
+    cursor.execute("PRAGMA table_info(users)")
+    columns = [col[1] for col in cursor.fetchall()]
+    if 'created_by' not in columns:
+        print("Migrating users table: Adding created_by column")
+        cursor.execute('ALTER TABLE users ADD COLUMN created_by TEXT')
+
+def _migration_002_hot_path_indexes(cursor):
+    """Add secondary indexes for the queries in QUERY_CATALOG"""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status_created_at ON tasks(status, created_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_task_type_created_at ON tasks(task_type, created_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks(created_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_role ON users(role)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_reference_data_status_data_type ON reference_data(status, data_type)")
+    cursor.execute("ANALYZE")
+
+# Counters kept in stats_counters as (scope, table, column); each row of the
+# table counts once under the key given by its column value.
+STATS_COUNTER_SCOPES = [
+    ('users.role', 'users', 'role'),
+    ('reference_data.data_type', 'reference_data', 'data_type'),
+    ('tasks.status', 'tasks', 'status'),
+    ('tasks.task_type', 'tasks', 'task_type'),
+]
+
+def _migration_003_stats_counters(cursor):
+    """Add stats_counters and the triggers that keep it in step with its tables"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS stats_counters (
+        scope TEXT NOT NULL,
+        key TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (scope, key)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute("DELETE FROM stats_counters")
     
-    conn.commit()
-    conn.close()
+    for scope, table, column in STATS_COUNTER_SCOPES:
+        trigger_base = f"trg_stats_{table}_{column}"
+        new_key = f"COALESCE(NEW.{column}, '')"
+        old_key = f"COALESCE(OLD.{column}, '')"
+        increment = (
+            f"INSERT INTO stats_counters (scope, key, count) VALUES ('{scope}', {new_key}, 1) "
+            f"ON CONFLICT(scope, key) DO UPDATE SET count = count + 1;"
+        )
+        decrement = f"UPDATE stats_counters SET count = count - 1 WHERE scope = '{scope}' AND key = {old_key};"
+        
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {trigger_base}_insert AFTER INSERT ON {table} BEGIN {increment} END")
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {trigger_base}_delete AFTER DELETE ON {table} BEGIN {decrement} END")
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {trigger_base}_update AFTER UPDATE OF {column} ON {table} "
+            f"WHEN {old_key} IS NOT {new_key} BEGIN {decrement} {increment} END"
+        )
+        
+        # Backfill from the rows that already exist
+        cursor.execute(
+            f"INSERT INTO stats_counters (scope, key, count) "
+            f"SELECT '{scope}', COALESCE({column}, ''), COUNT(*) FROM {table} GROUP BY 2"
+        )
 
-def get_users():
-    """Get all users from the database"""
+# Full-text search indexes as (source table, FTS table, indexed columns). They
+# use the trigram tokenizer so any substring of three or more characters can
+# be matched through the index.
+SEARCH_INDEXES = [
+    ('reference_data', 'reference_data_fts', ('code', 'value', 'description')),
+    ('users', 'users_fts', ('username', 'email', 'full_name')),
+]
+
+def _fts5_trigram_available(cursor):
+    """Whether this SQLite build has FTS5 with the trigram tokenizer (3.34+)"""
+    try:
+        cursor.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(probe, tokenize='trigram')")
+        cursor.execute("DROP TABLE temp.fts5_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+def _migration_004_search_indexes(cursor):
+    """Add trigram FTS5 indexes over reference data and users, kept in sync by triggers"""
+    if not _fts5_trigram_available(cursor):
+        print("SQLite lacks FTS5 trigram support; search will fall back to prefix matching")
+        return
+    
+    for table, fts_table, columns in SEARCH_INDEXES:
+        column_list = ', '.join(columns)
+        new_values = ', '.join(f"NEW.{column}" for column in columns)
+        old_values = ', '.join(f"OLD.{column}" for column in columns)
+        insert_row = f"INSERT INTO {fts_table}(rowid, {column_list}) VALUES (NEW.id, {new_values});"
+        delete_row = (
+            f"INSERT INTO {fts_table}({fts_table}, rowid, {column_list}) VALUES ('delete', OLD.id, {old_values});"
+        )
+        
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5("
+            f"{column_list}, content='{table}', content_rowid='id', tokenize='trigram')"
+        )
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_insert AFTER INSERT ON {table} BEGIN {insert_row} END")
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_delete AFTER DELETE ON {table} BEGIN {delete_row} END")
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_update AFTER UPDATE OF {column_list} ON {table} "
+            f"BEGIN {delete_row} {insert_row} END"
+        )
+        cursor.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+
+# Typed staging columns for bulk upload records, one set per entity type.
+# A task_records row fills only the columns of its task's entity type.
+TASK_RECORD_COLUMNS = {
+    'user': ('username', 'password', 'password_hash', 'role', 'email', 'full_name', 'department'),
+    'reference_data': ('data_type', 'code', 'value', 'description'),
+}
+
+def _migration_005_task_records(cursor):
+    """Add the task_records staging table and record counts on tasks"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS task_records (
+        task_id INTEGER NOT NULL REFERENCES tasks(id),
+        row_num INTEGER NOT NULL,
+        username TEXT,
+        password TEXT,
+        password_hash TEXT,
+        role TEXT,
+        email TEXT,
+        full_name TEXT,
+        department TEXT,
+        data_type TEXT,
+        code TEXT,
+        value TEXT,
+        description TEXT,
+        PRIMARY KEY (task_id, row_num)
+    ) WITHOUT ROWID
+    ''')
+    
+    cursor.execute("PRAGMA table_info(tasks)")
+    columns = [col[1] for col in cursor.fetchall()]
+    for column in ('record_count', 'inserted_count', 'skipped_count'):
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE tasks ADD COLUMN {column} INTEGER")
+
+def _migration_006_jobs(cursor):
+    """Add the jobs table used by the background job worker (see jobs.py)"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_type TEXT NOT NULL,
+        task_id INTEGER REFERENCES tasks(id),
+        status TEXT NOT NULL DEFAULT 'queued',
+        requested_by TEXT,
+        progress_done INTEGER NOT NULL DEFAULT 0,
+        progress_total INTEGER,
+        checkpoint INTEGER NOT NULL DEFAULT 0,
+        inserted_count INTEGER NOT NULL DEFAULT 0,
+        skipped_count INTEGER NOT NULL DEFAULT 0,
+        message TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        started_at TIMESTAMP,
+        heartbeat_at TIMESTAMP,
+        finished_at TIMESTAMP
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_heartbeat ON jobs(status, heartbeat_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_task_id ON jobs(task_id)")
+
+def _migration_007_reference_data_updated_at(cursor):
+    """Index reference_data.updated_at so changed rows can be found without a scan (see lookup.py)"""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_reference_data_updated_at ON reference_data(updated_at)")
+
+def _migration_008_reference_data_code(cursor):
+    """Index reference_data.code so pages sorted by code across data types stop after one page"""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_reference_data_code ON reference_data(code)")
+
+def _migration_009_job_attempts(cursor):
+    """Count each job's runs so a failing job is retried a bounded number of times (see jobs.py)"""
+    cursor.execute("PRAGMA table_info(jobs)")
+    columns = [col[1] for col in cursor.fetchall()]
+    if 'attempts' not in columns:
+        cursor.execute("ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+
+def _migration_010_list_page_indexes(cursor):
+    """Index every list page filter in its sort order, and the search columns for short prefix searches"""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_reference_data_data_type ON reference_data(data_type)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_reference_data_status ON reference_data(status)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_reference_data_status_code ON reference_data(status, code)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_username_nocase ON users(username COLLATE NOCASE)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_email_nocase ON users(email COLLATE NOCASE)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_reference_data_code_nocase ON reference_data(code COLLATE NOCASE)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_reference_data_value_nocase ON reference_data(value COLLATE NOCASE)")
+    cursor.execute("ANALYZE")
+
+def _migration_011_job_claim_token(cursor):
+    """Tag each job claim so a worker whose job was reclaimed cannot write to it (see jobs.py)"""
+    cursor.execute("PRAGMA table_info(jobs)")
+    columns = [col[1] for col in cursor.fetchall()]
+    if 'claim_token' not in columns:
+        cursor.execute("ALTER TABLE jobs ADD COLUMN claim_token TEXT")
+
+# Ordered schema migrations as (version, description, function). The database
+# records the last applied version in PRAGMA user_version; append new entries
+# with the next version number and never renumber existing ones.
+MIGRATIONS = [
+    (1, "Add created_by column to users", _migration_001_users_created_by),
+    (2, "Add indexes for hot query paths", _migration_002_hot_path_indexes),
+    (3, "Add trigger-maintained stats counters", _migration_003_stats_counters),
+    (4, "Add full-text search indexes", _migration_004_search_indexes),
+    (5, "Add task_records staging table", _migration_005_task_records),
+    (6, "Add background jobs table", _migration_006_jobs),
+    (7, "Add reference_data updated_at index", _migration_007_reference_data_updated_at),
+    (8, "Add reference_data code index", _migration_008_reference_data_code),
+    (9, "Add job attempt counts", _migration_009_job_attempts),
+    (10, "Add list page filter and search indexes", _migration_010_list_page_indexes),
+    (11, "Add job claim tokens", _migration_011_job_claim_token),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+def run_migrations(conn):
+    """Bring the schema up to SCHEMA_VERSION, applying pending migrations in order"""
+    cursor = conn.cursor()
+    current_version = cursor.execute("PRAGMA user_version").fetchone()[0]
+    if current_version >= SCHEMA_VERSION:
+        return current_version
+    
+    # Take the write lock up front so concurrent processes migrate one at a time
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        current_version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        _create_base_schema(cursor)
+        for version, description, migration in MIGRATIONS:
+            if version > current_version:
+                print(f"Applying schema migration {version}: {description}")
+                migration(cursor)
+                cursor.execute(f"PRAGMA user_version = {int(version)}")
+                current_version = version
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return current_version
+
+# Queries the pages, dashboard, lookup index and job worker run on every
+# render or poll, as (name, sql, params). List page and search queries are
+# generated from LIST_PAGE_SPECS by query_catalog(). Whole-table loads that
+# cache.py keeps between writes are not listed. Each must avoid reading a
+# whole table or index; check_query_plans() enforces this against a live
+# database. Plans are matched by table name, so catalogued queries must not
+# alias tables.
+QUERY_CATALOG = [
+    ("login", "SELECT username, password_hash, role FROM users WHERE username = ?", ('admin',)),
+    (
+        "bulk upload history",
+        "SELECT id, task_type, entity_type, status, record_count, inserted_count, skipped_count, "
+        "created_by, created_at, approved_by, approved_at FROM tasks WHERE task_type = 'bulk_upload'",
+        (),
+    ),
+    (
+        "recent activity",
+        "SELECT id, task_type, entity_type, status, created_by, created_at FROM tasks ORDER BY created_at DESC LIMIT 5",
+        (),
+    ),
+    (
+        "dashboard counters",
+        "SELECT scope, key, count FROM stats_counters WHERE scope IN (?, ?) AND count > 0",
+        ('tasks.status', 'tasks.task_type'),
+    ),
+    (
+        "pending task count",
+        "SELECT count FROM stats_counters WHERE scope = 'tasks.status' AND key = 'pending'",
+        (),
+    ),
+    (
+        "reference data types",
+        "SELECT key FROM stats_counters WHERE scope = 'reference_data.data_type' AND count > 0 ORDER BY key",
+        (),
+    ),
+    (
+        "reference data counts by type",
+        "SELECT key, count FROM stats_counters WHERE scope = 'reference_data.data_type' AND count > 0",
+        (),
+    ),
+    (
+        "active reference data by type",
+        "SELECT code, value FROM reference_data WHERE status = ? AND data_type = ?",
+        ('active', 'Country'),
+    ),
+    (
+        "reference data types changed since",
+        "SELECT data_type FROM reference_data WHERE updated_at >= ?",
+        ('2024-01-01 00:00:00',),
+    ),
+    ("latest reference data update", "SELECT MAX(updated_at) FROM reference_data", ()),
+    (
+        "next job",
+        "SELECT MIN(id) FROM (SELECT id FROM jobs WHERE status = 'queued' "
+        "UNION ALL SELECT id FROM jobs WHERE status = 'running' AND heartbeat_at < datetime('now', ?))",
+        ('-600 seconds',),
+    ),
+    ("queued job count", "SELECT COUNT(*) FROM jobs WHERE status = 'queued'", ()),
+    ("latest job for task", "SELECT * FROM jobs WHERE task_id = ? ORDER BY id DESC LIMIT 1", (1,)),
+]
+
+def query_catalog(conn):
+    """QUERY_CATALOG plus every keyset page and search query LIST_PAGE_SPECS allows
+
+    Covers each sort key in both directions, first and later pages, with no
+    filter or any single filter, and the short-query prefix search. Ranked
+    search queries are included when the database has the FTS indexes.
+    """
+    catalog = list(QUERY_CATALOG)
+    for table, spec in LIST_PAGE_SPECS.items():
+        filter_sets = [{}] + [{name: 'x'} for name in spec['filters']]
+        
+        for filters in filter_sets:
+            label = ', '.join(filters) or 'no filter'
+            for sort in spec['sort_keys']:
+                for descending in (False, True):
+                    for cursor in (None, ('x', 1)):
+                        name = (
+                            f"{table} page by {sort}{' desc' if descending else ''}, {label}"
+                            f"{', next page' if cursor else ''}"
+                        )
+                        catalog.append(
+                            (name, *_list_page_query(table, filters, sort, cursor, DEFAULT_PAGE_SIZE, descending))
+                        )
+        
+        if spec['search_columns']:
+            for filters in filter_sets:
+                catalog.append((
+                    f"{table} short search, {', '.join(filters) or 'no filter'}",
+                    *_prefix_search_query(table, 'x', filters, SEARCH_RESULT_LIMIT)
+                ))
+        
+        fts_table = next((fts for source, fts, _ in SEARCH_INDEXES if source == table), None)
+        if fts_table and _has_search_index(conn, fts_table):
+            for filters in filter_sets:
+                for mode in ('substring', 'prefix'):
+                    catalog.append((
+                        f"{table} search ({mode}), {', '.join(filters) or 'no filter'}",
+                        *_search_query(table, 'xyz', filters, mode, SEARCH_RESULT_LIMIT)
+                    ))
+    return catalog
+
+_PLAN_SCAN = re.compile(r'^SCAN (\S+)')
+_PLAN_SEARCH = re.compile(r'^SEARCH (\S+) ')
+# Searches constrained only by a range, such as a keyset cursor's rowid>?, walk the table like a scan
+_PLAN_RANGE_ONLY = re.compile(r'\(\w+[<>]\?\)$')
+# FTS5 scans driven by a MATCH constraint read the full-text index, not the table
+_PLAN_MATCH_SCAN = re.compile(r'VIRTUAL TABLE INDEX \d+:\S*M')
+_WHERE_CLAUSE = re.compile(r'\bWHERE\b(.*?)(?=\bORDER BY\b|\bLIMIT\b|\)\s*$|$)', re.IGNORECASE | re.DOTALL)
+# The keyset cursor condition added by _list_page_query
+_KEYSET_CURSOR = re.compile(r'(?:id|\(\w+, id\)) [<>] (?:\?|\(\?, \?\))')
+
+def _is_keyset_walk(sql, details):
+    """Whether a scan in this plan is stopped by its LIMIT after one page
+
+    True only for a LIMIT query that needs no temporary B-tree and whose sole
+    condition is the keyset cursor; any other condition could match rarely and
+    make the walk read the whole table.
+    """
+    if not re.search(r'\bLIMIT\b', sql, re.IGNORECASE):
+        return False
+    if any(detail.startswith('USE TEMP B-TREE') for detail in details):
+        return False
+    return all(_KEYSET_CURSOR.fullmatch(clause.strip()) for clause in _WHERE_CLAUSE.findall(sql))
+
+def _unbounded_scans(sql, details, tables):
+    """EXPLAIN QUERY PLAN lines that read a whole table or index
+
+    A scan through a table or any of its indexes passes only as a keyset walk
+    (_is_keyset_walk). In a paged query, so do searches constrained only by a
+    range, and searches other than rowid lookups whose rows are all sorted in
+    a temporary B-tree before the LIMIT applies.
+    """
+    if _is_keyset_walk(sql, details):
+        return []
+    paged = re.search(r'\bLIMIT\b', sql, re.IGNORECASE) is not None
+    sorts_all = any(detail.startswith('USE TEMP B-TREE FOR ORDER BY') for detail in details)
+    scans = []
+    for detail in details:
+        match = _PLAN_SCAN.match(detail)
+        if match is None and paged:
+            match = _PLAN_SEARCH.match(detail)
+            if match and not (_PLAN_RANGE_ONLY.search(detail) or (sorts_all and '(rowid=?)' not in detail)):
+                match = None
+        if match and match.group(1) in tables and not _PLAN_MATCH_SCAN.search(detail):
+            scans.append(detail)
+    return scans
+
+def check_query_plans(conn=None, catalog=None):
+    """Run EXPLAIN QUERY PLAN on each catalogued query and fail on unbounded scans
+
+    ``catalog`` defaults to query_catalog(). Returns the plan details per
+    query name, or raises RuntimeError listing the queries that read a whole
+    table or index.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    
+    plans = {}
+    offenders = []
+    try:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for name, sql, params in catalog or query_catalog(conn):
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+            details = [row[3] for row in rows]
+            plans[name] = details
+            scans = _unbounded_scans(sql, details, tables)
+            if scans:
+                offenders.append(f"{name}: {'; '.join(scans)}")
+    finally:
+        if own_conn:
+            conn.close()
+    
+    if offenders:
+        raise RuntimeError("Unbounded scans in query catalog:\n" + "\n".join(offenders))
+    return plans
+
+def initialize_database(seed=None):
+    """Initialize the database schema once per process
+
+    The first call runs any pending migrations and then ``seed`` (e.g. default
+    users); later calls, such as those made on every Streamlit rerun, return
+    immediately.
+    """
+    global _schema_ready
+    if _schema_ready:
+        return
+    
+    with _schema_lock:
+        if _schema_ready:
+            return
+        
+        conn = get_db_connection()
+        try:
+            run_migrations(conn)
+        finally:
+            conn.close()
+        
+        if seed is not None:
+            seed()
+        _schema_ready = True
+
+def _read_sql(sql, params=None):
+    """Run a query on a pooled connection and return the result as a DataFrame"""
     conn = get_db_connection()
-    users = pd.read_sql_query("SELECT id, username, role, email, full_name, department, created_by, created_at FROM users", conn)
-    conn.close()
-    return users
+    try:
+        return pd.read_sql_query(sql, conn, params=params)
+    finally:
+        conn.close()
+
+def get_users():
+    """Get all users from the database (cached until the users table changes)"""
+    return cached(
+        ('users',),
+        ('get_users',),
+        lambda: _read_sql("SELECT id, username, role, email, full_name, department, created_by, created_at FROM users")
+    )
 
 def get_reference_data(data_type=None):
-    """Get reference data, optionally filtered by data_type"""
-    conn = get_db_connection()
+    """Get reference data, optionally filtered by data_type (cached until the table changes)"""
     if data_type:
-        reference_data = pd.read_sql_query(
-            "SELECT * FROM reference_data WHERE data_type = ?", 
-            conn, 
-            params=[data_type]
-        )
+        loader = lambda: _read_sql("SELECT * FROM reference_data WHERE data_type = ?", [data_type])
     else:
-        reference_data = pd.read_sql_query("SELECT * FROM reference_data", conn)
-    conn.close()
-    return reference_data
+        loader = lambda: _read_sql("SELECT * FROM reference_data")
+    return cached(('reference_data',), ('get_reference_data', data_type or None), loader)
+
+# Task columns for lists and summaries: everything except the data_json payload,
+# which can be megabytes for bulk uploads. Use models.Task.get for a task's data.
+TASK_SUMMARY_COLUMNS = (
+    "id, task_type, entity_type, entity_id, status, created_by, created_at, updated_at, "
+    "approved_by, approved_at, record_count, inserted_count, skipped_count"
+)
 
 def get_tasks(status=None):
-    """Get tasks, optionally filtered by status"""
-    conn = get_db_connection()
+    """Get task summaries (no payload), optionally filtered by status (cached until the tasks table changes)"""
     if status:
-        tasks = pd.read_sql_query(
-            "SELECT * FROM tasks WHERE status = ?", 
-            conn, 
-            params=[status]
-        )
+        loader = lambda: _read_sql(f"SELECT {TASK_SUMMARY_COLUMNS} FROM tasks WHERE status = ?", [status])
     else:
-        tasks = pd.read_sql_query("SELECT * FROM tasks", conn)
-    conn.close()
-    return tasks
+        loader = lambda: _read_sql(f"SELECT {TASK_SUMMARY_COLUMNS} FROM tasks")
+    return cached(('tasks',), ('get_tasks', status or None), loader)
+
+# Keyset-paginated list queries. Each list table declares the columns a page
+# returns, the filters it accepts (filter name -> SQL condition with one
+# placeholder) and the sort keys it allows. Every filter needs an index that
+# returns its rows in each sort key's order (see check_query_plans). The
+# search filter matches a case-insensitive prefix of any of the listed
+# columns, each of which has a NOCASE index.
+LIST_PAGE_SPECS = {
+    'users': {
+        'columns': "id, username, role, email, full_name, department, created_by, created_at",
+        'filters': {
+            'role': "role = ?",
+        },
+        'search_columns': ('username', 'email'),
+        'sort_keys': ('id',),
+    },
+    'reference_data': {
+        'columns': "id, data_type, code, value, description, status, created_by, created_at, updated_at",
+        'filters': {
+            'data_type': "data_type = ?",
+            'status': "status = ?",
+        },
+        'search_columns': ('code', 'value'),
+        'sort_keys': ('id', 'code'),
+    },
+    'tasks': {
+        'columns': TASK_SUMMARY_COLUMNS,
+        'filters': {
+            'status': "status = ?",
+            'task_type': "task_type = ?",
+        },
+        'search_columns': (),
+        'sort_keys': ('created_at',),
+    },
+}
+
+DEFAULT_PAGE_SIZE = 100
+
+def _escape_like(term):
+    """Escape LIKE wildcards so a search term matches literally"""
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def build_list_filters(table, filters):
+    """Translate a filter spec into SQL WHERE conditions and parameters for a list table
+
+    ``filters`` maps filter names to values; None or empty values are ignored.
+    Raises ValueError for filters the table does not support.
+    """
+    spec = LIST_PAGE_SPECS[table]
+    clauses = []
+    params = []
+    
+    for name, value in (filters or {}).items():
+        if value is None or value == '':
+            continue
+        if name == 'search':
+            if not spec['search_columns']:
+                raise ValueError(f"{table} does not support search")
+            pattern = _escape_like(str(value)) + '%'
+            clauses.append(
+                "(" + " OR ".join(f"{column} LIKE ? ESCAPE '\\'" for column in spec['search_columns']) + ")"
+            )
+            params.extend([pattern] * len(spec['search_columns']))
+        elif name in spec['filters']:
+            clauses.append(spec['filters'][name])
+            params.append(value)
+        else:
+            raise ValueError(f"Unsupported filter for {table}: {name}")
+    
+    return clauses, params
+
+def get_list_page(table, filters=None, sort='id', cursor=None, page_size=DEFAULT_PAGE_SIZE, descending=False):
+    """Get one page of a list table using keyset pagination
+
+    ``cursor`` is the value returned alongside the previous page (None for the
+    first page). Returns ``(page_df, next_cursor)``; next_cursor is None on the
+    last page.
+    """
+    sql, params = _list_page_query(table, filters, sort, cursor, page_size, descending)
+    conn = get_db_connection()
+    try:
+        db_cursor = conn.execute(sql, params)
+        columns = [description[0] for description in db_cursor.description]
+        rows = db_cursor.fetchall()
+    finally:
+        conn.close()
+    
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = (last['id'],) if sort == 'id' else (last[sort], last['id'])
+    
+    page = pd.DataFrame([tuple(row) for row in rows], columns=columns)
+    return page, next_cursor
+
+def _list_page_query(table, filters, sort, cursor, page_size, descending):
+    """SQL and parameters of one keyset page; see get_list_page"""
+    spec = LIST_PAGE_SPECS[table]
+    if sort not in spec['sort_keys']:
+        raise ValueError(f"Unsupported sort key for {table}: {sort}")
+    
+    clauses, params = build_list_filters(table, filters)
+    comparison = '<' if descending else '>'
+    direction = 'DESC' if descending else 'ASC'
+    
+    # Rows are ordered by (sort, id) so the cursor is unique even when sort values repeat
+    if cursor is not None:
+        if sort == 'id':
+            clauses.append(f"id {comparison} ?")
+            params.append(cursor[-1])
+        else:
+            clauses.append(f"({sort}, id) {comparison} (?, ?)")
+            params.extend(cursor)
+    
+    order_by = f"id {direction}" if sort == 'id' else f"{sort} {direction}, id {direction}"
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    sql = f"SELECT {spec['columns']} FROM {table} {where} ORDER BY {order_by} LIMIT ?"
+    params.append(page_size + 1)
+    return sql, params
+
+def get_users_page(filters=None, sort='id', cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """Get one page of users matching filters (role, search)"""
+    return get_list_page('users', filters, sort, cursor, page_size)
+
+def get_reference_data_page(filters=None, sort='id', cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """Get one page of reference data matching filters (data_type, status, search)"""
+    return get_list_page('reference_data', filters, sort, cursor, page_size)
+
+def get_tasks_page(filters=None, sort='created_at', cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """Get one page of tasks, newest first, matching filters (status, task_type)"""
+    return get_list_page('tasks', filters, sort, cursor, page_size, descending=True)
+
+SEARCH_RESULT_LIMIT = 100
+MIN_TRIGRAM_QUERY_LENGTH = 3
+# Matches ranked per search. bm25 is computed for each ranked row, so a common
+# term ranks only the first SEARCH_CANDIDATE_LIMIT matches that pass the filters.
+SEARCH_CANDIDATE_LIMIT = 500
+
+def _search_index_for(table):
+    """Name of the FTS table indexing a list table"""
+    for source, fts_table, _ in SEARCH_INDEXES:
+        if source == table:
+            return fts_table
+    raise ValueError(f"No search index defined for {table}")
+
+def _has_search_index(conn, fts_table):
+    """Whether the FTS table exists (it is skipped on SQLite builds without trigram support)"""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts_table,)
+    ).fetchone() is not None
+
+def _match_expression(query):
+    """Quote a query as an FTS5 string so punctuation is matched literally"""
+    return '"' + query.replace('"', '""') + '"'
+
+def search_table(table, query, filters=None, mode='substring', limit=SEARCH_RESULT_LIMIT):
+    """Ranked full-text search over a list table
+
+    ``mode='substring'`` matches the query anywhere in the indexed columns;
+    ``mode='prefix'`` additionally requires a search column to start with it.
+    Other filters use the same spec as get_list_page. Queries shorter than a
+    trigram, and databases without the FTS index, fall back to prefix matching
+    through the search columns' NOCASE indexes, in no particular order.
+    Returns at most ``limit`` rows, best match first among the first
+    SEARCH_CANDIDATE_LIMIT matches.
+    """
+    query = (query or '').strip()
+    filters = {name: value for name, value in (filters or {}).items() if name != 'search'}
+    if not query:
+        return get_list_page(table, filters, page_size=limit)[0]
+    
+    fts_table = _search_index_for(table)
+    conn = get_db_connection()
+    try:
+        if not _has_search_index(conn, fts_table) or len(query) < MIN_TRIGRAM_QUERY_LENGTH:
+            sql, params = _prefix_search_query(table, query, filters, limit)
+        else:
+            sql, params = _search_query(table, query, filters, mode, limit)
+        return pd.read_sql_query(sql, conn, params=params)
+    finally:
+        conn.close()
+
+def _prefix_search_query(table, query, filters, limit):
+    """SQL and parameters of an unranked prefix search; see search_table
+
+    Unordered, so the LIMIT stops the index range reads early instead of
+    sorting every match first.
+    """
+    clauses, params = build_list_filters(table, dict(filters, search=query))
+    sql = f"SELECT {LIST_PAGE_SPECS[table]['columns']} FROM {table} WHERE {' AND '.join(clauses)} LIMIT ?"
+    return sql, params + [limit]
+
+def _search_query(table, query, filters, mode, limit):
+    """SQL and parameters of a ranked full-text search; see search_table"""
+    fts_table = _search_index_for(table)
+    filters = dict(filters)
+    if mode == 'prefix':
+        filters['search'] = query
+    elif mode != 'substring':
+        raise ValueError(f"Unsupported search mode: {mode}")
+    clauses, params = build_list_filters(table, filters)
+    # Filters are checked per match by primary key before its rank is read,
+    # so bm25 runs only for the capped candidates that pass them
+    filtered = (
+        f"AND EXISTS (SELECT 1 FROM {table} WHERE id = {fts_table}.rowid AND {' AND '.join(clauses)})"
+        if clauses else ""
+    )
+    
+    sql = f"""
+        WITH matches AS (
+            SELECT rowid AS match_id, rank AS match_rank
+            FROM {fts_table}
+            WHERE {fts_table} MATCH ? {filtered}
+            LIMIT ?
+        )
+        SELECT {LIST_PAGE_SPECS[table]['columns']}
+        FROM {table} JOIN matches ON id = match_id
+        ORDER BY match_rank
+        LIMIT ?
+    """
+    return sql, [_match_expression(query)] + params + [SEARCH_CANDIDATE_LIMIT, limit]
+
+def list_columns(table):
+    """Names of the columns a list table's pages and exports return"""
+    return [column.strip() for column in LIST_PAGE_SPECS[table]['columns'].split(',')]
+
+def iter_list_rows(table, filters=None, chunk_size=DEFAULT_PAGE_SIZE):
+    """Yield every row of a list table matching filters, as lists of at most chunk_size tuples in id order
+
+    Filters use the same spec as get_list_page, except that a search term
+    matches anywhere in the indexed columns as search_table does, without its
+    result limit. Rows come from a single cursor, so only one chunk is held in
+    memory and the whole export reads one consistent snapshot.
+    """
+    filters = dict(filters or {})
+    query = str(filters.pop('search', None) or '').strip()
+    clauses, params = build_list_filters(table, filters)
+    
+    conn = get_db_connection()
+    try:
+        if query:
+            fts_table = _search_index_for(table)
+            if _has_search_index(conn, fts_table) and len(query) >= MIN_TRIGRAM_QUERY_LENGTH:
+                clauses.append(f"id IN (SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH ?)")
+                params.append(_match_expression(query))
+            else:
+                search_clauses, search_params = build_list_filters(table, {'search': query})
+                clauses.extend(search_clauses)
+                params.extend(search_params)
+        
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        cursor = conn.cursor()
+        cursor.row_factory = None  # plain tuples are all the writers need
+        cursor.execute(f"SELECT {LIST_PAGE_SPECS[table]['columns']} FROM {table} {where} ORDER BY id", params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+def search_reference_data(query, filters=None, mode='substring', limit=SEARCH_RESULT_LIMIT):
+    """Search reference data by code, value or description"""
+    return search_table('reference_data', query, filters, mode, limit)
+
+def search_users(query, filters=None, mode='substring', limit=SEARCH_RESULT_LIMIT):
+    """Search users by username, email or full name"""
+    return search_table('users', query, filters, mode, limit)
@@ -0,0 +1,149 @@
+"""Streaming export of list tables to CSV, Excel and Parquet
+
+Rows are read in chunks from one SQLite cursor (database.iter_list_rows) and
+written to the output file as they arrive, so memory use depends on the chunk
+size rather than on the number of rows exported. Filters are those of the
+list pages: data_type/role, status and a search term.
+
+Streamlit serves downloads from memory, so the pages pass ``max_rows`` and
+point larger exports to ``python manage.py export``, which writes straight to
+a file.
+"""
+import csv
+import io
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional; Parquet export is unavailable without it
+    pa = None
+    pq = None
+
+from database import get_db_connection, iter_list_rows, list_columns
+
+EXPORT_CHUNK_SIZE = 10000
+# Rows per worksheet, including the header row; larger exports continue on another sheet
+EXCEL_MAX_ROWS = 1048576
+
+EXPORT_FORMATS = {
+    'csv': {'label': 'CSV', 'extension': 'csv', 'mime': 'text/csv'},
+    'xlsx': {
+        'label': 'Excel',
+        'extension': 'xlsx',
+        'mime': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    },
+    'parquet': {'label': 'Parquet', 'extension': 'parquet', 'mime': 'application/vnd.apache.parquet'},
+}
+
+
+class ExportTooLarge(ValueError):
+    """Raised by export_table when more rows match than its max_rows allows"""
+
+
+def _capped(chunks, max_rows):
+    """Pass chunks through, raising ExportTooLarge as soon as more than max_rows have been read"""
+    rows = 0
+    for chunk in chunks:
+        rows += len(chunk)
+        if rows > max_rows:
+            raise ExportTooLarge(f"More than {max_rows:,} rows match")
+        yield chunk
+
+
+def available_formats():
+    """Export formats usable in this environment"""
+    return [name for name in EXPORT_FORMATS if name != 'parquet' or pq is not None]
+
+
+def _write_csv(columns, chunks, out):
+    text = io.TextIOWrapper(out, encoding='utf-8', newline='')
+    try:
+        writer = csv.writer(text)
+        writer.writerow(columns)
+        rows = 0
+        for chunk in chunks:
+            writer.writerows(chunk)
+            rows += len(chunk)
+        text.flush()
+    finally:
+        text.detach()  # leave out open for the caller
+    return rows
+
+
+def _write_excel(columns, chunks, out, title):
+    from openpyxl import Workbook
+    
+    # Write-only workbooks stream rows to disk instead of building cells in memory
+    workbook = Workbook(write_only=True)
+    sheet = None
+    sheet_rows = EXCEL_MAX_ROWS
+    rows = 0
+    for chunk in chunks:
+        for row in chunk:
+            if sheet_rows >= EXCEL_MAX_ROWS:
+                sheet = workbook.create_sheet(title if sheet is None else f"{title} {len(workbook.worksheets) + 1}")
+                sheet.append(columns)
+                sheet_rows = 1
+            sheet.append(row)
+            sheet_rows += 1
+        rows += len(chunk)
+    if sheet is None:
+        workbook.create_sheet(title).append(columns)
+    workbook.save(out)
+    return rows
+
+
+def _arrow_schema(table, columns):
+    """Parquet schema from the table's declared column types: INTEGER as int64, the rest as strings"""
+    conn = get_db_connection()
+    try:
+        declared = {row[1]: row[2].upper() for row in conn.execute(f"PRAGMA table_info({table})")}
+    finally:
+        conn.close()
+    return pa.schema([
+        (column, pa.int64() if declared.get(column) == 'INTEGER' else pa.string()) for column in columns
+    ])
+
+
+def _write_parquet(columns, chunks, out, table):
+    if pq is None:
+        raise ValueError("Parquet export needs pyarrow, which is not installed")
+    schema = _arrow_schema(table, columns)
+    rows = 0
+    with pq.ParquetWriter(out, schema, compression='zstd') as writer:
+        for chunk in chunks:
+            values = list(zip(*chunk))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column_values, type=field.type) for column_values, field in zip(values, schema)],
+                schema=schema
+            ))
+            rows += len(chunk)
+    return rows
+
+
+def export_table(table, filters, file_format, out, chunk_size=EXPORT_CHUNK_SIZE, max_rows=None):
+    """Write every row of a list table matching filters to the binary file out; returns the row count
+
+    Raises ValueError for an unknown or unavailable format and for filters the
+    table does not support, and ExportTooLarge (leaving out incomplete) if
+    more than ``max_rows`` rows match.
+    """
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {file_format}")
+    
+    columns = list_columns(table)
+    chunks = iter_list_rows(table, filters, chunk_size)
+    rows = chunks if max_rows is None else _capped(chunks, max_rows)
+    try:
+        if file_format == 'csv':
+            return _write_csv(columns, rows, out)
+        if file_format == 'xlsx':
+            return _write_excel(columns, rows, out, table)
+        return _write_parquet(columns, rows, out, table)
+    finally:
+        chunks.close()
+
+
+def export_file_name(table, file_format):
+    """Download file name for an export, e.g. reference_data_export.csv"""
+    return f"{table}_export.{EXPORT_FORMATS[file_format]['extension']}"
@@ -0,0 +1,313 @@
+"""Streaming readers and incremental validation for bulk upload files
+
+Uploads are read in fixed-size chunks of string columns so that multi-million
+row files never have to be materialised by the parser in one piece. Each chunk
+is validated as it arrives with the vectorized checks in validation.py;
+duplicate keys are tracked across chunks with a sorted array of 64-bit row
+hashes rather than the key values themselves.
+"""
+import csv
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # pyarrow is optional; fall back to the pandas C parser
+    pa = None
+    pa_csv = None
+
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:  # calamine is optional; fall back to openpyxl's read-only mode
+    CalamineWorkbook = None
+
+from validation import (
+    DUPLICATE_IN_FILE, EXISTS_IN_DATABASE, UPLOAD_SPECS, describe_errors, normalize_keys, validate_frame
+)
+
+CHUNK_SIZE = 50000
+PREVIEW_ROWS = 1000
+
+
+def _read_header(uploaded_file):
+    """Read the CSV header row and rewind the file"""
+    uploaded_file.seek(0)
+    first_line = uploaded_file.readline()
+    uploaded_file.seek(0)
+    if isinstance(first_line, bytes):
+        first_line = first_line.decode('utf-8-sig')
+    return next(csv.reader([first_line]), [])
+
+
+def _rechunk(frames, chunk_size):
+    """Regroup a stream of DataFrames into frames of exactly chunk_size rows (the last may be shorter)"""
+    pending = []
+    pending_rows = 0
+    for frame in frames:
+        pending.append(frame)
+        pending_rows += len(frame)
+        while pending_rows >= chunk_size:
+            combined = pd.concat(pending, ignore_index=True) if len(pending) > 1 else pending[0]
+            yield combined.iloc[:chunk_size].reset_index(drop=True)
+            remainder = combined.iloc[chunk_size:].reset_index(drop=True)
+            pending = [remainder] if len(remainder) else []
+            pending_rows = len(remainder)
+    if pending_rows:
+        yield pd.concat(pending, ignore_index=True) if len(pending) > 1 else pending[0]
+
+
+def _iter_csv_pyarrow(uploaded_file, chunk_size):
+    """Stream record batches through pyarrow's multithreaded CSV reader"""
+    columns = _read_header(uploaded_file)
+    reader = pa_csv.open_csv(
+        uploaded_file,
+        read_options=pa_csv.ReadOptions(block_size=4 * 1024 * 1024),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={column: pa.string() for column in columns},
+            strings_can_be_null=True,
+        ),
+    )
+    for batch in reader:
+        yield batch.to_pandas()
+
+
+def iter_csv_chunks(uploaded_file, chunk_size=CHUNK_SIZE, validator=None):
+    """Yield an uploaded CSV as DataFrames of chunk_size rows with every column read as text
+
+    Uses pyarrow's streaming reader when it is installed, otherwise the pandas
+    C parser. Reading everything as text keeps codes such as ``007`` intact.
+    If a validator is given, its header check runs first and nothing is read
+    when required columns are missing.
+    """
+    if validator is not None and validator.check_header(_read_header(uploaded_file)):
+        return
+    uploaded_file.seek(0)
+    if pa_csv is not None:
+        frames = _iter_csv_pyarrow(uploaded_file, chunk_size)
+    else:
+        frames = pd.read_csv(uploaded_file, dtype=str, chunksize=chunk_size)
+    yield from _rechunk(frames, chunk_size)
+
+
+def _cell_text(value):
+    """Render a spreadsheet cell as text, keeping empty cells as None"""
+    if value is None or isinstance(value, str):
+        return value if value != '' else None
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _iter_excel_rows_openpyxl(uploaded_file, sheet_name):
+    """Iterate worksheet rows as value tuples using openpyxl's streaming read-only mode"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(uploaded_file, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+        yield from sheet.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _iter_excel_rows_calamine(uploaded_file, sheet_name):
+    """Iterate worksheet rows as value lists using the Rust calamine reader"""
+    workbook = CalamineWorkbook.from_filelike(uploaded_file)
+    sheet = workbook.get_sheet_by_name(sheet_name) if sheet_name else workbook.get_sheet_by_index(0)
+    if hasattr(sheet, 'iter_rows'):
+        yield from sheet.iter_rows()
+    else:
+        yield from sheet.to_python()
+
+
+def list_excel_sheets(uploaded_file):
+    """Names of the worksheets in an uploaded workbook"""
+    from openpyxl import load_workbook
+
+    uploaded_file.seek(0)
+    workbook = load_workbook(uploaded_file, read_only=True)
+    try:
+        return list(workbook.sheetnames)
+    finally:
+        workbook.close()
+        uploaded_file.seek(0)
+
+
+def iter_excel_chunks(uploaded_file, chunk_size=CHUNK_SIZE, sheet_name=None, validator=None):
+    """Yield a worksheet as DataFrames of chunk_size rows with every column as text
+
+    Rows are streamed with calamine when it is installed, otherwise with
+    openpyxl in read-only mode, so the workbook's object model is never built.
+    The first row is the header; fully empty rows are skipped. If a validator
+    is given, its header check runs before any data rows are read.
+    """
+    uploaded_file.seek(0)
+    if CalamineWorkbook is not None:
+        rows = _iter_excel_rows_calamine(uploaded_file, sheet_name)
+    else:
+        rows = _iter_excel_rows_openpyxl(uploaded_file, sheet_name)
+
+    header = next(rows, None)
+    if header is None:
+        return
+    columns = [str(cell).strip() if cell is not None else f"Unnamed: {i}" for i, cell in enumerate(header)]
+    if validator is not None and validator.check_header(columns):
+        rows.close()
+        return
+
+    width = len(columns)
+    batch = []
+    for row in rows:
+        values = [_cell_text(value) for value in row[:width]]
+        if not any(value is not None for value in values):
+            continue
+        values.extend([None] * (width - len(values)))
+        batch.append(values)
+        if len(batch) == chunk_size:
+            yield pd.DataFrame(batch, columns=columns, dtype=object)
+            batch = []
+    if batch:
+        yield pd.DataFrame(batch, columns=columns, dtype=object)
+
+
+def file_progress(uploaded_file):
+    """Fraction of an uploaded file consumed so far, or None if its size is unknown"""
+    size = getattr(uploaded_file, 'size', None)
+    if size is None and hasattr(uploaded_file, 'getbuffer'):
+        size = uploaded_file.getbuffer().nbytes
+    if not size:
+        return None
+    return min(uploaded_file.tell() / size, 1.0)
+
+
+class UploadValidator:
+    """Validates upload chunks as they stream in, keeping running totals of problems"""
+
+    def __init__(self, entity_type):
+        spec = UPLOAD_SPECS[entity_type]
+        self.entity_type = entity_type
+        self.required_columns = spec['required_columns']
+        self.key_columns = spec['key_columns']
+        self.max_lengths = spec['max_lengths']
+        self.rows_seen = 0
+        self.missing_columns = None
+        self.duplicate_rows = 0
+        self.invalid_roles = set()
+        self.error_counts = {}
+        self.error_rows = 0
+        self.row_errors = []  # per chunk, a boolean array marking rows that failed any check
+        self.error_samples = []  # failing rows with their row number and failed checks, up to PREVIEW_ROWS
+        self._sampled_rows = 0
+        self._seen_key_hashes = np.empty(0, dtype=np.uint64)
+
+    def check_header(self, columns):
+        """Record required columns absent from the header; returns them"""
+        self.missing_columns = [column for column in self.required_columns if column not in columns]
+        return self.missing_columns
+
+    @property
+    def header_ok(self):
+        return self.missing_columns == []
+
+    def validate_chunk(self, chunk):
+        """Validate one chunk against itself, every earlier chunk and the database
+
+        Returns the chunk's error mask from validation.validate_frame.
+        """
+        if self.missing_columns is None:
+            self.check_header(list(chunk.columns))
+        if not self.header_ok:
+            return pd.DataFrame(index=chunk.index)
+
+        keys = normalize_keys(chunk[self.key_columns], self.entity_type)
+        key_hashes = pd.util.hash_pandas_object(keys, index=False).to_numpy()
+        duplicates = pd.Series(key_hashes).duplicated().to_numpy()
+        if len(self._seen_key_hashes):
+            positions = np.searchsorted(self._seen_key_hashes, key_hashes)
+            positions[positions == len(self._seen_key_hashes)] = 0
+            duplicates = duplicates | (self._seen_key_hashes[positions] == key_hashes)
+        # Merge this chunk's new keys into the sorted array without re-sorting it
+        new_hashes = np.unique(key_hashes[~duplicates])
+        self._seen_key_hashes = np.insert(
+            self._seen_key_hashes, np.searchsorted(self._seen_key_hashes, new_hashes), new_hashes
+        )
+
+        mask = validate_frame(chunk, self.entity_type, duplicates=duplicates)
+        for check, count in mask.sum().items():
+            if count:
+                self.error_counts[check] = self.error_counts.get(check, 0) + int(count)
+        self.duplicate_rows = self.error_counts.get(DUPLICATE_IN_FILE, 0)
+        if 'invalid_role' in mask:
+            self.invalid_roles.update(chunk.loc[mask['invalid_role'].to_numpy(), 'role'].unique())
+
+        failed = mask.any(axis=1).to_numpy()
+        self.row_errors.append(failed)
+        self.error_rows += int(failed.sum())
+        if failed.any() and self._sampled_rows < PREVIEW_ROWS:
+            positions = np.flatnonzero(failed)[:PREVIEW_ROWS - self._sampled_rows]
+            sample = chunk.iloc[positions].copy()
+            sample.insert(0, 'row', self.rows_seen + positions + 1)
+            sample['errors'] = describe_errors(mask.iloc[positions]).to_numpy()
+            self.error_samples.append(sample)
+            self._sampled_rows += len(sample)
+
+        self.rows_seen += len(chunk)
+        return mask
+
+    def error_preview(self):
+        """The first PREVIEW_ROWS failing rows, with row numbers and failed checks"""
+        if not self.error_samples:
+            return pd.DataFrame()
+        return pd.concat(self.error_samples, ignore_index=True)
+
+    def issues(self):
+        """Human-readable validation warnings gathered so far"""
+        messages = []
+        if self.missing_columns:
+            messages.append(f"Missing required columns: {', '.join(self.missing_columns)}")
+        key = ' and '.join(self.key_columns)
+        for check, count in self.error_counts.items():
+            if check == DUPLICATE_IN_FILE:
+                messages.append(f"Duplicate {key} values found in the file ({count:,} repeated rows)")
+            elif check == EXISTS_IN_DATABASE:
+                messages.append(f"{count:,} rows have a {key} that already exists in the database")
+            elif check == 'invalid_role':
+                messages.append(
+                    f"Invalid roles found: {', '.join(sorted(map(str, self.invalid_roles)))}. "
+                    f"Valid roles are 'super_admin' and 'data_analyst'"
+                )
+            elif check.startswith('missing_'):
+                messages.append(f"{count:,} rows are missing {check[len('missing_'):]}")
+            elif check.startswith('too_long_'):
+                column = check[len('too_long_'):]
+                messages.append(f"{count:,} rows have a {column} longer than {self.max_lengths[column]} characters")
+            else:
+                messages.append(f"{count:,} rows failed {check}")
+        return messages
+
+
+def validate_stream(chunks, validator, on_progress=None):
+    """Validate chunks as they arrive and pass them on
+
+    Stops before yielding anything if the first chunk lacks required columns.
+    ``on_progress(rows_seen)`` is called after each chunk.
+    """
+    for chunk in chunks:
+        validator.validate_chunk(chunk)
+        if not validator.header_ok:
+            return
+        if on_progress is not None:
+            on_progress(validator.rows_seen)
+        yield chunk
+
+
+def exclude_failed_rows(chunks, validator):
+    """Drop the rows a completed validation pass marked as failed from a fresh read of the same file
+
+    The readers split a file into the same chunks every time, so chunk i lines
+    up with ``validator.row_errors[i]``.
+    """
+    for chunk, failed in zip(chunks, validator.row_errors):
+        yield chunk[~failed]
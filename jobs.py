@@ -0,0 +1,403 @@
+"""Background job queue for long-running task approvals
+
+Jobs live in the ``jobs`` table and are run by one worker thread per process,
+so approving a large bulk upload returns to the browser immediately. Bulk
+uploads staged in task_records are applied in chunks of JOB_CHUNK_SIZE rows;
+each chunk commits together with the job's checkpoint and progress, so a job
+whose process dies is picked up again from its last checkpoint once its
+heartbeat is older than STALE_AFTER_SECONDS. A side thread refreshes the
+heartbeat every HEARTBEAT_SECONDS while a job runs, so a slow chunk (e.g.
+hashing passwords under an expensive scheme) is not mistaken for a dead one.
+Each claim stores a fresh claim_token; a worker whose job was reclaimed all the
+same finds its token gone and rolls its chunk back instead of applying it twice.
+
+A job that raises is queued again from its checkpoint, up to MAX_JOB_ATTEMPTS
+runs. After that it fails outright if nothing was applied, or is left
+'partial' (task status 'partial') with its checkpoint and counts kept, to be
+resumed with resume_task_approval.
+
+The worker starts with the app, or runs on its own with ``python manage.py
+worker`` so queued jobs are picked up when no process is serving the app.
+"""
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import metrics
+from database import get_db_connection
+from models import ENTITY_TABLES, Task, apply_staged_upload
+from cache import bump_table_version
+
+JOB_CHUNK_SIZE = 50000
+POLL_INTERVAL = 2.0
+STALE_AFTER_SECONDS = 600
+HEARTBEAT_SECONDS = 30
+MAX_JOB_ATTEMPTS = 3
+
+
+def _queued_job_count():
+    """Jobs waiting for the worker"""
+    conn = get_db_connection()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+    finally:
+        conn.close()
+
+
+QUEUE_DEPTH = metrics.gauge('job_queue_depth', 'Jobs queued for the background worker', function=_queued_job_count)
+JOB_SECONDS = metrics.histogram('job_seconds', 'Run time of background jobs', ('job_type',))
+JOBS_FINISHED = metrics.counter('jobs_finished_total', 'Background jobs finished, by final status', ('job_type', 'status'))
+
+_worker = None
+_worker_lock = threading.Lock()
+_wakeup = threading.Event()
+
+
+class JobReclaimed(Exception):
+    """Raised when a running job's claim was taken over by another worker"""
+
+
+def start_worker():
+    """Start this process's job worker thread if it is not already running"""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_worker_loop, name="job-worker", daemon=True)
+            _worker.start()
+
+
+def run_worker():
+    """Run the job worker in the calling thread until interrupted"""
+    print("Job worker running; press Ctrl+C to stop")
+    _worker_loop()
+
+
+def enqueue_task_approval(task_id, requested_by):
+    """Queue a pending task for approval by the worker
+
+    Moves the task to 'processing' so it cannot be approved or rejected twice.
+    Returns the job id, or None if the task is not pending.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(
+            "UPDATE tasks SET status = 'processing', updated_at = CURRENT_TIMESTAMP WHERE id = ? AND status = 'pending'",
+            (task_id,)
+        )
+        if cursor.rowcount == 0:
+            conn.rollback()
+            return None
+        cursor.execute(
+            """
+            INSERT INTO jobs (job_type, task_id, requested_by, progress_total)
+            SELECT 'approve_task', id, ?, record_count FROM tasks WHERE id = ?
+            """,
+            (requested_by, task_id)
+        )
+        job_id = cursor.lastrowid
+        conn.commit()
+        bump_table_version('tasks')
+    finally:
+        conn.close()
+
+    start_worker()
+    _wakeup.set()
+    return job_id
+
+
+def resume_task_approval(task_id, requested_by):
+    """Queue a partially applied task's job again from its checkpoint
+
+    Returns the job id, or None if the task is not 'partial'.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(
+            "UPDATE tasks SET status = 'processing', updated_at = CURRENT_TIMESTAMP WHERE id = ? AND status = 'partial'",
+            (task_id,)
+        )
+        if cursor.rowcount == 0:
+            conn.rollback()
+            return None
+        row = cursor.execute(
+            """
+            UPDATE jobs
+            SET status = 'queued', attempts = 0, requested_by = ?, message = NULL, finished_at = NULL
+            WHERE id = (SELECT MAX(id) FROM jobs WHERE task_id = ?) AND status = 'partial'
+            RETURNING id
+            """,
+            (requested_by, task_id)
+        ).fetchone()
+        if row is None:
+            conn.rollback()
+            return None
+        conn.commit()
+        bump_table_version('tasks')
+    finally:
+        conn.close()
+
+    start_worker()
+    _wakeup.set()
+    return row[0]
+
+
+def get_task_job(task_id):
+    """The most recent job for a task as a dict, or None"""
+    conn = get_db_connection()
+    try:
+        row = conn.execute("SELECT * FROM jobs WHERE task_id = ? ORDER BY id DESC LIMIT 1", (task_id,)).fetchone()
+    finally:
+        conn.close()
+    return dict(row) if row else None
+
+
+def _claim_next_job():
+    """Atomically mark the oldest queued (or abandoned) job as running and return it"""
+    conn = get_db_connection()
+    try:
+        row = conn.execute(
+            """
+            UPDATE jobs
+            SET status = 'running', started_at = COALESCE(started_at, CURRENT_TIMESTAMP), heartbeat_at = CURRENT_TIMESTAMP,
+                attempts = attempts + 1, claim_token = ?
+            WHERE id = (
+                SELECT MIN(id) FROM (
+                    SELECT id FROM jobs WHERE status = 'queued'
+                    UNION ALL
+                    SELECT id FROM jobs WHERE status = 'running' AND heartbeat_at < datetime('now', ?)
+                )
+            )
+            RETURNING *
+            """,
+            (uuid.uuid4().hex, f"-{STALE_AFTER_SECONDS} seconds")
+        ).fetchone()
+        conn.commit()
+    finally:
+        conn.close()
+    return dict(row) if row else None
+
+
+@contextmanager
+def _heartbeat(job):
+    """Refresh a claimed job's heartbeat from a side thread every HEARTBEAT_SECONDS until the block exits"""
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(HEARTBEAT_SECONDS):
+            conn = get_db_connection()
+            try:
+                cursor = conn.execute(
+                    "UPDATE jobs SET heartbeat_at = CURRENT_TIMESTAMP WHERE id = ? AND claim_token = ?",
+                    (job['id'], job['claim_token'])
+                )
+                conn.commit()
+                if cursor.rowcount == 0:
+                    print(f"Job {job['id']} was reclaimed by another worker")
+                    return
+            except sqlite3.OperationalError as e:
+                # A chunk holding the write lock refreshes the heartbeat itself when it commits
+                if 'locked' not in str(e):
+                    print(f"Error refreshing heartbeat of job {job['id']}: {str(e)}")
+            except Exception as e:
+                print(f"Error refreshing heartbeat of job {job['id']}: {str(e)}")
+            finally:
+                conn.close()
+
+    thread = threading.Thread(target=beat, name=f"job-{job['id']}-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _finish_job(job, status, task_status=None, approved_by=None, message=None):
+    """Record a job's final state together with its task's status (left as is if task_status is None)
+
+    Does nothing if another worker has since reclaimed the job.
+    """
+    job_id = job['id']
+    task_id = job['task_id']
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(
+            """
+            UPDATE jobs SET status = ?, message = ?, finished_at = CURRENT_TIMESTAMP, heartbeat_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND claim_token = ?
+            """,
+            (status, message, job_id, job['claim_token'])
+        )
+        if cursor.rowcount == 0:
+            conn.rollback()
+            print(f"Job {job_id} was reclaimed by another worker; not recording it as {status}")
+            return
+        if task_status == 'approved':
+            cursor.execute(
+                """
+                UPDATE tasks
+                SET status = 'approved', approved_by = ?, approved_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP,
+                    inserted_count = (SELECT inserted_count FROM jobs WHERE id = ?),
+                    skipped_count = (SELECT skipped_count FROM jobs WHERE id = ?)
+                WHERE id = ?
+                """,
+                (approved_by, job_id, job_id, task_id)
+            )
+        elif task_status == 'partial':
+            # Keep the counts of the rows already applied alongside the task
+            cursor.execute(
+                """
+                UPDATE tasks
+                SET status = 'partial', updated_at = CURRENT_TIMESTAMP,
+                    inserted_count = (SELECT inserted_count FROM jobs WHERE id = ?),
+                    skipped_count = (SELECT skipped_count FROM jobs WHERE id = ?)
+                WHERE id = ?
+                """,
+                (job_id, job_id, task_id)
+            )
+        elif task_status is not None:
+            cursor.execute(
+                "UPDATE tasks SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (task_status, task_id)
+            )
+        conn.commit()
+        bump_table_version('tasks')
+    finally:
+        conn.close()
+    JOBS_FINISHED.inc(job_type='approve_task', status=status)
+
+
+def _fail_job(job, message):
+    """Queue a job that raised again from its checkpoint, or give up once it has had MAX_JOB_ATTEMPTS runs
+
+    A job that gave up after applying some chunks is left 'partial' rather than
+    failed, as its rows are already committed.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        if job['attempts'] < MAX_JOB_ATTEMPTS:
+            cursor.execute(
+                """
+                UPDATE jobs SET status = 'queued', message = ?, heartbeat_at = CURRENT_TIMESTAMP, claim_token = NULL
+                WHERE id = ? AND claim_token = ?
+                """,
+                (f"Attempt {job['attempts']} of {MAX_JOB_ATTEMPTS} failed: {message}", job['id'], job['claim_token'])
+            )
+            conn.commit()
+            if cursor.rowcount:
+                print(f"Job {job['id']} queued again after attempt {job['attempts']} of {MAX_JOB_ATTEMPTS}")
+            return
+        checkpoint = cursor.execute("SELECT checkpoint FROM jobs WHERE id = ?", (job['id'],)).fetchone()[0]
+    finally:
+        conn.close()
+
+    if checkpoint > 0:
+        message = f"Stopped after {checkpoint:,} records: {message}"
+        _finish_job(job, 'partial', 'partial', message=message)
+    else:
+        _finish_job(job, 'failed', 'failed', message=message)
+
+
+def _run_staged_upload(job, task_dict):
+    """Apply a task_records upload chunk by chunk from the job's checkpoint
+
+    Raises JobReclaimed, with the current chunk rolled back, if another worker
+    has claimed the job since this one did.
+    """
+    total = task_dict['record_count']
+    checkpoint = job['checkpoint']
+    entity_table = ENTITY_TABLES[task_dict['entity_type']]
+
+    while checkpoint < total:
+        row_range = (checkpoint + 1, min(checkpoint + JOB_CHUNK_SIZE, total))
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            result = apply_staged_upload(cursor, task_dict, row_range)
+            cursor.execute(
+                """
+                UPDATE jobs
+                SET checkpoint = ?, progress_done = ?, inserted_count = inserted_count + ?,
+                    skipped_count = skipped_count + ?, heartbeat_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND claim_token = ?
+                """,
+                (row_range[1], row_range[1], result['inserted'], result['skipped'], job['id'], job['claim_token'])
+            )
+            if cursor.rowcount == 0:
+                conn.rollback()
+                raise JobReclaimed(f"Job {job['id']} was reclaimed before rows {row_range[0]}-{row_range[1]} committed")
+            conn.commit()
+        finally:
+            conn.close()
+        bump_table_version(entity_table)
+        checkpoint = row_range[1]
+        print(f"Job {job['id']}: applied rows {row_range[0]}-{row_range[1]} of {total}")
+
+
+def _run_job(job):
+    """Run one claimed approval job to completion, recording success or failure"""
+    task_id = job['task_id']
+    started = time.perf_counter()
+    if job['attempts'] > MAX_JOB_ATTEMPTS:
+        # Claimed again after its process died on the last attempt
+        _fail_job(job, f"Gave up after {MAX_JOB_ATTEMPTS} attempts")
+        return
+    try:
+        conn = get_db_connection()
+        try:
+            task = conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        finally:
+            conn.close()
+        if not task:
+            _finish_job(job, 'failed', 'failed', message=f"Task {task_id} not found")
+            return
+
+        task_dict = dict(task)
+        with _heartbeat(job):
+            if task_dict['task_type'] == 'bulk_upload' and task_dict['record_count'] is not None:
+                _run_staged_upload(job, task_dict)
+                _finish_job(job, 'completed', 'approved', approved_by=job['requested_by'])
+            elif Task.approve(task_id, job['requested_by']):
+                # Task.approve sets the task's status itself
+                _finish_job(job, 'completed')
+            else:
+                _finish_job(job, 'failed', message="Task could not be applied")
+        JOB_SECONDS.observe(time.perf_counter() - started, job_type=job['job_type'])
+        print(f"Job {job['id']} for task {task_id} finished in {time.perf_counter() - started:.1f}s")
+    except JobReclaimed as e:
+        # The worker that reclaimed the job carries on from the last committed checkpoint
+        print(str(e))
+    except Exception as e:
+        print(f"Error in job {job['id']}: {str(e)}")
+        try:
+            _fail_job(job, str(e))
+        except Exception as finish_err:
+            print(f"Error recording job failure: {str(finish_err)}")
+
+
+def _worker_loop():
+    """Run queued jobs one at a time, sleeping until woken or POLL_INTERVAL passes"""
+    while True:
+        try:
+            job = _claim_next_job()
+        except Exception as e:
+            print(f"Error claiming job: {str(e)}")
+            job = None
+
+        if job is None:
+            _wakeup.wait(POLL_INTERVAL)
+            _wakeup.clear()
+            continue
+        _run_job(job)
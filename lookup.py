@@ -0,0 +1,135 @@
+"""In-process index of active reference data for code -> value translation
+
+Each data_type is held as one plain dict of code -> value over its active
+rows, so a lookup is a single dict probe and a batch lookup maps a pandas
+Series through that dict without touching SQLite.
+
+The index checks the reference_data version in cache.py on every call. When a
+write in this process has bumped it, only the data types that changed are
+reloaded: those with rows updated since the last refresh (updated_at is set
+by every insert and update) and those whose row count in stats_counters no
+longer matches the index, which catches deletes and rows moved to another
+type. Writes made by other processes are picked up by calling
+``refresh(force=True)``.
+"""
+import threading
+
+import pandas as pd
+
+from cache import get_table_version
+from database import get_db_connection
+
+_lock = threading.Lock()
+_values = {}  # data_type -> {code: value} for active rows
+_row_counts = {}  # data_type -> rows of any status, as counted in stats_counters
+_version = None
+_watermark = None  # latest updated_at seen by the last refresh
+
+
+def _load_types(conn, data_types):
+    """Fresh code -> value dicts of the active rows of each data type"""
+    cursor = conn.cursor()
+    cursor.row_factory = None  # plain tuples feed dict() directly
+    loaded = {}
+    for data_type in data_types:
+        cursor.execute(
+            "SELECT code, value FROM reference_data WHERE status = ? AND data_type = ?", ('active', data_type)
+        )
+        loaded[data_type] = dict(cursor)
+    return loaded
+
+
+def refresh(force=False):
+    """Bring the index up to date with reference_data; returns the data types reloaded
+
+    Without force, nothing is read while the table version is unchanged.
+    """
+    global _version, _watermark
+    with _lock:
+        version = get_table_version('reference_data')
+        if version == _version and not force:
+            return []
+
+        conn = get_db_connection()
+        try:
+            row_counts = dict(conn.execute(
+                "SELECT key, count FROM stats_counters WHERE scope = 'reference_data.data_type' AND count > 0"
+            ).fetchall())
+            watermark = conn.execute("SELECT MAX(updated_at) FROM reference_data").fetchone()[0]
+
+            if _version is None or force:
+                changed = set(row_counts)
+            else:
+                # Rows updated in the second of the last refresh are read again, as updated_at has 1s resolution.
+                # Not DISTINCT: that lets SQLite pick the (data_type, code) index and read all of it.
+                changed = {
+                    data_type for (data_type,) in conn.execute(
+                        "SELECT data_type FROM reference_data WHERE updated_at >= ?", (_watermark or '',)
+                    )
+                }
+                changed.update(
+                    data_type for data_type in set(row_counts) | set(_row_counts)
+                    if row_counts.get(data_type) != _row_counts.get(data_type)
+                )
+            loaded = _load_types(conn, changed & set(row_counts))
+        finally:
+            conn.close()
+
+        for data_type in changed:
+            if data_type in loaded:
+                _values[data_type] = loaded[data_type]
+            else:
+                _values.pop(data_type, None)
+        _row_counts.clear()
+        _row_counts.update(row_counts)
+        _watermark = watermark
+        _version = version
+        return sorted(changed)
+
+
+def _ensure_current():
+    """Refresh the index if reference_data has changed since it was built"""
+    if get_table_version('reference_data') != _version:
+        refresh()
+
+
+def _codes(data_type):
+    """The code -> value dict of a data type, refreshing the index first if needed"""
+    _ensure_current()
+    return _values.get(data_type, {})
+
+
+def lookup(data_type, code, default=None):
+    """Value of an active reference code, or default if it is unknown or inactive"""
+    return _codes(data_type).get(code, default)
+
+
+def lookup_many(data_type, codes, default=None):
+    """Translate a Series of codes to a Series of values with the same index
+
+    ``data_type`` is a single type or a Series aligned with ``codes``; unknown
+    and inactive codes become default (NaN if it is None).
+    """
+    codes = pd.Series(codes) if not isinstance(codes, pd.Series) else codes
+    if isinstance(data_type, pd.Series):
+        values = pd.Series(index=codes.index, dtype=object)
+        for type_name, positions in data_type.groupby(data_type, sort=False).indices.items():
+            part = codes.iloc[positions]
+            values.iloc[positions] = part.map(_codes(type_name)).to_numpy()
+    else:
+        values = codes.map(_codes(data_type))
+    if default is not None:
+        values = values.fillna(default)
+    return values
+
+
+def data_types():
+    """Data types with at least one active row"""
+    _ensure_current()
+    return sorted(data_type for data_type, codes in _values.items() if codes)
+
+
+def stats():
+    """Data types and codes held in the index"""
+    with _lock:
+        return {'data_types': len(_values), 'codes': sum(len(codes) for codes in _values.values())}
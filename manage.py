@@ -0,0 +1,167 @@
+"""Maintenance commands for the Data Governance platform database
+
+Usage:
+    python manage.py migrate
+    python manage.py check-plans
+    python manage.py worker
+    python manage.py recompress [--min-bytes N] [--batch-size N] [--vacuum]
+    python manage.py generate PATH [--scale 1k|100k|1m] [--seed N]
+    python manage.py export {reference_data,users} PATH [--format csv|xlsx|parquet] [--type T] [--role R]
+        [--status S] [--search TERM]
+"""
+import argparse
+import os
+import sys
+
+import database
+import export
+import jobs
+import payloads
+import synthetic
+
+
+def cmd_migrate(args):
+    """Apply any pending schema migrations"""
+    database.initialize_database()
+    conn = database.get_db_connection()
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+    print(f"Schema is at version {version}")
+    return 0
+
+
+def cmd_check_plans(args):
+    """Fail if any catalogued hot-path query does a full table scan"""
+    database.initialize_database()
+    try:
+        plans = database.check_query_plans()
+    except RuntimeError as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    
+    for name, details in plans.items():
+        print(f"{name}: {'; '.join(details)}")
+    print(f"OK: {len(plans)} queries use indexes")
+    return 0
+
+
+def cmd_worker(args):
+    """Run the background job worker in the foreground, for deployments where no app process runs it"""
+    database.initialize_database()
+    try:
+        jobs.run_worker()
+    except KeyboardInterrupt:
+        print("Job worker stopped")
+    return 0
+
+
+def cmd_recompress(args):
+    """Compress existing plain-JSON task payloads at or above the size threshold"""
+    database.initialize_database()
+    threshold = payloads.COMPRESS_THRESHOLD if args.min_bytes is None else args.min_bytes
+    conn = database.get_db_connection()
+    rewritten = bytes_before = bytes_after = 0
+    try:
+        task_ids = [
+            row[0] for row in conn.execute(
+                "SELECT id FROM tasks WHERE typeof(data_json) = 'text' AND length(CAST(data_json AS BLOB)) >= ? ORDER BY id",
+                (threshold,)
+            )
+        ]
+        # One payload in memory at a time, committing every batch_size rows
+        for task_id in task_ids:
+            (value,) = conn.execute("SELECT data_json FROM tasks WHERE id = ?", (task_id,)).fetchone()
+            compressed = payloads.dumps(payloads.loads(value), threshold=threshold)
+            conn.execute("UPDATE tasks SET data_json = ? WHERE id = ?", (compressed, task_id))
+            rewritten += 1
+            bytes_before += len(value.encode())
+            bytes_after += len(compressed)
+            if rewritten % args.batch_size == 0:
+                conn.commit()
+        conn.commit()
+        
+        print(f"Recompressed {rewritten} task payloads: {bytes_before:,} -> {bytes_after:,} bytes")
+        if args.vacuum and rewritten:
+            print("Reclaiming free pages with VACUUM...")
+            conn.execute("VACUUM")
+    finally:
+        conn.close()
+    return 0
+
+
+def cmd_generate(args):
+    """Create a new database filled with deterministic synthetic data"""
+    if os.path.exists(args.path):
+        print(f"{args.path} already exists; choose a new path", file=sys.stderr)
+        return 1
+    counts = synthetic.generate(args.path, args.scale, seed=args.seed)
+    print(f"Generated {args.path}: " + ", ".join(f"{count:,} {name.replace('_', ' ')}" for name, count in counts.items()))
+    return 0
+
+
+def cmd_export(args):
+    """Stream the rows of a list table matching the filters to a file"""
+    database.initialize_database()
+    file_format = args.format or os.path.splitext(args.path)[1].lstrip('.').lower() or 'csv'
+    filters = {'search': args.search}
+    if args.table == 'reference_data':
+        filters['data_type'] = args.type
+        filters['status'] = args.status
+    else:
+        filters['role'] = args.role
+    try:
+        with open(args.path, 'wb') as out:
+            rows = export.export_table(args.table, filters, file_format, out)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    print(f"Exported {rows:,} rows to {args.path}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", help="Path to the SQLite database (defaults to database.DB_PATH)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    subparsers.add_parser("migrate", help=cmd_migrate.__doc__).set_defaults(func=cmd_migrate)
+    subparsers.add_parser("check-plans", help=cmd_check_plans.__doc__).set_defaults(func=cmd_check_plans)
+    subparsers.add_parser("worker", help=cmd_worker.__doc__).set_defaults(func=cmd_worker)
+    
+    recompress = subparsers.add_parser("recompress", help=cmd_recompress.__doc__)
+    recompress.add_argument("--min-bytes", type=int, help="Only compress payloads at least this large (default: payloads.COMPRESS_THRESHOLD)")
+    recompress.add_argument("--batch-size", type=int, default=50, help="Rows rewritten per transaction")
+    recompress.add_argument("--vacuum", action="store_true", help="Run VACUUM afterwards to shrink the database file")
+    recompress.set_defaults(func=cmd_recompress)
+    
+    generate = subparsers.add_parser("generate", help=cmd_generate.__doc__)
+    generate.add_argument("path", help="Path of the database file to create")
+    generate.add_argument("--scale", choices=sorted(synthetic.SCALES), default="1k", help="Dataset size (see synthetic.SCALES)")
+    generate.add_argument("--seed", type=int, default=0, help="Random seed; the same seed always produces the same rows")
+    generate.set_defaults(func=cmd_generate)
+    
+    export_parser = subparsers.add_parser("export", help=cmd_export.__doc__)
+    export_parser.add_argument("table", choices=["reference_data", "users"], help="Table to export")
+    export_parser.add_argument("path", help="Output file")
+    export_parser.add_argument("--format", choices=sorted(export.EXPORT_FORMATS), help="File format (default: from the file extension)")
+    export_parser.add_argument("--type", help="Only reference data of this data type")
+    export_parser.add_argument("--role", help="Only users with this role")
+    export_parser.add_argument("--status", help="Only reference data with this status")
+    export_parser.add_argument("--search", help="Only rows matching this search term, as on the list pages")
+    export_parser.set_defaults(func=cmd_export)
+    
+    args = parser.parse_args(argv)
+    if args.command == "export":
+        # Filter options that only apply to one of the exportable tables
+        for option, table in (("type", "reference_data"), ("status", "reference_data"), ("role", "users")):
+            if getattr(args, option) is not None and args.table != table:
+                export_parser.error(f"--{option} only applies to {table} exports")
+    if args.db:
+        database.DB_PATH = args.db
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
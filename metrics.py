@@ -0,0 +1,306 @@
+"""In-process metrics registry with Prometheus-text and JSON export
+
+Counters, gauges and histograms are registered once at import time by the
+modules they describe and updated in place; gauges may instead be computed
+by a function each time they are read. ``start_exporter`` serves the
+registry in the Prometheus text format on METRICS_HOST:METRICS_PORT from a
+daemon thread and writes a JSON snapshot to METRICS_JSON_PATH every
+METRICS_DUMP_SECONDS. Set METRICS_PORT=0 or METRICS_JSON_PATH= to turn
+either off.
+
+METRICS_HOST defaults to 127.0.0.1, so only the local machine can scrape the
+endpoint. In a container, set METRICS_HOST=0.0.0.0 (or the address of the
+interface Prometheus reaches) to expose it.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_HOST = os.environ.get('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.environ.get('METRICS_PORT', 9464))
+METRICS_JSON_PATH = os.environ.get('METRICS_JSON_PATH', 'metrics.json')
+METRICS_DUMP_SECONDS = float(os.environ.get('METRICS_DUMP_SECONDS', 60))
+PREFIX = 'data_governance_'
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+_lock = threading.Lock()
+_registry = {}
+_exporter_started = False
+
+
+def _label_key(labelnames, labels):
+    """Label values in labelnames order; raises ValueError for missing or unknown labels"""
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {labelnames}, got {tuple(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = list(zip(labelnames, key)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    """Monotonically increasing count per label set"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with _lock:
+            return [(self.name, key, (), value) for key, value in self._values.items()]
+
+    def snapshot(self):
+        with _lock:
+            return [{'labels': dict(zip(self.labelnames, key)), 'value': value} for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    """Value that can go up and down, or be computed on read by a function"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self._function = function
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with _lock:
+            self._values[key] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def _refresh(self):
+        """Re-read a function-backed gauge; a failing function leaves the last value"""
+        if self._function is None:
+            return
+        try:
+            value = self._function()
+        except Exception as e:
+            print(f"Error reading gauge {self.name}: {str(e)}")
+            return
+        with _lock:
+            self._values[()] = value
+
+    def samples(self):
+        self._refresh()
+        return super().samples()
+
+    def snapshot(self):
+        self._refresh()
+        return super().snapshot()
+
+
+class Histogram:
+    """Distribution of observed values (e.g. latencies in seconds) per label set"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of the with-block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        samples = []
+        with _lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", key, (('le', f"{bound:g}"),), cumulative))
+            samples.append((f"{self.name}_bucket", key, (('le', '+Inf'),), state[-1]))
+            samples.append((f"{self.name}_sum", key, (), state[-2]))
+            samples.append((f"{self.name}_count", key, (), state[-1]))
+        return samples
+
+    def snapshot(self):
+        with _lock:
+            return [
+                {
+                    'labels': dict(zip(self.labelnames, key)),
+                    'count': state[-1],
+                    'sum': state[-2],
+                    'buckets': dict(zip((f"{bound:g}" for bound in self.buckets), state[:len(self.buckets)])),
+                }
+                for key, state in self._values.items()
+            ]
+
+
+def _register(metric_class, name, documentation, labelnames, **options):
+    """Get the metric registered under name, creating it on first use"""
+    name = PREFIX + name
+    with _lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = metric_class(name, documentation, labelnames, **options)
+        elif not isinstance(metric, metric_class):
+            raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+    return metric
+
+
+def counter(name, documentation, labelnames=()):
+    return _register(Counter, name, documentation, labelnames)
+
+
+def gauge(name, documentation, labelnames=(), function=None):
+    return _register(Gauge, name, documentation, labelnames, function=function)
+
+
+def histogram(name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+    return _register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+
+def _truthy_outcome(result):
+    return ['success' if result else 'failure']
+
+
+def track(latency, outcomes, outcome_of=_truthy_outcome, **labels):
+    """Decorator observing a call's latency and counting its outcome
+
+    ``outcome_of(result)`` returns the outcome labels to count for a result,
+    one per item for calls that process several; by default 'success' for a
+    truthy result and 'failure' for a falsy one. A call that raises counts
+    once as 'error'.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            counted = ['error']
+            try:
+                result = func(*args, **kwargs)
+                counted = outcome_of(result)
+                return result
+            finally:
+                latency.observe(time.perf_counter() - started, **labels)
+                for outcome in counted:
+                    outcomes.inc(outcome=outcome, **labels)
+        return wrapper
+    return decorator
+
+
+def render_prometheus():
+    """The whole registry in the Prometheus text exposition format"""
+    with _lock:
+        metrics = sorted(_registry.values(), key=lambda metric: metric.name)
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for sample_name, key, extra, value in metric.samples():
+            lines.append(f"{sample_name}{_format_labels(metric.labelnames, key, extra)} {value}")
+    return '\n'.join(lines) + '\n'
+
+
+def snapshot():
+    """The whole registry as a JSON-serialisable dict"""
+    with _lock:
+        metrics = sorted(_registry.values(), key=lambda metric: metric.name)
+    return {
+        'timestamp': time.time(),
+        'metrics': {
+            metric.name: {'type': metric.kind, 'help': metric.documentation, 'samples': metric.snapshot()}
+            for metric in metrics
+        },
+    }
+
+
+def dump_json(path=None):
+    """Write a snapshot to path, replacing the previous file atomically"""
+    path = path or METRICS_JSON_PATH
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot(), f, indent=1)
+    os.replace(temp_path, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes every few seconds would flood the app's output
+
+
+def _dump_loop():
+    while True:
+        time.sleep(METRICS_DUMP_SECONDS)
+        try:
+            dump_json()
+        except Exception as e:
+            print(f"Error writing metrics to {METRICS_JSON_PATH}: {str(e)}")
+
+
+def start_exporter():
+    """Start the HTTP endpoint and JSON dump threads once per process"""
+    global _exporter_started
+    with _lock:
+        if _exporter_started:
+            return
+        _exporter_started = True
+
+    if METRICS_PORT:
+        try:
+            server = ThreadingHTTPServer((METRICS_HOST, METRICS_PORT), _MetricsHandler)
+        except OSError as e:
+            print(f"Metrics endpoint not started on {METRICS_HOST}:{METRICS_PORT}: {str(e)}")
+        else:
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    if METRICS_JSON_PATH:
+        threading.Thread(target=_dump_loop, name="metrics-dump", daemon=True).start()
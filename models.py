@@ -1,9 +1,220 @@
 import json
 import pandas as pd
 import sqlite3
-from database import get_db_connection
+from collections.abc import Mapping
+import metrics
+import payloads
+from database import get_db_connection, TASK_RECORD_COLUMNS, TASK_SUMMARY_COLUMNS
 from datetime import datetime
 from auth import hash_password
+from passwords import hash_passwords
+from cache import bump_table_version
+from bulk_apply import BATCH_SIZE, apply_bulk_records, apply_task_records
+from validation import normalize_keys
+
+# Table written when a task for each entity type is approved
+ENTITY_TABLES = {
+    'user': 'users',
+    'reference_data': 'reference_data',
+}
+
+TASK_OPERATION_SECONDS = metrics.histogram('task_operation_seconds', 'Latency of task operations', ('operation',))
+TASK_OPERATIONS = metrics.counter('task_operations_total', 'Task operations by outcome', ('operation', 'outcome'))
+
+def _pending_task_count():
+    """Pending tasks according to the trigger-maintained counters"""
+    conn = get_db_connection()
+    try:
+        row = conn.execute("SELECT count FROM stats_counters WHERE scope = 'tasks.status' AND key = 'pending'").fetchone()
+    finally:
+        conn.close()
+    return row[0] if row else 0
+
+PENDING_TASKS = metrics.gauge('pending_tasks', 'Tasks waiting for approval', function=_pending_task_count)
+
+# Metric outcome of each per-task result of a batch operation; anything else is a failure
+BATCH_METRIC_OUTCOMES = {'approved': 'success', 'rejected': 'success', 'queued': 'queued', 'error': 'error'}
+
+def _batch_outcomes(outcomes):
+    """Metric outcomes of a batch operation, one per task"""
+    return [BATCH_METRIC_OUTCOMES.get(outcome, 'failure') for outcome in outcomes.values()]
+
+def _track_task_operation(operation, outcome_of=None):
+    """Time a Task operation and count its outcome in the task operation metrics"""
+    if outcome_of is None:
+        return metrics.track(TASK_OPERATION_SECONDS, TASK_OPERATIONS, operation=operation)
+    return metrics.track(TASK_OPERATION_SECONDS, TASK_OPERATIONS, outcome_of, operation=operation)
+
+def _record_bulk_result(cursor, task_id, result):
+    """Store and log the outcome of applying a bulk upload task"""
+    cursor.execute(
+        "UPDATE tasks SET inserted_count = ?, skipped_count = ? WHERE id = ?",
+        (result['inserted'], result['skipped'], task_id)
+    )
+    print(f"Bulk upload task {task_id}: {result['inserted']} inserted, {result['skipped']} skipped of {result['total']} records")
+    for conflict in result['conflicts']:
+        print(f"  Skipped row {conflict[0]}: {'-'.join(str(value) for value in conflict[1:])} is incomplete or already exists")
+
+def apply_staged_upload(cursor, task_dict, row_range=None):
+    """Apply a bulk upload staged in task_records, or only rows (first, last) of it
+    
+    Runs on the caller's cursor without committing and returns the
+    bulk_apply result dict. For user uploads the distinct plain passwords are
+    hashed before anything is written, and cleared from task_records after.
+    """
+    task_id = task_dict['id']
+    entity_type = task_dict['entity_type']
+    range_filter = "AND row_num BETWEEN ? AND ?" if row_range else ""
+    range_params = tuple(row_range or ())
+    
+    password_hashes = None
+    if entity_type == 'user':
+        cursor.execute(
+            f"""
+            SELECT DISTINCT password FROM task_records
+            WHERE task_id = ? AND password_hash IS NULL AND password IS NOT NULL {range_filter}
+            """,
+            (task_id, *range_params)
+        )
+        passwords = [row[0] for row in cursor.fetchall()]
+        password_hashes = dict(zip(passwords, hash_passwords(passwords)))
+    
+    result = apply_task_records(cursor, entity_type, task_id, task_dict['created_by'], password_hashes, row_range)
+    
+    if entity_type == 'user':
+        # The plain passwords are not needed once the users exist
+        cursor.execute(f"UPDATE task_records SET password = NULL WHERE task_id = ? {range_filter}", (task_id, *range_params))
+    return result
+
+def _hash_record_passwords(records):
+    """Password hashes for bulk user records, hashing plain passwords as one parallel batch"""
+    passwords = []
+    for record in records:
+        password = record.get('password')
+        if record.get('password_hash') or password is None or password != password:  # NaN from empty cells
+            passwords.append(None)
+        else:
+            passwords.append(str(password))
+    hashes = hash_passwords(passwords)
+    return [record.get('password_hash') or password_hash for record, password_hash in zip(records, hashes)]
+
+# Record columns never shown in previews
+HIDDEN_RECORD_COLUMNS = ('password', 'password_hash')
+
+def _payload_records(cursor, task_id, limit=None):
+    """Records embedded in a task's data_json, decoding only the first ``limit`` of them
+    
+    For plain-text payloads json_each walks the array inside SQLite, so a
+    preview never builds the full record list in Python. Compressed payloads,
+    or a SQLite without JSON1, fall back to decoding the whole payload.
+    """
+    cursor.execute("SELECT typeof(data_json) FROM tasks WHERE id = ?", (task_id,))
+    row = cursor.fetchone()
+    if row and row[0] == 'text':
+        try:
+            sql = "SELECT value FROM tasks, json_each(tasks.data_json, '$.records') WHERE tasks.id = ? ORDER BY json_each.key"
+            params = [task_id]
+            if limit is not None:
+                sql += " LIMIT ?"
+                params.append(limit)
+            cursor.execute(sql, params)
+            return [json.loads(value) for (value,) in cursor.fetchall()]
+        except sqlite3.OperationalError:
+            pass
+    cursor.execute("SELECT data_json FROM tasks WHERE id = ?", (task_id,))
+    row = cursor.fetchone()
+    records = (payloads.loads(row[0]) or {}).get('records', []) if row else []
+    return records[:limit] if limit is not None else records
+
+class LazyTask(Mapping):
+    """A task row whose data_json payload is read and decoded only when first needed
+    
+    Behaves like the dict Task.get used to return; the payload is fetched the
+    first time ``task['data']`` is read.
+    """
+    
+    def __init__(self, row):
+        self._row = dict(row)
+        self._data = None
+    
+    def __getitem__(self, key):
+        if key == 'data':
+            return self.data
+        return self._row[key]
+    
+    def __iter__(self):
+        yield from self._row
+        yield 'data'
+    
+    def __len__(self):
+        return len(self._row) + 1
+    
+    @property
+    def data(self):
+        """The decoded payload"""
+        if self._data is None:
+            conn = get_db_connection()
+            try:
+                row = conn.execute("SELECT data_json FROM tasks WHERE id = ?", (self._row['id'],)).fetchone()
+            finally:
+                conn.close()
+            self._data = (payloads.loads(row[0]) if row else None) or {}
+        return self._data
+    
+    def field(self, key, default=None):
+        """One top-level payload value, extracted in SQLite without decoding the rest"""
+        if self._data is not None:
+            return self._data.get(key, default)
+        conn = get_db_connection()
+        try:
+            row = conn.execute(
+                """
+                SELECT typeof(data_json), CASE WHEN typeof(data_json) = 'text' THEN json_extract(data_json, ?) END
+                FROM tasks WHERE id = ?
+                """,
+                ('$.' + json.dumps(key), self._row['id'])
+            ).fetchone()
+        except sqlite3.OperationalError:
+            row = ('blob', None)
+        finally:
+            conn.close()
+        if row and row[0] != 'text':
+            # Compressed payloads can only be read by decoding them
+            return self.data.get(key, default)
+        return row[1] if row and row[1] is not None else default
+    
+    @property
+    def record_count(self):
+        """Number of records in a bulk upload, whether staged or embedded in data_json"""
+        if self._row.get('record_count') is not None:
+            return self._row['record_count']
+        return self.field('record_count', 0)
+    
+    def preview_records(self, n):
+        """The first n records of a bulk upload as a DataFrame"""
+        return Task.get_records(self._row['id'], limit=n)
+
+def _mark_task_approved(cursor, task_id, approved_by):
+    """Set a task's status to approved"""
+    cursor.execute(
+        """
+        UPDATE tasks
+        SET status = 'approved', approved_by = ?, approved_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+        """,
+        (approved_by, task_id)
+    )
+
+def _mark_task_failed(cursor, task_id):
+    """Set a task's status to failed"""
+    cursor.execute(
+        """
+        UPDATE tasks
+        SET status = 'failed', updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+        """,
+        (task_id,)
+    )
 
 class User:
     @staticmethod
@@ -36,6 +247,7 @@ class User:
                     (username, password_hash, role, email, full_name, department, created_by)
                 )
                 conn.commit()
+                bump_table_version('users')
                 return True
             except sqlite3.IntegrityError:
                 return False
@@ -78,6 +290,7 @@ class User:
                     values
                 )
                 conn.commit()
+                bump_table_version('users')
                 return cursor.rowcount > 0
             finally:
                 conn.close()
@@ -97,6 +310,7 @@ class User:
             try:
                 cursor.execute("DELETE FROM users WHERE id = ?", (user_id,))
                 conn.commit()
+                bump_table_version('users')
                 return cursor.rowcount > 0
             finally:
                 conn.close()
@@ -153,6 +367,7 @@ class ReferenceData:
                     (data_type, code, value, description, created_by)
                 )
                 conn.commit()
+                bump_table_version('reference_data')
                 return True
             except sqlite3.IntegrityError:
                 return False
@@ -195,6 +410,7 @@ class ReferenceData:
                     values
                 )
                 conn.commit()
+                bump_table_version('reference_data')
                 return cursor.rowcount > 0
             finally:
                 conn.close()
@@ -214,6 +430,7 @@ class ReferenceData:
             try:
                 cursor.execute("DELETE FROM reference_data WHERE id = ?", (ref_id,))
                 conn.commit()
+                bump_table_version('reference_data')
                 return cursor.rowcount > 0
             finally:
                 conn.close()
@@ -243,6 +460,7 @@ class ReferenceData:
 
 class Task:
     @staticmethod
+    @_track_task_operation('create')
     def create(task_type, entity_type, entity_id, data, created_by):
         """Create a new task"""
         conn = get_db_connection()
@@ -254,244 +472,316 @@ class Task:
                 INSERT INTO tasks (task_type, entity_type, entity_id, data_json, created_by)
                 VALUES (?, ?, ?, ?, ?)
                 """,
-                (task_type, entity_type, entity_id, json.dumps(data), created_by)
+                (task_type, entity_type, entity_id, payloads.dumps(data), created_by)
             )
             conn.commit()
+            bump_table_version('tasks')
             return cursor.lastrowid
         finally:
             conn.close()
     
     @staticmethod
-    def approve(task_id, approved_by):
-        """Approve a task and execute the related action using direct SQL operations"""
+    @_track_task_operation('create_bulk_upload')
+    def create_bulk_upload(entity_type, file_name, chunks, created_by):
+        """Create a bulk upload task, staging its records in task_records
+        
+        ``chunks`` is an iterable of DataFrames; columns outside
+        TASK_RECORD_COLUMNS[entity_type] are ignored and missing ones stored as
+        NULL. Key columns are staged as validation saw them (see
+        validation.normalize_keys). The task row itself holds only the file
+        name and record count.
+        """
+        columns = TASK_RECORD_COLUMNS[entity_type]
+        insert_sql = (
+            f"INSERT INTO task_records (task_id, row_num, {', '.join(columns)}) "
+            f"VALUES (?, ?, {', '.join('?' for _ in columns)})"
+        )
         conn = get_db_connection()
         cursor = conn.cursor()
         
         try:
-            # Get the task details
-            cursor.execute("SELECT * FROM tasks WHERE id = ?", (task_id,))
-            task = cursor.fetchone()
-            
-            if not task:
-                print(f"Task approval failed: Task {task_id} not found")
-                return False
-            
-            task_dict = dict(task)
-            data = json.loads(task_dict['data_json'])
-            
-            print(f"Approving task: {task_id}, Type: {task_dict['task_type']}, Entity: {task_dict['entity_type']}")
-            
-            # Process based on task type and entity type
-            success = False
-            
-            # User creation
-            if task_dict['task_type'] == 'create' and task_dict['entity_type'] == 'user':
-                try:
-                    # Hash the password if it's not already hashed
-                    password_hash = data.get('password_hash')
-                    if not password_hash and 'password' in data:
-                        password_hash = hash_password(data['password'])
-                    
-                    # Insert directly into users table
-                    cursor.execute(
-                        """
-                        INSERT INTO users (username, password_hash, role, email, full_name, department, created_by)
-                        VALUES (?, ?, ?, ?, ?, ?, ?)
-                        """,
+            cursor.execute(
+                """
+                INSERT INTO tasks (task_type, entity_type, entity_id, data_json, created_by)
+                VALUES ('bulk_upload', ?, NULL, ?, ?)
+                """,
+                (entity_type, payloads.dumps({'file_name': file_name}), created_by)
+            )
+            task_id = cursor.lastrowid
+            
+            record_count = 0
+            for chunk in chunks:
+                chunk = normalize_keys(chunk, entity_type)
+                for start in range(0, len(chunk), BATCH_SIZE):
+                    batch = chunk.iloc[start:start + BATCH_SIZE].reindex(columns=list(columns)).astype(object)
+                    batch = batch.where(batch.notna(), None)
+                    cursor.executemany(
+                        insert_sql,
                         (
-                            data['username'],
-                            password_hash,
-                            data['role'],
-                            data.get('email'),
-                            data.get('full_name'),
-                            data.get('department'),
-                            task_dict['created_by']
+                            (task_id, record_count + offset + 1, *values)
+                            for offset, values in enumerate(batch.itertuples(index=False, name=None))
                         )
                     )
-                    success = True
-                except sqlite3.IntegrityError:
-                    print(f"User creation failed: Username {data.get('username')} already exists")
-                    success = False
+                    record_count += len(batch)
             
-            # Reference data creation
-            elif task_dict['task_type'] == 'create' and task_dict['entity_type'] == 'reference_data':
-                try:
-                    cursor.execute(
-                        """
-                        INSERT INTO reference_data (data_type, code, value, description, created_by)
-                        VALUES (?, ?, ?, ?, ?)
-                        """,
-                        (
-                            data['data_type'],
-                            data['code'],
-                            data['value'],
-                            data.get('description'),
-                            task_dict['created_by']
-                        )
-                    )
-                    success = True
-                except sqlite3.IntegrityError:
-                    print(f"Reference data creation failed: {data.get('data_type')}-{data.get('code')} already exists")
-                    success = False
+            cursor.execute(
+                "UPDATE tasks SET data_json = ?, record_count = ? WHERE id = ?",
+                (payloads.dumps({'file_name': file_name, 'record_count': record_count}), record_count, task_id)
+            )
+            conn.commit()
+            bump_table_version('tasks')
+            return task_id
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def get_records(task_id, limit=None):
+        """Records of a bulk upload task as a DataFrame, in upload order, without passwords
+        
+        Reads the task_records staging rows, or the records embedded in
+        data_json for tasks created before the staging table existed.
+        """
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("SELECT entity_type, record_count FROM tasks WHERE id = ?", (task_id,))
+            task = cursor.fetchone()
+            if not task:
+                return pd.DataFrame()
             
-            # User update
-            elif task_dict['task_type'] == 'update' and task_dict['entity_type'] == 'user':
-                # Build SET clause and values dynamically
-                set_clauses = []
-                values = []
-                
-                for key, value in data.items():
-                    if key not in ['id', 'username', 'created_at', 'created_by']:  # Skip immutable fields
-                        if key == 'password':
-                            set_clauses.append("password_hash = ?")
-                            values.append(hash_password(value))
-                        elif key != 'password_hash':  # Skip password_hash if present, we've handled password
-                            set_clauses.append(f"{key} = ?")
-                            values.append(value)
+            if task['record_count'] is None:
+                records = pd.DataFrame(_payload_records(cursor, task_id, limit))
+                return records.drop(columns=list(HIDDEN_RECORD_COLUMNS), errors='ignore')
+            
+            columns = ', '.join(
+                column for column in TASK_RECORD_COLUMNS[task['entity_type']] if column not in HIDDEN_RECORD_COLUMNS
+            )
+            sql = f"SELECT row_num, {columns} FROM task_records WHERE task_id = ? ORDER BY row_num"
+            params = [task_id]
+            if limit is not None:
+                sql += " LIMIT ?"
+                params.append(limit)
+            return pd.read_sql_query(sql, conn, params=params)
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def _execute(cursor, task_dict):
+        """Carry out a task's change on the caller's cursor without committing; returns success"""
+        task_id = task_dict['id']
+        data = payloads.loads(task_dict['data_json'])
+        
+        # Process based on task type and entity type
+        success = False
+        
+        # User creation
+        if task_dict['task_type'] == 'create' and task_dict['entity_type'] == 'user':
+            try:
+                # Hash the password if it's not already hashed
+                password_hash = data.get('password_hash')
+                if not password_hash and 'password' in data:
+                    password_hash = hash_password(data['password'])
                 
-                if set_clauses:
-                    set_clauses.append("updated_at = CURRENT_TIMESTAMP")
-                    values.append(task_dict['entity_id'])
-                    
-                    # Execute update
-                    cursor.execute(
-                        f"""
-                        UPDATE users
-                        SET {', '.join(set_clauses)}
-                        WHERE id = ?
-                        """,
-                        values
+                # Insert directly into users table
+                cursor.execute(
+                    """
+                    INSERT INTO users (username, password_hash, role, email, full_name, department, created_by)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        data['username'],
+                        password_hash,
+                        data['role'],
+                        data.get('email'),
+                        data.get('full_name'),
+                        data.get('department'),
+                        task_dict['created_by']
                     )
-                    success = cursor.rowcount > 0
-                else:
-                    success = True  # No changes to make
+                )
+                success = True
+            except sqlite3.IntegrityError:
+                print(f"User creation failed: Username {data.get('username')} already exists")
+                success = False
+        
+        # Reference data creation
+        elif task_dict['task_type'] == 'create' and task_dict['entity_type'] == 'reference_data':
+            try:
+                cursor.execute(
+                    """
+                    INSERT INTO reference_data (data_type, code, value, description, created_by)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    (
+                        data['data_type'],
+                        data['code'],
+                        data['value'],
+                        data.get('description'),
+                        task_dict['created_by']
+                    )
+                )
+                success = True
+            except sqlite3.IntegrityError:
+                print(f"Reference data creation failed: {data.get('data_type')}-{data.get('code')} already exists")
+                success = False
+        
+        # User update
+        elif task_dict['task_type'] == 'update' and task_dict['entity_type'] == 'user':
+            # Build SET clause and values dynamically
+            set_clauses = []
+            values = []
             
-            # Reference data update
-            elif task_dict['task_type'] == 'update' and task_dict['entity_type'] == 'reference_data':
-                # Build SET clause and values dynamically
-                set_clauses = []
-                values = []
-                
-                for key, value in data.items():
-                    if key not in ['id', 'created_at', 'created_by']:  # Skip immutable fields
+            for key, value in data.items():
+                if key not in ['id', 'username', 'created_at', 'created_by']:  # Skip immutable fields
+                    if key == 'password':
+                        set_clauses.append("password_hash = ?")
+                        values.append(hash_password(value))
+                    elif key != 'password_hash':  # Skip password_hash if present, we've handled password
                         set_clauses.append(f"{key} = ?")
                         values.append(value)
-                
-                if set_clauses:
-                    set_clauses.append("updated_at = CURRENT_TIMESTAMP")
-                    values.append(task_dict['entity_id'])
-                    
-                    # Execute update
-                    cursor.execute(
-                        f"""
-                        UPDATE reference_data
-                        SET {', '.join(set_clauses)}
-                        WHERE id = ?
-                        """,
-                        values
-                    )
-                    success = cursor.rowcount > 0
-                else:
-                    success = True  # No changes to make
             
-            # User deletion
-            elif task_dict['task_type'] == 'delete' and task_dict['entity_type'] == 'user':
-                cursor.execute("DELETE FROM users WHERE id = ?", (task_dict['entity_id'],))
+            if set_clauses:
+                set_clauses.append("updated_at = CURRENT_TIMESTAMP")
+                values.append(task_dict['entity_id'])
+                
+                # Execute update
+                cursor.execute(
+                    f"""
+                    UPDATE users
+                    SET {', '.join(set_clauses)}
+                    WHERE id = ?
+                    """,
+                    values
+                )
                 success = cursor.rowcount > 0
+            else:
+                success = True  # No changes to make
+        
+        # Reference data update
+        elif task_dict['task_type'] == 'update' and task_dict['entity_type'] == 'reference_data':
+            # Build SET clause and values dynamically
+            set_clauses = []
+            values = []
             
-            # Reference data deletion
-            elif task_dict['task_type'] == 'delete' and task_dict['entity_type'] == 'reference_data':
-                cursor.execute("DELETE FROM reference_data WHERE id = ?", (task_dict['entity_id'],))
-                success = cursor.rowcount > 0
+            for key, value in data.items():
+                if key not in ['id', 'created_at', 'created_by']:  # Skip immutable fields
+                    set_clauses.append(f"{key} = ?")
+                    values.append(value)
             
-            # Bulk upload for users
-            elif task_dict['task_type'] == 'bulk_upload' and task_dict['entity_type'] == 'user':
-                # Process each record in the bulk upload
-                success = True  # Assume success until a failure occurs
+            if set_clauses:
+                set_clauses.append("updated_at = CURRENT_TIMESTAMP")
+                values.append(task_dict['entity_id'])
                 
-                if 'records' in data and isinstance(data['records'], list):
-                    for record in data['records']:
-                        try:
-                            # Hash the password if it's not already hashed
-                            password_hash = record.get('password_hash')
-                            if not password_hash and 'password' in record:
-                                password_hash = hash_password(record['password'])
-                            
-                            # Insert user record
-                            cursor.execute(
-                                """
-                                INSERT INTO users (username, password_hash, role, email, full_name, department, created_by)
-                                VALUES (?, ?, ?, ?, ?, ?, ?)
-                                """,
-                                (
-                                    record['username'],
-                                    password_hash,
-                                    record['role'],
-                                    record.get('email'),
-                                    record.get('full_name'),
-                                    record.get('department'),
-                                    task_dict['created_by']
-                                )
-                            )
-                        except sqlite3.IntegrityError:
-                            print(f"User creation failed during bulk upload: Username {record.get('username')} already exists")
-                            # Continue with other records rather than failing the entire task
-                else:
-                    print("Bulk upload failed: No records found in data")
-                    success = False
+                # Execute update
+                cursor.execute(
+                    f"""
+                    UPDATE reference_data
+                    SET {', '.join(set_clauses)}
+                    WHERE id = ?
+                    """,
+                    values
+                )
+                success = cursor.rowcount > 0
+            else:
+                success = True  # No changes to make
+        
+        # User deletion
+        elif task_dict['task_type'] == 'delete' and task_dict['entity_type'] == 'user':
+            cursor.execute("DELETE FROM users WHERE id = ?", (task_dict['entity_id'],))
+            success = cursor.rowcount > 0
+        
+        # Reference data deletion
+        elif task_dict['task_type'] == 'delete' and task_dict['entity_type'] == 'reference_data':
+            cursor.execute("DELETE FROM reference_data WHERE id = ?", (task_dict['entity_id'],))
+            success = cursor.rowcount > 0
+        
+        # Bulk upload staged in task_records
+        elif task_dict['task_type'] == 'bulk_upload' and task_dict['record_count'] is not None:
+            result = apply_staged_upload(cursor, task_dict)
+            _record_bulk_result(cursor, task_id, result)
+            # Skipped records don't fail the task, as with single-row conflicts before
+            success = True
+        
+        # Bulk upload for users with records embedded in data_json (tasks created before task_records)
+        elif task_dict['task_type'] == 'bulk_upload' and task_dict['entity_type'] == 'user':
+            if 'records' in data and isinstance(data['records'], list):
+                records = data['records']
+                # Hash every plain password up front, in parallel and before anything is written
+                password_hashes = _hash_record_passwords(records)
+                rows = (
+                    (
+                        record.get('username'),
+                        password_hash,
+                        record.get('role'),
+                        record.get('email'),
+                        record.get('full_name'),
+                        record.get('department')
+                    )
+                    for record, password_hash in zip(records, password_hashes)
+                )
+                result = apply_bulk_records(cursor, 'user', rows, task_dict['created_by'])
+                _record_bulk_result(cursor, task_id, result)
+                # Skipped records don't fail the task, as with single-row conflicts before
+                success = True
+            else:
+                print("Bulk upload failed: No records found in data")
+                success = False
+        
+        # Bulk upload for reference data with records embedded in data_json
+        elif task_dict['task_type'] == 'bulk_upload' and task_dict['entity_type'] == 'reference_data':
+            if 'records' in data and isinstance(data['records'], list):
+                rows = (
+                    (
+                        record.get('data_type'),
+                        record.get('code'),
+                        record.get('value'),
+                        record.get('description')
+                    )
+                    for record in data['records']
+                )
+                result = apply_bulk_records(cursor, 'reference_data', rows, task_dict['created_by'])
+                _record_bulk_result(cursor, task_id, result)
+                success = True
+            else:
+                print("Bulk upload failed: No records found in data")
+                success = False
+        
+        return success
+    
+    @staticmethod
+    @_track_task_operation('approve')
+    def approve(task_id, approved_by):
+        """Approve a task and execute the related action using direct SQL operations"""
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        try:
+            # Get the task details
+            cursor.execute("SELECT * FROM tasks WHERE id = ?", (task_id,))
+            task = cursor.fetchone()
             
-            # Bulk upload for reference data
-            elif task_dict['task_type'] == 'bulk_upload' and task_dict['entity_type'] == 'reference_data':
-                # Process each record in the bulk upload
-                success = True  # Assume success until a failure occurs
-                
-                if 'records' in data and isinstance(data['records'], list):
-                    for record in data['records']:
-                        try:
-                            cursor.execute(
-                                """
-                                INSERT INTO reference_data (data_type, code, value, description, created_by)
-                                VALUES (?, ?, ?, ?, ?)
-                                """,
-                                (
-                                    record['data_type'],
-                                    record['code'],
-                                    record['value'],
-                                    record.get('description'),
-                                    task_dict['created_by']
-                                )
-                            )
-                        except sqlite3.IntegrityError:
-                            print(f"Reference data creation failed during bulk upload: {record.get('data_type')}-{record.get('code')} already exists")
-                            # Continue with other records rather than failing the entire task
-                else:
-                    print("Bulk upload failed: No records found in data")
-                    success = False
+            if not task:
+                print(f"Task approval failed: Task {task_id} not found")
+                return False
+            
+            task_dict = dict(task)
+            
+            print(f"Approving task: {task_id}, Type: {task_dict['task_type']}, Entity: {task_dict['entity_type']}")
+            
+            success = Task._execute(cursor, task_dict)
             
             # Update task status
             if success:
                 print(f"Task completed successfully, updating status to approved")
-                cursor.execute(
-                    """
-                    UPDATE tasks
-                    SET status = 'approved', approved_by = ?, approved_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                    """,
-                    (approved_by, task_id)
-                )
+                _mark_task_approved(cursor, task_id, approved_by)
                 conn.commit()
+                bump_table_version('tasks', ENTITY_TABLES.get(task_dict['entity_type'], task_dict['entity_type']))
                 return True
             else:
                 print(f"Task failed, updating status to failed")
-                cursor.execute(
-                    """
-                    UPDATE tasks
-                    SET status = 'failed', updated_at = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                    """,
-                    (task_id,)
-                )
+                _mark_task_failed(cursor, task_id)
                 conn.commit()
+                bump_table_version('tasks')
                 return False
                 
         except Exception as e:
@@ -500,15 +790,9 @@ class Task:
             
             # Update task status to failed
             try:
-                cursor.execute(
-                    """
-                    UPDATE tasks
-                    SET status = 'failed', updated_at = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                    """,
-                    (task_id,)
-                )
+                _mark_task_failed(cursor, task_id)
                 conn.commit()
+                bump_table_version('tasks')
             except Exception as update_err:
                 print(f"Error updating task status: {str(update_err)}")
             
@@ -517,6 +801,7 @@ class Task:
             conn.close()
     
     @staticmethod
+    @_track_task_operation('reject')
     def reject(task_id, rejected_by):
         """Reject a task"""
         conn = get_db_connection()
@@ -545,6 +830,7 @@ class Task:
                 (rejected_by, task_id)
             )
             conn.commit()
+            bump_table_version('tasks')
             print(f"Task {task_id} rejected successfully")
             return cursor.rowcount > 0
         except Exception as e:
@@ -554,18 +840,136 @@ class Task:
         finally:
             conn.close()
     
+    @staticmethod
+    @_track_task_operation('approve_many', _batch_outcomes)
+    def approve_many(task_ids, approved_by):
+        """Approve several tasks in one transaction, reporting each task's outcome
+        
+        Bulk uploads are queued for the background job worker instead, so their
+        rows (and any password hashing) are never applied under this
+        transaction's write lock. Each other task runs inside its own savepoint,
+        so a task that fails is rolled back and marked failed without undoing
+        the others. Returns a dict of task id -> 'approved', 'queued', 'failed',
+        'not_found' or 'not_pending'; if the transaction itself cannot be
+        completed the tasks in it are reported 'error' and left unchanged.
+        """
+        from jobs import enqueue_task_approval  # jobs imports this module
+        
+        task_ids = [int(task_id) for task_id in task_ids]
+        queued = {}  # bulk upload outcomes, committed separately by enqueue_task_approval
+        changed_tables = {'tasks'}
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        try:
+            if task_ids:
+                placeholders = ', '.join('?' for _ in task_ids)
+                cursor.execute(
+                    f"SELECT id FROM tasks WHERE id IN ({placeholders}) AND task_type = 'bulk_upload'", task_ids
+                )
+                for (task_id,) in cursor.fetchall():
+                    queued[task_id] = 'queued' if enqueue_task_approval(task_id, approved_by) is not None else 'not_pending'
+            outcomes = dict(queued)
+            
+            cursor.execute("BEGIN IMMEDIATE")
+            for task_id in task_ids:
+                if task_id in queued:
+                    continue
+                cursor.execute("SELECT * FROM tasks WHERE id = ?", (task_id,))
+                task = cursor.fetchone()
+                if not task:
+                    outcomes[task_id] = 'not_found'
+                    continue
+                if task['status'] != 'pending':
+                    outcomes[task_id] = 'not_pending'
+                    continue
+                
+                task_dict = dict(task)
+                print(f"Approving task: {task_id}, Type: {task_dict['task_type']}, Entity: {task_dict['entity_type']}")
+                cursor.execute("SAVEPOINT approve_task")
+                try:
+                    success = Task._execute(cursor, task_dict)
+                except Exception as e:
+                    print(f"Error in task approval: {str(e)}")
+                    success = False
+                
+                if success:
+                    cursor.execute("RELEASE approve_task")
+                    _mark_task_approved(cursor, task_id, approved_by)
+                    changed_tables.add(ENTITY_TABLES.get(task_dict['entity_type'], task_dict['entity_type']))
+                    outcomes[task_id] = 'approved'
+                else:
+                    cursor.execute("ROLLBACK TO approve_task")
+                    cursor.execute("RELEASE approve_task")
+                    _mark_task_failed(cursor, task_id)
+                    outcomes[task_id] = 'failed'
+            
+            conn.commit()
+            bump_table_version(*changed_tables)
+            print(f"Batch approval: {sum(outcome == 'approved' for outcome in outcomes.values())} of {len(task_ids)} tasks approved")
+            return outcomes
+        except Exception as e:
+            print(f"Error in batch task approval: {str(e)}")
+            conn.rollback()
+            return {task_id: queued.get(task_id, 'error') for task_id in task_ids}
+        finally:
+            conn.close()
+    
+    @staticmethod
+    @_track_task_operation('reject_many', _batch_outcomes)
+    def reject_many(task_ids, rejected_by):
+        """Reject several pending tasks with one UPDATE, reporting each task's outcome
+        
+        Returns a dict of task id -> 'rejected', 'not_found', 'not_pending' or,
+        if the update fails, 'error'.
+        """
+        task_ids = [int(task_id) for task_id in task_ids]
+        if not task_ids:
+            return {}
+        placeholders = ', '.join('?' for _ in task_ids)
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(f"SELECT id, status FROM tasks WHERE id IN ({placeholders})", task_ids)
+            statuses = {row['id']: row['status'] for row in cursor.fetchall()}
+            outcomes = {
+                task_id: 'not_found' if task_id not in statuses
+                else 'rejected' if statuses[task_id] == 'pending'
+                else 'not_pending'
+                for task_id in task_ids
+            }
+            
+            cursor.execute(
+                f"""
+                UPDATE tasks
+                SET status = 'rejected', approved_by = ?, approved_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                WHERE id IN ({placeholders}) AND status = 'pending'
+                """,
+                [rejected_by, *task_ids]
+            )
+            conn.commit()
+            bump_table_version('tasks')
+            print(f"Batch rejection: {cursor.rowcount} of {len(task_ids)} tasks rejected")
+            return outcomes
+        except Exception as e:
+            print(f"Error in batch task rejection: {str(e)}")
+            conn.rollback()
+            return {task_id: 'error' for task_id in task_ids}
+        finally:
+            conn.close()
+    
     @staticmethod
     def get(task_id):
-        """Get a task by ID"""
+        """Get a task by ID as a LazyTask; its data_json payload is decoded on first access"""
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        cursor.execute("SELECT * FROM tasks WHERE id = ?", (task_id,))
+        cursor.execute(f"SELECT {TASK_SUMMARY_COLUMNS} FROM tasks WHERE id = ?", (task_id,))
         task = cursor.fetchone()
         conn.close()
         
         if task:
-            task_dict = dict(task)
-            task_dict['data'] = json.loads(task_dict['data_json'])
-            return task_dict
+            return LazyTask(task)
         return None
@@ -0,0 +1,107 @@
+"""Password hashing with a configurable, tunable-cost key derivation function
+
+New hashes use PASSWORD_SCHEME. Stored hashes carry their scheme and cost
+parameters (``scheme$params...$salt$digest``), so changing the scheme or
+raising the cost only affects passwords hashed afterwards; unprefixed hex
+digests are the original unsalted SHA-256 hashes and keep verifying.
+
+This module deliberately imports nothing from the Streamlit app so that
+``hash_passwords`` can run it in spawned worker processes.
+"""
+import hashlib
+import hmac
+import math
+import multiprocessing
+import os
+import secrets
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+# Scheme for new hashes: 'sha256' (legacy, unsalted), 'pbkdf2_sha256' or 'scrypt'
+PASSWORD_SCHEME = os.environ.get('PASSWORD_SCHEME', 'sha256')
+PBKDF2_ITERATIONS = int(os.environ.get('PBKDF2_ITERATIONS', 600000))
+SCRYPT_N = int(os.environ.get('SCRYPT_N', 2 ** 14))
+SCRYPT_R = int(os.environ.get('SCRYPT_R', 8))
+SCRYPT_P = int(os.environ.get('SCRYPT_P', 1))
+SALT_BYTES = 16
+
+# Batches with fewer distinct passwords than this are hashed in-process
+PARALLEL_THRESHOLD = 32
+HASH_WORKERS = int(os.environ.get('HASH_WORKERS', os.cpu_count() or 1))
+
+
+def hash_password(password, scheme=None):
+    """Hash a password with the given scheme (PASSWORD_SCHEME by default)"""
+    scheme = scheme or PASSWORD_SCHEME
+    secret = password.encode()
+
+    if scheme == 'sha256':
+        return hashlib.sha256(secret).hexdigest()
+
+    salt = secrets.token_bytes(SALT_BYTES)
+    if scheme == 'pbkdf2_sha256':
+        digest = hashlib.pbkdf2_hmac('sha256', secret, salt, PBKDF2_ITERATIONS)
+        return f"pbkdf2_sha256${PBKDF2_ITERATIONS}${salt.hex()}${digest.hex()}"
+    if scheme == 'scrypt':
+        digest = hashlib.scrypt(
+            secret, salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P, maxmem=_scrypt_maxmem(SCRYPT_N, SCRYPT_R)
+        )
+        return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${salt.hex()}${digest.hex()}"
+
+    raise ValueError(f"Unknown password scheme: {scheme}")
+
+
+def _scrypt_maxmem(n, r):
+    """Memory limit large enough for the given scrypt cost"""
+    return 128 * r * (n + 2) + 1024 * 1024
+
+
+def verify_password(password, stored_hash):
+    """Check a password against a stored hash of any supported scheme"""
+    if not stored_hash:
+        return False
+    secret = password.encode()
+    parts = stored_hash.split('$')
+
+    if len(parts) == 1:
+        expected = hashlib.sha256(secret).hexdigest()
+    elif parts[0] == 'pbkdf2_sha256' and len(parts) == 4:
+        iterations, salt, _ = parts[1:]
+        expected = hashlib.pbkdf2_hmac('sha256', secret, bytes.fromhex(salt), int(iterations)).hex()
+        expected = f"pbkdf2_sha256${iterations}${salt}${expected}"
+    elif parts[0] == 'scrypt' and len(parts) == 6:
+        n, r, p, salt, _ = parts[1:]
+        n, r, p = int(n), int(r), int(p)
+        expected = hashlib.scrypt(
+            secret, salt=bytes.fromhex(salt), n=n, r=r, p=p, maxmem=_scrypt_maxmem(n, r)
+        ).hex()
+        expected = f"scrypt${n}${r}${p}${salt}${expected}"
+    else:
+        return False
+
+    return hmac.compare_digest(expected, stored_hash)
+
+
+def hash_passwords(passwords, scheme=None, max_workers=None):
+    """Hash a batch of passwords, returning hashes in the same order
+
+    Each distinct password is hashed once and its hash reused for repeats in
+    the batch; None entries map to None. Large batches under a salted KDF are
+    spread over a pool of worker processes.
+    """
+    scheme = scheme or PASSWORD_SCHEME
+    passwords = list(passwords)
+    distinct = list(dict.fromkeys(password for password in passwords if password is not None))
+    workers = min(max_workers or HASH_WORKERS, len(distinct))
+
+    if scheme == 'sha256' or workers < 2 or len(distinct) < PARALLEL_THRESHOLD:
+        hashes = [hash_password(password, scheme) for password in distinct]
+    else:
+        # Spawn rather than fork: the app process runs server and script threads
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            chunksize = max(1, math.ceil(len(distinct) / (workers * 4)))
+            hashes = list(pool.map(partial(hash_password, scheme=scheme), distinct, chunksize=chunksize))
+
+    by_password = dict(zip(distinct, hashes))
+    return [by_password.get(password) for password in passwords]
@@ -0,0 +1,86 @@
+"""Serialization and transparent compression of task payloads (tasks.data_json)
+
+Payloads smaller than COMPRESS_THRESHOLD bytes are stored as plain JSON text,
+exactly as before, so SQLite's JSON functions keep working on them. Larger
+payloads are compressed and stored as a BLOB that starts with a format marker
+naming the codec. Rows written before compression existed are plain text and
+decode unchanged.
+
+orjson or msgspec is used for encoding and decoding when installed, zstd for
+compression when the zstandard package is installed; otherwise the standard
+library's json and zlib.
+"""
+import json
+import os
+import zlib
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to msgspec or the stdlib
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional; fall back to zlib
+    zstandard = None
+
+COMPRESS_THRESHOLD = int(os.environ.get('PAYLOAD_COMPRESS_THRESHOLD', 4096))
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 10
+
+# Markers at the start of a compressed payload BLOB
+ZLIB_MARKER = b'\x00zlib:'
+ZSTD_MARKER = b'\x00zstd:'
+
+
+def _encode(data):
+    """Serialize data to UTF-8 JSON bytes with the fastest available encoder"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    if msgspec is not None:
+        return msgspec.json.encode(data)
+    return json.dumps(data).encode()
+
+
+def _decode(raw):
+    """Parse JSON text or bytes with the fastest available decoder"""
+    try:
+        if orjson is not None:
+            return orjson.loads(raw)
+        if msgspec is not None:
+            return msgspec.json.decode(raw)
+    except (ValueError, getattr(msgspec, 'DecodeError', ValueError)):
+        pass  # Older payloads may hold NaN, which only the stdlib parser accepts
+    return json.loads(raw)
+
+
+def dumps(data, threshold=None):
+    """Encode a payload for tasks.data_json: JSON text, or a compressed BLOB if large"""
+    raw = _encode(data)
+    if len(raw) < (COMPRESS_THRESHOLD if threshold is None else threshold):
+        return raw.decode()
+    if zstandard is not None:
+        return ZSTD_MARKER + zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    return ZLIB_MARKER + zlib.compress(raw, ZLIB_LEVEL)
+
+
+def loads(value):
+    """Decode a tasks.data_json value written by dumps or by older plain-JSON code"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return _decode(value)
+    value = bytes(value)
+    if value.startswith(ZLIB_MARKER):
+        return _decode(zlib.decompress(value[len(ZLIB_MARKER):]))
+    if value.startswith(ZSTD_MARKER):
+        if zstandard is None:
+            raise RuntimeError("Task payload is zstd-compressed but the zstandard package is not installed")
+        return _decode(zstandard.ZstdDecompressor().decompress(value[len(ZSTD_MARKER):]))
+    return _decode(value)
+
@@ -0,0 +1,257 @@
+"""Deterministic synthetic data for benchmarking the data layer
+
+``populate`` fills a database with users, reference data spread across a
+number of data types, and a history of tasks of every type, including bulk
+uploads whose records are staged in task_records. The same counts and seed
+always produce the same rows, so timings taken on different releases compare
+like with like. ``write_upload_file`` produces CSV or Excel upload files for
+the ingestion benchmarks.
+"""
+import csv
+import random
+from datetime import datetime, timedelta
+
+import database
+import payloads
+from cache import bump_table_version
+from passwords import hash_password
+
+# Named dataset sizes used by manage.py and the benchmark suite
+SCALES = {
+    '1k': {'users': 1000, 'reference_rows': 1000, 'data_types': 10, 'tasks': 1000, 'bulk_tasks': 4, 'bulk_records': 1000},
+    '100k': {'users': 100000, 'reference_rows': 100000, 'data_types': 50, 'tasks': 100000, 'bulk_tasks': 4, 'bulk_records': 100000},
+    '1m': {'users': 1000000, 'reference_rows': 1000000, 'data_types': 200, 'tasks': 1000000, 'bulk_tasks': 4, 'bulk_records': 1000000},
+}
+
+INSERT_BATCH_SIZE = 10000
+ROLES = ('super_admin', 'data_analyst')
+DEPARTMENTS = ('Finance', 'IT', 'Operations', 'Risk', 'Sales', 'Marketing', 'Compliance', 'Business Intelligence')
+TASK_TYPES = ('create', 'update', 'delete')
+# Share of generated (non-bulk) tasks in each status
+TASK_STATUS_WEIGHTS = (('approved', 70), ('pending', 20), ('rejected', 10))
+# Generated rows are dated across the year before this instant
+EPOCH = datetime(2024, 1, 1)
+PASSWORD = 'password'
+
+
+def _batched(rows, size=INSERT_BATCH_SIZE):
+    """Group an iterable of rows into lists of at most size rows"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _timestamp(rng):
+    """A random timestamp in the year before EPOCH, in SQLite's text format"""
+    return (EPOCH - timedelta(seconds=rng.randrange(365 * 24 * 3600))).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def data_type_name(index):
+    """Name of the index-th synthetic data type"""
+    return f"Type{index:04d}"
+
+
+def user_record(index, rng, prefix='user'):
+    """Fields of the index-th synthetic user"""
+    username = f"{prefix}{index:07d}"
+    return {
+        'username': username,
+        'role': ROLES[rng.random() < 0.9],
+        'email': f"{username}@example.com",
+        'full_name': f"Synthetic User {index}",
+        'department': rng.choice(DEPARTMENTS),
+    }
+
+
+def reference_record(index, data_types, rng, prefix='C'):
+    """Fields of the index-th synthetic reference data row"""
+    code = f"{prefix}{index:07d}"
+    return {
+        'data_type': data_type_name(index % data_types),
+        'code': code,
+        'value': f"Value {code} {rng.randrange(1000000):06d}",
+        'description': f"Synthetic reference data {code}",
+    }
+
+
+def _insert_users(cursor, count, rng, password_hash):
+    """Insert count users with a shared password hash"""
+    sql = (
+        "INSERT INTO users (username, password_hash, role, email, full_name, department, created_by, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, 'synthetic', ?)"
+    )
+    rows = (
+        (record['username'], password_hash, record['role'], record['email'], record['full_name'], record['department'], _timestamp(rng))
+        for record in (user_record(index, rng) for index in range(count))
+    )
+    for batch in _batched(rows):
+        cursor.executemany(sql, batch)
+
+
+def _insert_reference_data(cursor, count, data_types, rng):
+    """Insert count reference data rows spread evenly across data_types types"""
+    sql = (
+        "INSERT INTO reference_data (data_type, code, value, description, status, created_by, created_at) "
+        "VALUES (?, ?, ?, ?, ?, 'synthetic', ?)"
+    )
+    rows = (
+        (
+            record['data_type'], record['code'], record['value'], record['description'],
+            'inactive' if rng.random() < 0.05 else 'active', _timestamp(rng)
+        )
+        for record in (reference_record(index, data_types, rng) for index in range(count))
+    )
+    for batch in _batched(rows):
+        cursor.executemany(sql, batch)
+
+
+def _task_row(index, users, reference_rows, data_types, rng, password_hash):
+    """One synthetic single-entity task as an INSERT parameter tuple"""
+    task_type = rng.choice(TASK_TYPES)
+    statuses, weights = zip(*TASK_STATUS_WEIGHTS)
+    status = rng.choices(statuses, weights)[0]
+    created_at = _timestamp(rng)
+    approved_by, approved_at = (None, None) if status == 'pending' else ('admin', created_at)
+
+    if rng.random() < 0.5:
+        entity_type = 'user'
+        entity_id = rng.randrange(1, users + 1) if task_type != 'create' and users else None
+        if task_type == 'create':
+            data = dict(user_record(index, rng, prefix='newuser'), password_hash=password_hash)
+        elif task_type == 'update':
+            data = {'department': rng.choice(DEPARTMENTS), 'email': f"changed{index}@example.com"}
+        else:
+            data = {}
+    else:
+        entity_type = 'reference_data'
+        entity_id = rng.randrange(1, reference_rows + 1) if task_type != 'create' and reference_rows else None
+        if task_type == 'create':
+            data = reference_record(index, data_types, rng, prefix='N')
+        elif task_type == 'update':
+            data = {'value': f"Updated value {index}", 'description': f"Updated by task {index}", 'status': 'active'}
+        else:
+            data = {}
+
+    return (task_type, entity_type, entity_id, payloads.dumps(data), status, 'analyst', created_at, approved_by, approved_at)
+
+
+def _insert_tasks(cursor, count, users, reference_rows, data_types, rng, password_hash):
+    """Insert count single-entity tasks across every task type, entity type and status"""
+    sql = (
+        "INSERT INTO tasks (task_type, entity_type, entity_id, data_json, status, created_by, created_at, approved_by, approved_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    )
+    rows = (_task_row(index, users, reference_rows, data_types, rng, password_hash) for index in range(count))
+    for batch in _batched(rows):
+        cursor.executemany(sql, batch)
+
+
+def stage_bulk_upload(cursor, entity_type, record_count, data_types, rng, prefix, status='pending'):
+    """Insert a bulk upload task with record_count new records staged in task_records; returns the task id"""
+    file_name = f"{prefix}.csv"
+    cursor.execute(
+        """
+        INSERT INTO tasks (task_type, entity_type, data_json, status, created_by, created_at, record_count)
+        VALUES ('bulk_upload', ?, ?, ?, 'analyst', ?, ?)
+        """,
+        (entity_type, payloads.dumps({'file_name': file_name, 'record_count': record_count}), status, _timestamp(rng), record_count)
+    )
+    task_id = cursor.lastrowid
+
+    columns = database.TASK_RECORD_COLUMNS[entity_type]
+    sql = (
+        f"INSERT INTO task_records (task_id, row_num, {', '.join(columns)}) "
+        f"VALUES (?, ?, {', '.join('?' for _ in columns)})"
+    )
+    if entity_type == 'user':
+        records = (dict(user_record(index, rng, prefix=prefix), password=PASSWORD) for index in range(record_count))
+    else:
+        records = (reference_record(index, data_types, rng, prefix=prefix) for index in range(record_count))
+    rows = (
+        (task_id, row_num, *(record.get(column) for column in columns))
+        for row_num, record in enumerate(records, start=1)
+    )
+    for batch in _batched(rows):
+        cursor.executemany(sql, batch)
+    return task_id
+
+
+def populate(conn, users=0, reference_rows=0, data_types=1, tasks=0, bulk_tasks=0, bulk_records=0, seed=0):
+    """Fill a migrated database with synthetic rows and commit
+
+    Bulk upload tasks alternate between user and reference data uploads and
+    are left pending with ``bulk_records`` staged records each. Returns the
+    counts that were inserted.
+    """
+    rng = random.Random(seed)
+    password_hash = hash_password(PASSWORD)
+    cursor = conn.cursor()
+    try:
+        _insert_users(cursor, users, rng, password_hash)
+        _insert_reference_data(cursor, reference_rows, data_types, rng)
+        _insert_tasks(cursor, tasks, users, reference_rows, data_types, rng, password_hash)
+        for index in range(bulk_tasks):
+            entity_type = ('user', 'reference_data')[index % 2]
+            stage_bulk_upload(cursor, entity_type, bulk_records, data_types, rng, prefix=f"bulk{index}_")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    cursor.execute("ANALYZE")
+    bump_table_version('users', 'reference_data', 'tasks')
+    return {
+        'users': users,
+        'reference_rows': reference_rows,
+        'tasks': tasks,
+        'bulk_tasks': bulk_tasks,
+        'bulk_records': bulk_tasks * bulk_records,
+    }
+
+
+def generate(db_path, scale='1k', seed=0, **counts):
+    """Create a fresh database at db_path with a named scale, overridden by any counts given"""
+    database.close_all_connections()
+    database.DB_PATH = db_path
+    database._schema_ready = False  # the new file still needs its migrations
+    database.initialize_database()
+    conn = database.get_db_connection()
+    try:
+        return populate(conn, seed=seed, **dict(SCALES[scale], **counts))
+    finally:
+        conn.close()
+
+
+def upload_rows(entity_type, count, seed=0, data_types=10, prefix='up'):
+    """Field dicts for an upload file of count new records"""
+    rng = random.Random(seed)
+    if entity_type == 'user':
+        return (dict(user_record(index, rng, prefix=prefix), password=PASSWORD) for index in range(count))
+    return (reference_record(index, data_types, rng, prefix=prefix) for index in range(count))
+
+
+def write_upload_file(path, entity_type, count, seed=0):
+    """Write an upload file of count new records; the format follows the .csv or .xlsx suffix"""
+    columns = [column for column in database.TASK_RECORD_COLUMNS[entity_type] if column != 'password_hash']
+    rows = ([record.get(column) for column in columns] for record in upload_rows(entity_type, count, seed))
+
+    if str(path).endswith('.xlsx'):
+        from openpyxl import Workbook
+
+        # Write-only mode streams rows to disk instead of building the sheet in memory
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(columns)
+        for row in rows:
+            sheet.append(row)
+        workbook.save(path)
+    else:
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            writer.writerows(rows)
+    return path
@@ -0,0 +1,286 @@
+"""SQL statement tracing and the slow-query log
+
+Every pooled connection times its ``execute``/``executemany`` calls through
+TracedCursor unless SQL_TRACE=0. Each timed call is tagged with the page being
+rendered and the repository function that issued it, and added to:
+
+- process-wide aggregates per (statement, page, caller), which the
+  Diagnostics page lists by total time;
+- the current rerun's totals, started by ``begin_rerun`` at the top of each
+  page script;
+- the rotating slow-query log, when it took longer than SLOW_QUERY_MS;
+- the db_lock_wait_seconds metric, for BEGIN IMMEDIATE/EXCLUSIVE.
+
+Times cover statement execution; rows a SELECT fetches later are not included.
+
+With SQL_TRACE_STATEMENTS=1, connections also count the statements SQLite
+actually runs (trigger bodies included) through ``set_trace_callback``. That
+callback fires for every trigger statement on every row, which roughly
+doubles the cost of bulk writes, so it is off by default.
+"""
+import logging
+import logging.handlers
+import metrics
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+
+TRACE_ENABLED = os.environ.get('SQL_TRACE', '1') != '0'
+COUNT_STATEMENTS = TRACE_ENABLED and os.environ.get('SQL_TRACE_STATEMENTS', '0') == '1'
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 200))
+SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG', 'slow_queries.log')
+SLOW_QUERY_LOG_BYTES = 10 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 5
+# Distinct (statement, page, caller) keys kept before new ones are folded together
+MAX_TRACKED_STATEMENTS = 2000
+RECENT_RERUNS = 100
+# Statements that wait for SQLite's write lock before doing anything else
+LOCKING_STATEMENTS = ('BEGIN IMMEDIATE', 'BEGIN EXCLUSIVE')
+
+LOCK_WAIT_SECONDS = metrics.histogram(
+    'db_lock_wait_seconds', 'Time spent waiting for the write lock in BEGIN IMMEDIATE/EXCLUSIVE'
+)
+LOCK_TIMEOUTS = metrics.counter('db_locked_errors_total', 'Statements that failed with "database is locked"')
+
+_ROOT = os.path.dirname(os.path.abspath(__file__))
+# Frames skipped when looking for the function that issued a statement
+_SKIPPED_MODULES = {'tracing', 'cache'}
+_SKIPPED_FUNCTIONS = {'_read_sql', '<lambda>', '<genexpr>'}
+
+_lock = threading.Lock()
+_local = threading.local()
+_statements = {}  # (sql, page, caller) -> [calls, total seconds, max seconds]
+_totals = {'calls': 0, 'statements': 0, 'seconds': 0.0, 'slow': 0}
+_recent_reruns = deque(maxlen=RECENT_RERUNS)
+_slow_logger = None
+
+
+class RerunTrace:
+    """SQL totals for one rerun of a page script"""
+
+    def __init__(self, page, user=None):
+        self.page = page
+        self.user = user
+        self.started_at = time.time()
+        self.calls = 0
+        self.statements = 0
+        self.seconds = 0.0
+        self.slowest_sql = None
+        self.slowest_seconds = 0.0
+        self.finished_at = None
+
+    def finish(self):
+        """Mark the rerun as rendered; returns its duration in seconds"""
+        self.finished_at = time.time()
+        return self.finished_at - self.started_at
+
+    def as_dict(self):
+        return {
+            'page': self.page,
+            'user': self.user,
+            'started_at': self.started_at,
+            'render_ms': (self.finished_at - self.started_at) * 1000 if self.finished_at else None,
+            'calls': self.calls,
+            'statements': self.statements,
+            'total_ms': self.seconds * 1000,
+            'slowest_ms': self.slowest_seconds * 1000,
+            'slowest_sql': self.slowest_sql,
+        }
+
+
+def begin_rerun(page, user=None):
+    """Start collecting SQL totals for a page rerun on this thread; returns its RerunTrace"""
+    rerun = RerunTrace(page, user)
+    _local.rerun = rerun
+    with _lock:
+        _recent_reruns.append(rerun)
+    return rerun
+
+
+def current_rerun():
+    """The RerunTrace collecting this thread's statements, or None outside a page rerun"""
+    return getattr(_local, 'rerun', None)
+
+
+@lru_cache(maxsize=1024)
+def _normalize(sql):
+    """Collapse whitespace so the same statement always aggregates under one key"""
+    return ' '.join(sql.split())
+
+
+def _caller():
+    """module.function of the innermost repository frame that issued the current statement"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        code = frame.f_code
+        filename = code.co_filename
+        if filename.startswith(_ROOT) and 'site-packages' not in filename:
+            module = frame.f_globals.get('__name__', '')
+            if module not in _SKIPPED_MODULES and code.co_name not in _SKIPPED_FUNCTIONS:
+                if module == '__main__':
+                    # Streamlit runs page scripts as __main__
+                    module = os.path.splitext(os.path.basename(filename))[0]
+                return f"{module}.{code.co_name}"
+        frame = frame.f_back
+    return 'unknown'
+
+
+def _slow_query_logger():
+    """Logger writing to the rotating slow-query log, created on first use"""
+    global _slow_logger
+    if _slow_logger is None:
+        logger = logging.getLogger('data_governance.slow_queries')
+        logger.setLevel(logging.WARNING)
+        logger.propagate = False
+        handler = logging.handlers.RotatingFileHandler(
+            SLOW_QUERY_LOG, maxBytes=SLOW_QUERY_LOG_BYTES, backupCount=SLOW_QUERY_LOG_BACKUPS, delay=True
+        )
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        logger.addHandler(handler)
+        _slow_logger = logger
+    return _slow_logger
+
+
+def record(sql, seconds, rows=1):
+    """Add one timed execute call to the aggregates, the current rerun and, if slow, the slow-query log"""
+    sql = _normalize(sql)
+    if sql.upper().startswith(LOCKING_STATEMENTS):
+        LOCK_WAIT_SECONDS.observe(seconds)
+    rerun = current_rerun()
+    page = rerun.page if rerun is not None else threading.current_thread().name
+    caller = _caller()
+
+    with _lock:
+        key = (sql, page, caller)
+        entry = _statements.get(key)
+        if entry is None:
+            if len(_statements) >= MAX_TRACKED_STATEMENTS:
+                key = ('(other statements)', page, caller)
+                entry = _statements.get(key)
+            if entry is None:
+                entry = _statements[key] = [0, 0.0, 0.0]
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+        _totals['calls'] += 1
+        _totals['seconds'] += seconds
+
+    if rerun is not None:
+        rerun.calls += 1
+        rerun.seconds += seconds
+        if seconds > rerun.slowest_seconds:
+            rerun.slowest_seconds = seconds
+            rerun.slowest_sql = sql
+
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        with _lock:
+            _totals['slow'] += 1
+        _slow_query_logger().warning(
+            "%.1f ms | page=%s | caller=%s | rows=%d | %s", seconds * 1000, page, caller, rows, sql
+        )
+
+
+def count_statement(statement):
+    """sqlite3 trace callback: count each statement SQLite runs, including trigger bodies"""
+    with _lock:
+        _totals['statements'] += 1
+    rerun = current_rerun()
+    if rerun is not None:
+        rerun.statements += 1
+
+
+def _count_lock_timeout(error):
+    """Count an OperationalError caused by the busy timeout running out"""
+    if 'locked' in str(error):
+        LOCK_TIMEOUTS.inc()
+
+
+class TracedCursor(sqlite3.Cursor):
+    """Cursor that times each execute call and records it with tracing.record"""
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        except sqlite3.OperationalError as e:
+            _count_lock_timeout(e)
+            raise
+        finally:
+            record(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        except sqlite3.OperationalError as e:
+            _count_lock_timeout(e)
+            raise
+        finally:
+            record(sql, time.perf_counter() - started, max(self.rowcount, 0))
+
+    def executescript(self, sql_script):
+        started = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            record(sql_script, time.perf_counter() - started)
+
+
+def install(conn):
+    """Count the statements a new connection runs, if COUNT_STATEMENTS (its cursors are TracedCursor via the pool)"""
+    if COUNT_STATEMENTS:
+        conn.set_trace_callback(count_statement)
+
+
+def totals():
+    """Process-wide counts: execute calls, statements run, seconds spent and slow calls"""
+    with _lock:
+        return dict(_totals)
+
+
+def top_statements(limit=50, sort='total_ms'):
+    """Aggregated statements as a list of dicts, largest ``sort`` value first"""
+    with _lock:
+        rows = [
+            {
+                'sql': sql,
+                'page': page,
+                'caller': caller,
+                'calls': calls,
+                'total_ms': seconds * 1000,
+                'mean_ms': seconds * 1000 / calls,
+                'max_ms': max_seconds * 1000,
+            }
+            for (sql, page, caller), (calls, seconds, max_seconds) in _statements.items()
+        ]
+    rows.sort(key=lambda row: row[sort], reverse=True)
+    return rows[:limit]
+
+
+def recent_reruns():
+    """The latest page reruns, newest first, as dicts"""
+    with _lock:
+        reruns = list(_recent_reruns)
+    return [rerun.as_dict() for rerun in reversed(reruns)]
+
+
+def reset():
+    """Clear the aggregates and recent reruns (the slow-query log is kept)"""
+    with _lock:
+        _statements.clear()
+        _recent_reruns.clear()
+        for key in _totals:
+            _totals[key] = 0
+        _totals['seconds'] = 0.0
+
+
+def read_slow_query_log(lines=200):
+    """The last lines of the current slow-query log file, oldest first"""
+    if not os.path.exists(SLOW_QUERY_LOG):
+        return []
+    with open(SLOW_QUERY_LOG, encoding='utf-8', errors='replace') as f:
+        return list(deque(f, maxlen=lines))
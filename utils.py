@@ -2,7 +2,28 @@ import streamlit as st
 import pandas as pd
 import io
 import json
-from database import get_db_connection
+import metrics
+import shlex
+import tempfile
+import tracing
+from database import get_db_connection, get_reference_data, get_users
+from cache import cached
+from export import EXPORT_FORMATS, ExportTooLarge, available_formats, export_file_name, export_table
+from jobs import get_task_job
+
+# Seconds between refreshes of a running job's progress
+JOB_POLL_SECONDS = 2
+
+# Pickers over more options than this get a search box and paged options
+PICKER_SEARCH_THRESHOLD = 2000
+PICKER_PAGE_SIZE = 200
+
+# Streamlit holds a download in memory, so larger exports are left to manage.py
+MAX_DOWNLOAD_ROWS = 100000
+# manage.py export options for the list filters
+EXPORT_FILTER_OPTIONS = {'data_type': '--type', 'role': '--role', 'status': '--status', 'search': '--search'}
+
+PAGE_RENDER_SECONDS = metrics.histogram('page_render_seconds', 'Wall time of completed page reruns', ('page',))
 
 def get_user_role():
     """Get the role of the current user"""
@@ -10,6 +31,19 @@ def get_user_role():
         return st.session_state.get('role', None)
     return None
 
+def begin_page_trace(page):
+    """Start collecting this rerun's SQL totals under a page name (see tracing.py)"""
+    return tracing.begin_rerun(page, st.session_state.get('username'))
+
+def end_page_trace():
+    """Record the render time of a rerun that reached the end of its page script
+
+    Reruns cut short by st.stop() or st.rerun() are not counted.
+    """
+    rerun = tracing.current_rerun()
+    if rerun is not None and rerun.finished_at is None:
+        PAGE_RENDER_SECONDS.observe(rerun.finish(), page=rerun.page)
+
 def can_manage_users():
     """Check if the current user can manage users"""
     role = get_user_role()
@@ -35,28 +69,185 @@ def can_upload_bulk_data():
     role = get_user_role()
     return role in ['super_admin', 'data_analyst']
 
-def get_data_types():
-    """Get distinct data types from reference data"""
+def _load_data_types():
+    """Read the data types in use from the trigger-maintained counters, without scanning reference data"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    cursor.execute("SELECT DISTINCT data_type FROM reference_data")
+    cursor.execute("SELECT key FROM stats_counters WHERE scope = 'reference_data.data_type' AND count > 0 ORDER BY key")
     data_types = [row[0] for row in cursor.fetchall()]
     
     conn.close()
     return data_types
 
-def format_task_description(task):
-    """Format task description for display"""
-    if task['task_type'] == 'create':
-        action = 'Create new'
-    elif task['task_type'] == 'update':
-        action = 'Update'
-    elif task['task_type'] == 'delete':
-        action = 'Delete'
+def get_data_types():
+    """Get distinct data types from reference data (cached until the table changes)"""
+    # Callers get the shared list, so hand out a copy they are free to extend
+    return list(cached(('reference_data',), ('get_data_types',), _load_data_types))
+
+def get_page_cursor(key, filters):
+    """Get the keyset cursor for the page a paginated list is showing
+
+    The page history lives in session state under ``key`` and starts over at the
+    first page whenever ``filters`` change.
+    """
+    state_key = f"{key}_page_state"
+    state = st.session_state.get(state_key)
+    if state is None or state['filters'] != filters:
+        state = {'filters': dict(filters), 'cursors': [None]}
+        st.session_state[state_key] = state
+    return state['cursors'][-1]
+
+def render_page_controls(key, next_cursor):
+    """Render Previous/Next buttons for a paginated list"""
+    state = st.session_state[f"{key}_page_state"]
+    page_number = len(state['cursors'])
+    
+    col1, col2, col3 = st.columns([1, 4, 1])
+    with col1:
+        if st.button("Previous", key=f"{key}_previous_page", disabled=page_number == 1):
+            state['cursors'].pop()
+            st.rerun()
+    with col2:
+        st.caption(f"Page {page_number}")
+    with col3:
+        if st.button("Next", key=f"{key}_next_page", disabled=next_cursor is None):
+            state['cursors'].append(next_cursor)
+            st.rerun()
+
+def render_export(table, filters, key, statuses=None):
+    """Render an export of every row of a list table matching filters, not just the page shown
+
+    ``statuses`` adds a status filter to the export. Rows are streamed to a
+    temporary file in chunks, and the finished file is read back to be served.
+    Exports of more than MAX_DOWNLOAD_ROWS rows are refused with the
+    equivalent manage.py command instead.
+    """
+    with st.expander("Export"):
+        filters = dict(filters)
+        col1, col2 = st.columns(2)
+        with col1:
+            file_format = st.selectbox(
+                "Format",
+                options=available_formats(),
+                format_func=lambda x: EXPORT_FORMATS[x]['label'],
+                key=f"{key}_export_format"
+            )
+        if statuses:
+            with col2:
+                status = st.selectbox("Status", options=["All"] + list(statuses), key=f"{key}_export_status")
+            filters['status'] = status if status != "All" else None
+        
+        if st.button("Prepare Export", key=f"{key}_prepare_export"):
+            with tempfile.TemporaryFile() as export_file:
+                try:
+                    with st.spinner("Exporting..."):
+                        rows = export_table(table, filters, file_format, export_file, max_rows=MAX_DOWNLOAD_ROWS)
+                except ExportTooLarge as e:
+                    options = "".join(
+                        f" {EXPORT_FILTER_OPTIONS[name]} {shlex.quote(str(value))}"
+                        for name, value in filters.items() if value
+                    )
+                    st.warning(f"{str(e)}, more than can be downloaded here. Export them from the command line instead:")
+                    st.code(f"python manage.py export {table} {export_file_name(table, file_format)}{options}", language="bash")
+                    return
+                except ValueError as e:
+                    st.error(f"Export failed: {str(e)}")
+                    return
+                export_file.seek(0)
+                st.download_button(
+                    label=f"Download {rows:,} Rows",
+                    data=export_file.read(),
+                    file_name=export_file_name(table, file_format),
+                    mime=EXPORT_FORMATS[file_format]['mime'],
+                    key=f"{key}_download_export"
+                )
+
+def build_label_map(ids, labels):
+    """Map ids to display labels given two aligned columns, in one pass"""
+    return dict(zip(ids.tolist(), labels.tolist()))
+
+def reference_data_labels(df):
+    """Selectbox labels for reference data rows: 'code - value (ID: id)'"""
+    labels = df['code'].astype(str) + ' - ' + df['value'].astype(str) + ' (ID: ' + df['id'].astype(str) + ')'
+    return build_label_map(df['id'], labels)
+
+def user_labels(df):
+    """Selectbox labels for user rows: 'username (ID: id)'"""
+    labels = df['username'].astype(str) + ' (ID: ' + df['id'].astype(str) + ')'
+    return build_label_map(df['id'], labels)
+
+def get_reference_data_labels():
+    """Labels for every reference data row (cached until the table changes)"""
+    return cached(('reference_data',), ('reference_data_labels',), lambda: reference_data_labels(get_reference_data()))
+
+def get_user_labels():
+    """Labels for every user (cached until the users table changes)"""
+    return cached(('users',), ('user_labels',), lambda: user_labels(get_users()))
+
+def render_picker(label, labels, key):
+    """Selectbox over the ids in ``labels`` (id -> display label); returns the chosen id
+
+    Up to PICKER_SEARCH_THRESHOLD options are shown in one selectbox. Larger
+    tables get a search box over the labels and show the matches a page of
+    PICKER_PAGE_SIZE options at a time, so the browser never receives them all.
+    """
+    if len(labels) <= PICKER_SEARCH_THRESHOLD:
+        return st.selectbox(label, options=list(labels), format_func=labels.__getitem__, key=key)
+    
+    term = st.text_input(f"Search {len(labels):,} options", key=f"{key}_search").strip().lower()
+    if term:
+        matches = [item_id for item_id, item_label in labels.items() if term in item_label.lower()]
     else:
-        action = task['task_type']
+        matches = list(labels)
+    if not matches:
+        st.info("No matches")
+        return None
+    
+    page_count = (len(matches) - 1) // PICKER_PAGE_SIZE + 1
+    page = 1
+    if page_count > 1:
+        page = st.number_input(
+            f"Page (of {page_count:,})", min_value=1, max_value=page_count, value=1, step=1, key=f"{key}_page_{term}"
+        )
+    start = (page - 1) * PICKER_PAGE_SIZE
+    options = matches[start:start + PICKER_PAGE_SIZE]
+    st.caption(f"Showing {start + 1:,}-{start + len(options):,} of {len(matches):,} matches")
+    return st.selectbox(label, options=options, format_func=labels.__getitem__, key=key)
+
+def render_job_progress(task_id):
+    """Show a task's background job progress, polling until it finishes and then refreshing the page"""
+    @st.fragment(run_every=JOB_POLL_SECONDS)
+    def job_progress():
+        job = get_task_job(task_id)
+        if job is None:
+            return
+        if job['status'] in ('queued', 'running'):
+            done = job['progress_done']
+            total = job['progress_total']
+            if total:
+                st.progress(min(done / total, 1.0), text=f"{job['status'].capitalize()}: {done:,} of {total:,} records applied")
+            else:
+                st.progress(0.0, text=f"{job['status'].capitalize()}...")
+        elif not st.session_state.get(f"job_{job['id']}_reloaded"):
+            # The task's status has changed too; reload the page once to show it
+            st.session_state[f"job_{job['id']}_reloaded"] = True
+            st.rerun()
+        else:
+            st.warning(f"Job {job['status']}: {job['message'] or 'no details'}")
     
+    job_progress()
+
+# Verbs used in task descriptions; other task types are shown as they are
+TASK_ACTIONS = {
+    'create': 'Create new',
+    'update': 'Update',
+    'delete': 'Delete',
+}
+
+def format_task_description(task):
+    """Format task description for display"""
+    action = TASK_ACTIONS.get(task['task_type'], task['task_type'])
     entity = task['entity_type'].replace('_', ' ').title()
     
     if task['entity_id']:
@@ -64,6 +255,22 @@ def format_task_description(task):
     else:
         return f"{action} {entity}"
 
+def format_task_descriptions(tasks_df):
+    """Column-wise format_task_description for a frame of tasks; returns a Series
+
+    The action and entity words are computed once per distinct task and entity
+    type through categorical mapping, then joined by string concatenation.
+    """
+    actions = tasks_df['task_type'].astype('category').map(lambda task_type: TASK_ACTIONS.get(task_type, task_type))
+    entities = tasks_df['entity_type'].astype('category').map(lambda entity_type: entity_type.replace('_', ' ').title())
+    descriptions = actions.astype(str) + ' ' + entities.astype(str)
+    
+    # entity_id is float when the page mixes new and existing entities; show it as an integer
+    entity_ids = pd.to_numeric(tasks_df['entity_id'], errors='coerce')
+    has_id = entity_ids.notna() & (entity_ids != 0)
+    with_id = descriptions + ' (ID: ' + entity_ids.fillna(0).astype('int64').astype(str) + ')'
+    return with_id.where(has_id, descriptions)
+
 def parse_excel_upload(uploaded_file, sheet_name=None):
     """Parse an uploaded Excel file"""
     try:
@@ -83,26 +290,29 @@ def parse_csv_upload(uploaded_file):
     except Exception as e:
         return None, str(e)
 
+def _read_stats_counters(cursor, *scopes):
+    """Read the non-zero trigger-maintained counters for the given scopes"""
+    placeholders = ', '.join('?' for _ in scopes)
+    cursor.execute(
+        f"SELECT scope, key, count FROM stats_counters WHERE scope IN ({placeholders}) AND count > 0",
+        scopes
+    )
+    counters = {scope: {} for scope in scopes}
+    for scope, key, count in cursor.fetchall():
+        counters[scope][key] = count
+    return counters
+
 def get_user_stats():
     """Get user statistics"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    cursor.execute("SELECT COUNT(*) FROM users")
-    user_count = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT DISTINCT role FROM users")
-    roles = [row[0] for row in cursor.fetchall()]
-    
-    role_counts = {}
-    for role in roles:
-        cursor.execute("SELECT COUNT(*) FROM users WHERE role = ?", (role,))
-        role_counts[role] = cursor.fetchone()[0]
+    role_counts = _read_stats_counters(cursor, 'users.role')['users.role']
     
     conn.close()
     
     return {
-        "total_users": user_count,
+        "total_users": sum(role_counts.values()),
         "role_counts": role_counts
     }
 
@@ -111,21 +321,12 @@ def get_reference_data_stats():
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    cursor.execute("SELECT COUNT(*) FROM reference_data")
-    data_count = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT DISTINCT data_type FROM reference_data")
-    data_types = [row[0] for row in cursor.fetchall()]
-    
-    type_counts = {}
-    for data_type in data_types:
-        cursor.execute("SELECT COUNT(*) FROM reference_data WHERE data_type = ?", (data_type,))
-        type_counts[data_type] = cursor.fetchone()[0]
+    type_counts = _read_stats_counters(cursor, 'reference_data.data_type')['reference_data.data_type']
     
     conn.close()
     
     return {
-        "total_entries": data_count,
+        "total_entries": sum(type_counts.values()),
         "type_counts": type_counts
     }
 
@@ -134,23 +335,9 @@ def get_task_stats():
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    cursor.execute("SELECT COUNT(*) FROM tasks")
-    task_count = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM tasks WHERE status = 'pending'")
-    pending_count = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM tasks WHERE status = 'approved'")
-    approved_count = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM tasks WHERE status = 'rejected'")
-    rejected_count = cursor.fetchone()[0]
-    
-    # Get task types breakdown
-    cursor.execute("SELECT task_type, COUNT(*) FROM tasks GROUP BY task_type")
-    task_types = {}
-    for row in cursor.fetchall():
-        task_types[row[0]] = row[1]
+    counters = _read_stats_counters(cursor, 'tasks.status', 'tasks.task_type')
+    status_counts = counters['tasks.status']
+    task_types = counters['tasks.task_type']
     
     # Get recent tasks
     cursor.execute("""
@@ -164,10 +351,10 @@ def get_task_stats():
     conn.close()
     
     return {
-        "total_tasks": task_count,
-        "pending_count": pending_count,
-        "approved_count": approved_count,
-        "rejected_count": rejected_count,
+        "total_tasks": sum(task_types.values()),
+        "pending_count": status_counts.get('pending', 0),
+        "approved_count": status_counts.get('approved', 0),
+        "rejected_count": status_counts.get('rejected', 0),
         "task_types": task_types,
         "recent_tasks": recent_tasks
     }
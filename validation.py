@@ -0,0 +1,147 @@
+"""Vectorized validation of bulk upload rows against field rules and the database
+
+``validate_frame`` checks a whole DataFrame at once and returns a boolean
+error mask with one row per input row and one column per failed check, so
+callers can count, filter or describe problems without a Python loop over
+rows. Conflicts with keys already in the database are found with a single
+join between a temp table of the upload's keys and the target table.
+"""
+import numpy as np
+import pandas as pd
+
+from database import get_db_connection
+
+VALID_ROLES = ['super_admin', 'data_analyst']
+
+# Rules per upload entity type: target table, required and unique-key
+# columns, maximum text lengths and allowed values
+UPLOAD_SPECS = {
+    'user': {
+        'table': 'users',
+        'required_columns': ['username', 'password', 'role'],
+        'key_columns': ['username'],
+        'max_lengths': {
+            'username': 64,
+            'password': 128,
+            'email': 254,
+            'full_name': 128,
+            'department': 128,
+        },
+        'allowed_values': {'role': VALID_ROLES},
+    },
+    'reference_data': {
+        'table': 'reference_data',
+        'required_columns': ['data_type', 'code', 'value'],
+        'key_columns': ['data_type', 'code'],
+        'max_lengths': {
+            'data_type': 64,
+            'code': 64,
+            'value': 255,
+            'description': 1000,
+        },
+        'allowed_values': {},
+    },
+}
+
+# Check names used as error mask columns
+DUPLICATE_IN_FILE = 'duplicate_in_file'
+EXISTS_IN_DATABASE = 'exists_in_database'
+
+
+def _as_text(column):
+    """A column as a pandas string Series with blank cells as missing"""
+    text = column.astype('string').str.strip()
+    return text.mask(text == '')
+
+
+def normalize_keys(frame, entity_type):
+    """A copy of an upload frame with its key columns as validated: stripped, with blank keys missing
+
+    Duplicate and database checks run on these keys, so rows must be staged
+    with them too.
+    """
+    key_columns = [column for column in UPLOAD_SPECS[entity_type]['key_columns'] if column in frame.columns]
+    return frame.assign(**{column: _as_text(frame[column]) for column in key_columns})
+
+
+def _rule_columns(spec):
+    """Every column some rule looks at"""
+    return set(spec['required_columns']) | set(spec['max_lengths']) | set(spec['allowed_values'])
+
+
+def existing_key_mask(frame, entity_type, conn=None):
+    """Boolean array marking rows whose key already exists in the target table
+
+    The upload's keys go into a temp table and are matched against the table's
+    unique index in one join.
+    """
+    spec = UPLOAD_SPECS[entity_type]
+    key_columns = spec['key_columns']
+    mask = np.zeros(len(frame), dtype=bool)
+    keys = normalize_keys(frame[key_columns], entity_type).astype(object)
+    complete = keys.notna().all(axis=1).to_numpy()
+    if not complete.any():
+        return mask
+
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    cursor = conn.cursor()
+    key_table = f"upload_keys_{spec['table']}"
+    try:
+        cursor.execute(f"DROP TABLE IF EXISTS temp.{key_table}")
+        cursor.execute(
+            f"CREATE TEMP TABLE {key_table} (position INTEGER PRIMARY KEY, {', '.join(key_columns)})"
+        )
+        positions = np.flatnonzero(complete)
+        cursor.executemany(
+            f"INSERT INTO temp.{key_table} VALUES (?, {', '.join('?' for _ in key_columns)})",
+            zip(positions.tolist(), *(keys[column].to_numpy()[positions].tolist() for column in key_columns))
+        )
+        key_match = ' AND '.join(f"t.{column} = k.{column}" for column in key_columns)
+        cursor.execute(
+            f"SELECT k.position FROM temp.{key_table} AS k JOIN {spec['table']} AS t ON {key_match}"
+        )
+        mask[[row[0] for row in cursor.fetchall()]] = True
+        cursor.execute(f"DROP TABLE temp.{key_table}")
+    finally:
+        if own_conn:
+            conn.close()
+    return mask
+
+
+def validate_frame(frame, entity_type, duplicates=None, conn=None):
+    """Check every row of an upload frame and return its error mask
+
+    The mask is a boolean DataFrame on the frame's index with a column per
+    check (``missing_<col>``, ``too_long_<col>``, ``invalid_<col>``,
+    ``duplicate_in_file`` and ``exists_in_database``); True marks a failure.
+    ``duplicates`` overrides the in-file duplicate check, for callers that
+    track keys across several chunks.
+    """
+    spec = UPLOAD_SPECS[entity_type]
+    checks = {}
+    text = {column: _as_text(frame[column]) for column in frame.columns if column in _rule_columns(spec)}
+
+    for column in spec['required_columns']:
+        checks[f"missing_{column}"] = text[column].isna().to_numpy() if column in text else np.ones(len(frame), dtype=bool)
+    for column, max_length in spec['max_lengths'].items():
+        if column in text:
+            checks[f"too_long_{column}"] = (text[column].str.len() > max_length).fillna(False).to_numpy(dtype=bool)
+    for column, allowed in spec['allowed_values'].items():
+        if column in text:
+            checks[f"invalid_{column}"] = (text[column].notna() & ~text[column].isin(allowed)).to_numpy(dtype=bool)
+
+    if duplicates is None:
+        duplicates = normalize_keys(frame, entity_type).duplicated(subset=spec['key_columns'], keep='first').to_numpy()
+    checks[DUPLICATE_IN_FILE] = np.asarray(duplicates, dtype=bool)
+    checks[EXISTS_IN_DATABASE] = existing_key_mask(frame, entity_type, conn)
+
+    return pd.DataFrame(checks, index=frame.index)
+
+
+def describe_errors(mask):
+    """Comma-separated names of the failed checks for each row of an error mask"""
+    if mask.empty:
+        return pd.Series('', index=mask.index, dtype=object)
+    return mask.dot(mask.columns + ', ').str.rstrip(', ')